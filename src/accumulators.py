@@ -0,0 +1,223 @@
+"""
+Streaming statistics for simulation results.
+
+Each accumulator is updated one batch of results at a time, and holds
+a fixed amount of memory no matter how many results it has seen.
+Accumulators of the same kind can be merged, e.g. to combine the results
+of several workers or shards, with the same outcome as if one accumulator
+had seen every batch.
+"""
+import math
+from collections import Counter
+
+import numpy as np
+
+
+class CountAccumulator:
+    """
+    Count how many times each distinct value occurs, e.g. fight winners.
+    """
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values)
+        if values.dtype.kind in "iu" and values.size and values.min() >= 0:
+            counts = np.bincount(values.ravel())
+            values = np.flatnonzero(counts)
+            counts = counts[values]
+        else:
+            values, counts = np.unique(values, return_counts=True)
+        self.counts.update(dict(zip(values.tolist(), counts.tolist())))
+        return self
+
+    def merge(self, other: "CountAccumulator"):
+        self.counts.update(other.counts)
+        return self
+
+    def proportion(self, value) -> float:
+        """
+        The proportion of all values equal to `value`.
+        """
+        return self.counts[value] / self.total
+
+
+class MeanVarianceAccumulator:
+    """
+    Running count, mean and variance, using Welford's algorithm
+    generalized to batches (Chan et al.), which is also
+    how two accumulators are merged.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+
+    def _combine(self, count: int, mean: float, m2: float):
+        total = self.count + count
+        if total == 0:
+            return self
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        return self
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return self
+        batch_mean = values.mean()
+        return self._combine(
+            values.size, batch_mean, np.sum((values - batch_mean) ** 2)
+        )
+
+    def merge(self, other: "MeanVarianceAccumulator"):
+        return self._combine(other.count, other.mean, other.m2)
+
+    @property
+    def variance(self) -> float:
+        """
+        The sample variance
+        """
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def standard_error(self) -> float:
+        """
+        The standard error of the mean
+        """
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(self.variance / self.count)
+
+
+class HistogramAccumulator:
+    """
+    Counts of values in fixed bins. Values below the first edge or at
+    or above the last edge are counted as underflow and overflow.
+
+    Parameters
+    ----------
+    edges: np.ndarray
+        Increasing bin edges, e.g. np.arange(0, 101) for
+        integer damage values from 0 to 99
+    """
+
+    def __init__(self, edges: np.ndarray) -> None:
+        self.edges = np.asarray(edges)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values).ravel()
+        bins = np.searchsorted(self.edges, values, side="right") - 1
+        self.underflow += np.count_nonzero(bins < 0)
+        self.overflow += np.count_nonzero(bins >= len(self.counts))
+        in_range = bins[(bins >= 0) & (bins < len(self.counts))]
+        self.counts += np.bincount(in_range, minlength=len(self.counts))
+        return self
+
+    def merge(self, other: "HistogramAccumulator"):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError(
+                "Only histograms with the same bins can be merged"
+            )
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles with a bounded relative error, in the manner
+    of DDSketch: values are counted in logarithmically-sized buckets, so
+    any quantile is returned within `relative_accuracy` of its true value.
+    Zeros and negative values are supported.
+
+    Parameters
+    ----------
+    relative_accuracy: float
+        The maximum relative error of a quantile
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.positive = Counter()
+        self.negative = Counter()
+        self.zeros = 0
+
+    def _bucket_counts(self, values: np.ndarray) -> dict:
+        buckets, counts = np.unique(
+            np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64),
+            return_counts=True,
+        )
+        return dict(zip(buckets.tolist(), counts.tolist()))
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float).ravel()
+        self.zeros += np.count_nonzero(values == 0)
+        self.positive.update(self._bucket_counts(values[values > 0]))
+        self.negative.update(self._bucket_counts(-values[values < 0]))
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        if self.gamma != other.gamma:
+            raise ValueError(
+                "Only sketches with the same accuracy can be merged"
+            )
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zeros += other.zeros
+        return self
+
+    @property
+    def count(self) -> int:
+        return (
+            sum(self.positive.values())
+            + sum(self.negative.values())
+            + self.zeros
+        )
+
+    def _bucket_value(self, bucket: int) -> float:
+        return 2 * self.gamma**bucket / (self.gamma + 1)
+
+    def quantile(self, q: float) -> float:
+        """
+        The approximate q-quantile, for 0 <= q <= 1
+        """
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.negative, reverse=True):
+            seen += self.negative[bucket]
+            if seen > rank:
+                return -self._bucket_value(bucket)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for bucket in sorted(self.positive):
+            seen += self.positive[bucket]
+            if seen > rank:
+                return self._bucket_value(bucket)
+        return self._bucket_value(max(self.positive))
@@ -0,0 +1,194 @@
+"""
+Exact probabilities and expected values for attacks, without simulation.
+"""
+import numpy as np
+
+from character import monster_stat_distribution, proficiency_bonus
+from die import ModifiedDie, Reroll
+from kernels import AttackProfile, attack_profile
+
+
+def natural_roll_probabilities(
+    advantage: bool = False, disadvantage: bool = False
+) -> np.ndarray:
+    """
+    The probability of each natural d20 roll, from 1 to 20,
+    taking the better/worse of two rolls with advantage/disadvantage.
+    """
+    faces = np.arange(1, 21)
+    if advantage:
+        return (2 * faces - 1) / 400
+    if disadvantage:
+        return (41 - 2 * faces) / 400
+    return np.full(20, 1 / 20)
+
+
+def hit_probabilities(
+    hit_bonus: int,
+    ac: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    The exact probability of each result of `Character.hit`.
+
+    Parameters
+    ----------
+    hit_bonus: int
+        The attacker's hit bonus
+    ac: int
+        The target's AC
+    advantage/disadvantage: bool
+        Whether to roll twice and take the better/worse
+
+    Returns
+    -------
+    probabilities: np.ndarray
+        The probability of a miss (0), hit (1) and critical hit (2)
+    """
+    faces = np.arange(1, 21)
+    hit_arr = np.select(
+        [faces == 20, faces == 1, faces + hit_bonus >= ac], [2, 0, 1]
+    )
+    return np.bincount(
+        hit_arr,
+        weights=natural_roll_probabilities(advantage, disadvantage),
+        minlength=3,
+    )
+
+
+def face_probabilities(sides: int, reroll_at_most: int = 0) -> np.ndarray:
+    """
+    The probability of each face of a single damage die, from 1 to sides,
+    when faces up to reroll_at_most are rerolled once,
+    e.g. reroll_at_most=2 for Great Weapon Fighting.
+    """
+    return ModifiedDie(sides, 1, [Reroll(reroll_at_most)]).pmf()[1:]
+
+
+def profile_expected_damage(
+    profile: AttackProfile,
+    ac: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> float:
+    """
+    The exact expected damage of one attack with an AttackProfile
+    against an AC, as rolled by `Character.attack`.
+
+    Parameters
+    ----------
+    profile: AttackProfile
+        The attacker's numbers, see `kernels.attack_profile`
+    ac: int
+        The target's AC
+    advantage/disadvantage: bool
+        Whether to roll twice and take the better/worse
+
+    Returns
+    -------
+    expected_damage: float
+    """
+    _, p_hit, p_critical = hit_probabilities(
+        profile.hit_bonus, ac, advantage, disadvantage
+    )
+    die_mean = np.dot(
+        np.arange(1, profile.damage_sides + 1),
+        face_probabilities(profile.damage_sides, profile.reroll_at_most),
+    )
+    hit_damage = profile.damage_number * die_mean + profile.damage_bonus
+    critical_damage = (
+        2 * profile.damage_number + profile.extra_critical_dice
+    ) * die_mean + 2 * profile.damage_bonus
+    return float(p_hit * hit_damage + p_critical * critical_damage)
+
+
+def expected_damage(
+    attacker,
+    target,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> float:
+    """
+    The exact expected damage of one of a Character's attacks
+    against a target, as rolled by `Character.attack`.
+    See `profile_expected_damage`.
+    """
+    return profile_expected_damage(
+        attack_profile(attacker), target.ac, advantage, disadvantage
+    )
+
+
+def expected_round_damage(
+    attacker,
+    target,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> float:
+    """
+    The exact expected damage of a round of a Character's attacks
+    against a target, as rolled by `Character.attack_rounds`.
+    See `profile_expected_damage`.
+    """
+    return attacker.attacks_per_round * expected_damage(
+        attacker, target, advantage, disadvantage
+    )
+
+
+def expected_damage_against_monster(
+    attacker,
+    cr: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> float:
+    """
+    The exact expected damage of one of a Character's attacks against
+    a Monster of a given CR, averaged over the Monster's random AC.
+    """
+    profile = attack_profile(attacker)
+    acs, probabilities = monster_stat_distribution("ac", cr)
+    return float(
+        sum(
+            probability
+            * profile_expected_damage(profile, ac, advantage, disadvantage)
+            for ac, probability in zip(acs, probabilities)
+        )
+    )
+
+
+def expected_monster_damage(
+    cr: int,
+    target,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> float:
+    """
+    The exact expected damage of one attack by a Monster of a given CR
+    against a target, averaged over the Monster's random strength
+    modifier and damage dice.
+    """
+    modifiers, modifier_probabilities = monster_stat_distribution(
+        "strength_modifier", cr
+    )
+    dice, dice_probabilities = monster_stat_distribution("damage_dice", cr)
+    expected = 0.0
+    for modifier, modifier_probability in zip(
+        modifiers, modifier_probabilities
+    ):
+        for (sides, number), dice_probability in zip(dice, dice_probabilities):
+            profile = AttackProfile(
+                hit_bonus=modifier + proficiency_bonus(cr),
+                damage_sides=sides,
+                damage_number=number,
+                damage_bonus=modifier,
+                reroll_at_most=0,
+                extra_critical_dice=0,
+            )
+            expected += (
+                modifier_probability
+                * dice_probability
+                * profile_expected_damage(
+                    profile, target.ac, advantage, disadvantage
+                )
+            )
+    return expected
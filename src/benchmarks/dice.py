@@ -0,0 +1,119 @@
+"""
+Benchmark the backends that roll the faces of dice (see `die.roll_faces`):
+
+* randint - one call to `randint` for every array of faces
+* bytes - raw random bytes drawn in bulk, each mapped to a face through
+  a lookup table, drawing again only the few bytes that would bias
+  the faces
+
+Raw faces of common dice are timed, then the rolls built on them:
+damage dice, a d20 with advantage, Great Weapon Fighting, and whole
+attacks, whose time is mostly spent rolling d20s and damage dice.
+"""
+import argparse
+import time
+
+import die
+from character import Character
+from die import D20, Die, GWFDie, face_backends, roll_faces
+from sweep import seed_random_state
+from utils import generate_fighter_stats
+
+
+def build_workloads() -> dict:
+    stats = generate_fighter_stats(10)
+    char = Character(name="Greatsword", **stats, ac=19, damage_dice=(6, 2))
+    target = Character(name="Shield", **stats, ac=21, damage_dice=(8, 1))
+    workloads = {
+        f"faces d{sides}": lambda n, sides=sides: roll_faces(sides, n)
+        for sides in [6, 8, 12, 20]
+    }
+    workloads.update(
+        {
+            "Die(20)": Die(20, 1).roll,
+            "Die(6, 2)": Die(6, 2).roll,
+            "advantage": D20().roll_with_advantage,
+            "GWFDie(6, 2)": GWFDie(6, 2).roll,
+            "attack": lambda n: char.attack(target, n),
+        }
+    )
+    return workloads
+
+
+def time_workload(function, n: int, repeat: int) -> float:
+    """
+    The fastest of `repeat` calls, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(n)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_backends(sizes: list, repeat: int) -> list:
+    """
+    The seconds each workload takes with each backend,
+    for every number of rolls.
+    """
+    workloads = build_workloads()
+    default = die.DEFAULT_FACE_BACKEND
+    results = []
+    try:
+        for size in sizes:
+            for name, function in workloads.items():
+                times = dict()
+                for backend in face_backends:
+                    die.DEFAULT_FACE_BACKEND = backend
+                    times[backend] = time_workload(function, size, repeat)
+                results.append((name, size, times))
+    finally:
+        die.DEFAULT_FACE_BACKEND = default
+    return results
+
+
+def print_table(results: list):
+    backends = list(results[0][2])
+    print(
+        f"{'workload':>14}",
+        f"{'rolls':>10}",
+        *(f"{backend:>10}" for backend in backends),
+        f"{'speedup':>8}",
+    )
+    for name, size, times in results:
+        print(
+            f"{name:>14}",
+            f"{size:>10,}",
+            *(f"{times[backend] * 1e3:>10.2f}" for backend in backends),
+            f"{times['randint'] / times['bytes']:>7.2f}x",
+        )
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 1_000_000],
+        help="numbers of rolls to time",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="number of calls to time, of which the fastest is kept",
+    )
+    args = parser.parse_args(argv)
+
+    seed_random_state(0)
+    print("milliseconds per call, speedup of bytes over randint\n")
+    print_table(benchmark_backends(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark running fights on threads against running them on processes.
+
+Two workloads are timed at several sizes:
+
+* batched fights - one call to `fights` with the numpy backend,
+  the threaded numpy backend, and the numba backend if installed
+* sweeps - a grid of (level, matchup) cells like `shield_battle.py`'s,
+  with the numpy backend, run serially, on a pool of threads,
+  and on a pool of processes
+
+Threads win when a job is too small to pay for starting processes and
+importing everything in each of them, and as long as most of the time
+is spent in NumPy calls that release the GIL. Processes win on large
+jobs, where their startup cost is amortized and the Python code between
+NumPy calls, which holds the GIL, starts to serialize the threads.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from character import Character
+from kernels import BACKENDS
+from sweep import Sweep, seed_random_state
+from utils import fights, generate_fighter_stats
+
+
+def build_characters(level: int) -> dict:
+    ac = 17 + level // 4
+    stats = generate_fighter_stats(level)
+    return dict(
+        longsword=Character(
+            name="Longsword", **stats, ac=ac, damage_dice=(10, 1)
+        ),
+        shield=Character(
+            name="Shield", **stats, ac=ac + 2, damage_dice=(8, 1)
+        ),
+        greatsword=Character(
+            name="Greatsword", **stats, ac=ac, damage_dice=(6, 2)
+        ),
+    )
+
+
+MATCHUPS = [("longsword", "shield"), ("greatsword", "shield")]
+
+
+def simulate_matchup(characters: dict, cell: tuple, replications: int):
+    _, (name1, name2) = cell
+    return fights(
+        characters[name1], characters[name2], replications, backend="numpy"
+    )["outcome"]
+
+
+def time_call(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def benchmark_fights(sizes: list) -> list:
+    """
+    The seconds one call to `fights` takes with each backend,
+    for every number of replications.
+    """
+    characters = build_characters(10)
+    char1, char2 = characters["longsword"], characters["shield"]
+    # compile and warm up every backend first
+    for backend in BACKENDS:
+        fights(char1, char2, 10, backend=backend)
+    return [
+        (
+            size,
+            {
+                backend: time_call(fights, char1, char2, size, backend=backend)
+                for backend in BACKENDS
+            },
+        )
+        for size in sizes
+    ]
+
+
+def benchmark_sweeps(sizes: list, workers: int) -> list:
+    """
+    The seconds a sweep takes run serially, on threads and on processes,
+    for every number of replications per cell.
+    """
+    cells = [
+        (level, matchup) for level in range(1, 21, 4) for matchup in MATCHUPS
+    ]
+    modes = {
+        "serial": dict(workers=1),
+        "processes": dict(workers=workers, executor="process"),
+        "threads": dict(workers=workers, executor="thread"),
+    }
+    results = []
+    for size in sizes:
+        times = dict()
+        for mode, kwargs in modes.items():
+            sweep = Sweep(
+                cells=cells,
+                setup=build_characters,
+                simulate=simulate_matchup,
+                replications=size,
+                batch_size=10_000,
+                seed=0,
+                outcome_dtype=np.int8,
+                **kwargs,
+            )
+            times[mode] = time_call(sweep.run)
+        results.append((size, times))
+    return results
+
+
+def print_table(title: str, results: list):
+    modes = list(results[0][1])
+    print(title)
+    print(f"{'replications':>12}", *(f"{mode:>10}" for mode in modes))
+    for size, times in results:
+        fastest = min(times, key=times.get)
+        print(
+            f"{size:>12,}",
+            *(
+                f"{times[mode]:>9.3f}{'*' if mode == fastest else ' '}"
+                for mode in modes
+            ),
+        )
+    print()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 100_000],
+        help="numbers of replications to time",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of threads or processes for sweeps",
+    )
+    args = parser.parse_args(argv)
+
+    seed_random_state(0)
+    print(f"{os.cpu_count()} CPUs, seconds (* fastest)\n")
+    print_table(
+        f"Sweeps of 10 cells, {args.workers} workers",
+        benchmark_sweeps(args.sizes, args.workers),
+    )
+    print_table("Batched fights", benchmark_fights(args.sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Find the value of an AC, level or bonus at which one build
+overtakes another, instead of reading it off a coarse grid.
+
+A build is a function of the value being searched, returning the
+Characters to compare at that value, e.g. `lambda ac: (barbarian,
+Monster(cr=10, ac=ac))`. Both searches assume that the difference
+between the builds changes sign at most once between `low` and `high`,
+and bisect integer values for the first one at which it has changed sign:
+
+* `damage_crossover` compares exact expected damage per round
+  (see `analytic.py`), so it needs no simulation at all
+* `win_crossover` compares win probabilities, estimated by simulating
+  fights in batches at each probed value only until the sign of
+  the difference is clear, so that replications are only spent
+  in depth close to the crossover
+"""
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from accumulators import MeanVarianceAccumulator
+from analytic import expected_round_damage
+from utils import CHAR1_WINS, CHAR2_WINS, fights
+
+
+class Crossover(NamedTuple):
+    """
+    The first value at which the difference between two builds has
+    changed sign, or None if it doesn't change sign between
+    low and high, with the (estimated) difference at that value.
+    """
+
+    value: int
+    difference: float
+    standard_error: float
+    replications: int
+
+
+class Estimate(NamedTuple):
+    """
+    The (estimated) difference between two builds at a single value.
+    """
+
+    difference: float
+    standard_error: float
+    replications: int
+
+
+def bisect_crossover(difference: Callable, low: int, high: int) -> Crossover:
+    """
+    Bisect the integers from low to high for the first value at which
+    an exactly known difference has a different sign than at low.
+
+    Parameters
+    ----------
+    difference: Callable
+        difference(value) -> float
+    low/high: int
+        The range of values to search
+
+    Returns
+    -------
+    crossover: Crossover
+    """
+
+    def estimate(value: int) -> Estimate:
+        return Estimate(difference(value), 0.0, 0)
+
+    return _bisect(estimate, low, high)
+
+
+def noisy_bisect_crossover(
+    sample: Callable,
+    low: int,
+    high: int,
+    z: float = 3.0,
+    batch_size: int = 2_000,
+    max_replications: int = 100_000,
+) -> Crossover:
+    """
+    Bisect the integers from low to high for the first value at which
+    a simulated difference has a different sign than at low.
+
+    Every probed value is simulated in batches, until its mean is at
+    least z standard errors away from 0, or max_replications is reached.
+    A value whose difference can't be told apart from 0 within
+    max_replications is as close to the crossover as the simulation
+    can resolve, so it is returned as the crossover.
+
+    Parameters
+    ----------
+    sample: Callable
+        sample(value, n) -> np.ndarray
+        Simulate n replications of the difference at a value
+    low/high: int
+        The range of values to search
+    z: float
+        The number of standard errors a difference must be away from 0
+        for its sign to be trusted
+    batch_size: int
+        The number of replications to simulate at once
+    max_replications: int
+        The most replications to simulate at any one value
+
+    Returns
+    -------
+    crossover: Crossover
+        The replications are the total spent over the whole search
+    """
+    spent = 0
+
+    def estimate(value: int) -> Estimate:
+        nonlocal spent
+        accumulator = MeanVarianceAccumulator()
+        while accumulator.count < max_replications:
+            accumulator.update(
+                sample(
+                    value,
+                    min(batch_size, max_replications - accumulator.count),
+                )
+            )
+            standard_error = accumulator.standard_error
+            # a batch with no spread says nothing about the error yet
+            if (
+                standard_error > 0
+                and abs(accumulator.mean) >= z * standard_error
+            ):
+                break
+        spent += accumulator.count
+        return Estimate(
+            accumulator.mean, accumulator.standard_error, accumulator.count
+        )
+
+    return _bisect(estimate, low, high, z)._replace(replications=spent)
+
+
+def _bisect(estimate: Callable, low: int, high: int, z: float = 0.0):
+    def sign(result: Estimate) -> int:
+        if abs(result.difference) <= z * result.standard_error:
+            return 0
+        return int(np.sign(result.difference))
+
+    def crossover(value: int, result: Estimate) -> Crossover:
+        return Crossover(
+            value,
+            result.difference,
+            result.standard_error,
+            result.replications,
+        )
+
+    low_result = estimate(low)
+    low_sign = sign(low_result)
+    if low_sign == 0:
+        return crossover(low, low_result)
+    high_result = estimate(high)
+    if sign(high_result) == low_sign:
+        return crossover(None, high_result)
+
+    # the sign at low is never the sign at high
+    while high - low > 1:
+        middle = (low + high) // 2
+        middle_result = estimate(middle)
+        middle_sign = sign(middle_result)
+        if middle_sign == 0:
+            return crossover(middle, middle_result)
+        if middle_sign == low_sign:
+            low = middle
+        else:
+            high, high_result = middle, middle_result
+    return crossover(high, high_result)
+
+
+def damage_crossover(
+    build1: Callable,
+    build2: Callable,
+    low: int,
+    high: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> Crossover:
+    """
+    Find the first value at which the exact expected damage of a round
+    of one build's attacks overtakes the other's, or falls behind it,
+    so that builds with more attacks per round are compared fairly.
+
+    Parameters
+    ----------
+    build1/build2: Callable
+        build(value) -> (attacker, target)
+    low/high: int
+        The range of values to search
+    advantage/disadvantage: bool
+        Whether attacks roll twice and take the better/worse
+
+    Returns
+    -------
+    crossover: Crossover
+        The difference is build1's expected damage minus build2's
+    """
+
+    def difference(value: int) -> float:
+        return expected_round_damage(
+            *build1(value), advantage, disadvantage
+        ) - expected_round_damage(*build2(value), advantage, disadvantage)
+
+    return bisect_crossover(difference, low, high)
+
+
+def win_crossover(
+    build: Callable, low: int, high: int, rolls: int = 500, **kwargs
+) -> Crossover:
+    """
+    Find the first value at which one Character's probability of winning
+    a fight against another overtakes theirs, or falls behind it.
+
+    Parameters
+    ----------
+    build: Callable
+        build(value) -> (char1, char2)
+    low/high: int
+        The range of values to search
+    rolls: int
+        The number of rounds for a single fight
+    kwargs:
+        Arguments for `noisy_bisect_crossover`
+
+    Returns
+    -------
+    crossover: Crossover
+        The difference is char1's win probability minus char2's
+    """
+    built = dict()
+
+    def sample(value: int, n: int) -> np.ndarray:
+        # build each value once, so every batch fights the same Characters
+        if value not in built:
+            built[value] = build(value)
+        outcome = fights(*built[value], n, rolls)["outcome"]
+        return (outcome == CHAR1_WINS).astype(int) - (outcome == CHAR2_WINS)
+
+    return noisy_bisect_crossover(sample, low, high, **kwargs)
@@ -0,0 +1,189 @@
+"""
+Spread a global budget of replications across the cells of a sweep,
+according to how noisy each cell is.
+
+Giving every cell the same number of replications wastes most of them:
+a level 1 duel or a lopsided fight against a monster is decided almost
+the same way every time, so its win rate is precise after a few hundred
+fights, while a close mid-level matchup needs many thousands. A budgeted
+sweep (see `sweep.run_budgeted_sweep`) instead runs in two passes:
+
+* a pilot pass simulates every cell for the same small number of
+  replications, and estimates the variance of a single replication
+  of each quantity of interest (e.g. each outcome's proportion)
+* the rest of the budget is allocated in proportion to each cell's
+  standard deviation (Neyman allocation), which minimizes the total
+  squared error of the whole chart, or to its variance, which gives
+  every cell the same standard error and so minimizes the worst one.
+  A second pass simulates each cell's extra replications, with random
+  streams independent of the pilot's, and merges them with the pilot
+
+The standard error actually achieved by every cell is reported at the
+end, since the pilot's variances are only estimates.
+"""
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from progress import running_estimates
+
+
+OBJECTIVES = ["worst", "total"]
+
+
+class Precision(NamedTuple):
+    """
+    The number of replications a cell was simulated for, and the largest
+    standard error of any of its estimates.
+    """
+
+    replications: int
+    standard_error: float
+
+
+def replication_variance(accumulator) -> float:
+    """
+    The largest variance of a single replication of any quantity
+    estimated by an accumulator (see `accumulators.py`): the proportion
+    of each value counted by a CountAccumulator, or the mean of
+    a MeanVarianceAccumulator.
+
+    A proportion is estimated with half a replication added to each
+    side, so that a cell whose pilot only saw one outcome still gets
+    a small, non-zero variance.
+    """
+    if hasattr(accumulator, "proportion"):
+        total = accumulator.total
+        if total == 0:
+            return 0.25
+        return max(
+            (count + 0.5) * (total - count + 0.5) / (total + 1) ** 2
+            for count in accumulator.counts.values()
+        )
+    variance = accumulator.variance
+    return 0.0 if math.isnan(variance) else variance
+
+
+def _round_allocation(shares: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Round shares that add up to the budget into integers that also do,
+    giving the leftover replications to the largest remainders.
+    """
+    allocation = np.floor(shares).astype(np.int64)
+    leftover = budget - int(allocation.sum())
+    allocation[np.argsort(allocation - shares)[:leftover]] += 1
+    return allocation
+
+
+def allocate(
+    variances: dict,
+    budget: int,
+    minimum: int = 0,
+    objective: str = "worst",
+) -> dict:
+    """
+    Allocate a budget of replications across cells.
+
+    Parameters
+    ----------
+    variances: dict
+        Dictionary of cell -> the variance of a single replication
+    budget: int
+        The total number of replications of every cell
+    minimum: int
+        The fewest replications of any cell, e.g. those already spent
+        on a pilot
+    objective: str
+        "worst" to minimize the largest standard error of any cell,
+        by giving each cell replications in proportion to its variance,
+        or "total" to minimize the sum of every cell's squared standard
+        error, by giving each cell replications in proportion to its
+        standard deviation (Neyman allocation)
+
+    Returns
+    -------
+    allocation: dict
+        Dictionary of cell -> number of replications, adding up
+        to the budget
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective: {objective}")
+    cells = list(variances)
+    if budget < minimum * len(cells):
+        raise ValueError(
+            f"A budget of {budget} replications can't give "
+            f"{len(cells)} cells {minimum} replications each"
+        )
+    weights = np.array([variances[cell] for cell in cells], dtype=float)
+    if objective == "total":
+        weights = np.sqrt(weights)
+
+    # cells whose share would fall below the minimum get the minimum,
+    # and the rest of the budget is shared by the other cells
+    at_minimum = np.zeros(len(cells), dtype=bool)
+    while True:
+        remaining = budget - minimum * np.count_nonzero(at_minimum)
+        free_weights = np.where(at_minimum, 0.0, weights)
+        if free_weights.sum() > 0:
+            shares = remaining * free_weights / free_weights.sum()
+        else:
+            shares = np.where(
+                at_minimum, 0.0, remaining / np.count_nonzero(~at_minimum)
+            )
+        below = ~at_minimum & (shares < minimum)
+        if not below.any():
+            break
+        at_minimum |= below
+    shares = np.where(at_minimum, minimum, shares)
+    return dict(zip(cells, _round_allocation(shares, budget).tolist()))
+
+
+def achieved_precision(results: dict) -> dict:
+    """
+    The precision achieved by every cell of a sweep.
+
+    Parameters
+    ----------
+    results: dict
+        Dictionary of cell -> accumulator of outcomes
+
+    Returns
+    -------
+    precision: dict
+        Dictionary of cell -> Precision
+    """
+    precision = dict()
+    for cell, accumulator in results.items():
+        estimates = running_estimates(cell, accumulator)
+        precision[cell] = Precision(
+            replications=(
+                accumulator.total
+                if hasattr(accumulator, "total")
+                else accumulator.count
+            ),
+            standard_error=max(
+                (error for _, error in estimates.values()), default=math.nan
+            ),
+        )
+    return precision
+
+
+def format_precision(precision: dict) -> str:
+    """
+    A console table of the precision achieved by every cell,
+    with the largest and root mean squared standard errors.
+    """
+    width = max(len(str(cell)) for cell in precision)
+    lines = [
+        f"{str(cell):<{width}} {cell_precision.replications:>10,} "
+        f"replications, standard error {cell_precision.standard_error:.4f}"
+        for cell, cell_precision in precision.items()
+    ]
+    errors = np.array([p.standard_error for p in precision.values()])
+    lines.append(
+        f"largest standard error {np.max(errors):.4f}, "
+        f"root mean squared standard error "
+        f"{np.sqrt(np.mean(errors**2)):.4f}"
+    )
+    return "\n".join(lines)
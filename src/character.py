@@ -2,11 +2,17 @@ from typing import Tuple
 import textwrap
 import math
 import itertools
-from collections import OrderedDict
 
 import numpy as np
 
-from die import Die, D20, GWFDie
+from die import Die, D20, GWFDie, random_state
+
+
+def proficiency_bonus(level: int) -> int:
+    """
+    The proficiency bonus of a Character of a given level
+    """
+    return math.ceil(level / 4) + 1
 
 
 class Character:
@@ -20,6 +26,7 @@ class Character:
         hit_die: tuple = None,
         damage_dice: tuple = None,
         initiative_bonus: int = 0,
+        attacks_per_round: int = 1,
     ) -> None:
         self.name = name if name is not None else "Anonymous"
         self.level = level
@@ -28,6 +35,7 @@ class Character:
         self.damage_bonus = self.strength_modifier
         self.constitution_modifier = constitution_modifier
         self.initiative_bonus = initiative_bonus
+        self.attacks_per_round = attacks_per_round
         self._hit_die = hit_die
         self._damage_dice = damage_dice
         self.d20 = D20()
@@ -41,8 +49,7 @@ class Character:
         on a Character's level (by way of their proficiency bonus)
         and their strength modifier
         """
-        proficiency_bonus = math.ceil(self.level / 4) + 1
-        return self.strength_modifier + proficiency_bonus
+        return self.strength_modifier + proficiency_bonus(self.level)
 
     @property
     def damage_dice(self):
@@ -71,14 +78,46 @@ class Character:
         cumulative sum of damage rolls to determine the turn (the index
         of the damage roll array) on which the Character is defeated.
         """
-        hp = (
+        return self.roll_hp()[0]
+
+    @property
+    def extra_critical_dice(self):
+        """
+        The number of additional single weapon damage dice rolled
+        on a critical hit, on top of the doubled damage dice.
+        """
+        return 0
+
+    def roll_hp(self, n: int = 1):
+        """
+        Construct an array of length n of independently rolled Hit Points,
+        one for each fight a Character might take part in.
+
+        Parameters
+        ----------
+        n: int
+            The number of Hit Point totals to roll
+
+        Returns
+        -------
+        hp_arr: np.ndarray
+            The array of Hit Point totals
+        """
+        level_up_dice = Die(
+            self.hit_die.sides, self.hit_die.number * (self.level - 1)
+        )
+        if level_up_dice.number > 0:
+            level_up_hp = level_up_dice.roll(n)  # all other levels' HP
+        else:
+            level_up_hp = np.zeros(n, dtype=int)
+        hp_arr = (
             self.hit_die.sides  # level 1 HP
-            + (self.hit_die.sum_roll(self.level - 1))  # all other levels' HP
+            + level_up_hp
             + (
                 self.constitution_modifier * self.level
             )  # constitution bonus for every level
         )
-        return hp
+        return hp_arr
 
     def show_stats(self):
         stats = f"""
@@ -91,6 +130,7 @@ class Character:
         Hit Die: {self.hit_die.display()}
         Hit Bonus: {self.hit_bonus}
         Damage Bonus: {self.damage_bonus}
+        Attacks per Round: {self.attacks_per_round}
         Constitution Modifier: {self.constitution_modifier}
         Initiative: {self.initiative[0]}"""
         return textwrap.dedent(stats)
@@ -108,6 +148,7 @@ class Character:
         rolls: int = 1,
         advantage: bool = False,
         disadvantage: bool = False,
+        sampling: str = "random",
     ) -> bool:
         """
         Roll a d20 to try to hit a target, and return an array of
@@ -124,6 +165,10 @@ class Character:
             The number of times to roll, and the length of the resulting array
         advantage/disadvantage: bool
             Whether to roll twice and take the better/worse
+        sampling: str
+            "random" for independent d20 rolls, or "stratified" for
+            every face (or pair of faces, with advantage/disadvantage)
+            to occur in equal proportion
 
         Returns
         -------
@@ -138,11 +183,11 @@ class Character:
         natural_1 = 1 + self.hit_bonus
 
         if advantage:
-            roll_arr = self.d20.roll_with_advantage(rolls)
+            roll_arr = self.d20.roll_with_advantage(rolls, sampling)
         elif disadvantage:
-            roll_arr = self.d20.roll_with_disadvantage(rolls)
+            roll_arr = self.d20.roll_with_disadvantage(rolls, sampling)
         else:
-            roll_arr = self.d20.roll(rolls)
+            roll_arr = self.d20.roll(rolls, sampling)
         # we have an array of d20 rolls
         roll_arr += self.hit_bonus
 
@@ -157,13 +202,16 @@ class Character:
         hit_arr = np.select(hit_conditions, hit_results)
         return hit_arr
 
-    def damage(self, hit_arr: np.array):
+    def damage(self, hit_arr: np.array, sampling: str = "random"):
         """
         Construct array of damage rolls based on
         an input array of to-hit values
 
         hit_arr: np.array
             Array of the number of damage dice to roll
+        sampling: str
+            "random" for independent damage rolls, or "stratified" for
+            rolls from a scrambled low-discrepancy sequence
         args:
             Any damage modifiers
 
@@ -172,11 +220,23 @@ class Character:
         damage_arr: np.array
             Array of damage rolls
         """
-        damage_roll = np.vectorize(
-            lambda to_hit: self.damage_dice.sum_roll(to_hit)
-            + (self.damage_bonus * to_hit)
-        )
-        damage_arr = damage_roll(hit_arr)
+        damage_dice = self.damage_dice
+        damage_arr = self.damage_bonus * hit_arr
+        # roll the damage dice once for every hit, and once more
+        # for every critical hit
+        for dice_rolled in [1, 2]:
+            rolled = hit_arr >= dice_rolled
+            damage_arr[rolled] += damage_dice.roll(
+                np.count_nonzero(rolled), sampling
+            )
+        if self.extra_critical_dice > 0:
+            # extra damage dice of the same kind (e.g. with the same
+            # rerolls) as the character's normal damage dice
+            extra_dice = damage_dice.with_number(self.extra_critical_dice)
+            critical = hit_arr == 2
+            damage_arr[critical] += extra_dice.roll(
+                np.count_nonzero(critical), sampling
+            )
         return damage_arr
 
     def attack(
@@ -185,12 +245,52 @@ class Character:
         rolls: int = 1,
         advantage: bool = False,
         disadvantage: bool = False,
+        sampling: str = "random",
     ):
 
-        hit_arr = self.hit(target, rolls, advantage, disadvantage)
-        damage_arr = self.damage(hit_arr)
+        hit_arr = self.hit(target, rolls, advantage, disadvantage, sampling)
+        damage_arr = self.damage(hit_arr, sampling)
         return damage_arr
 
+    def attack_rounds(
+        self,
+        target,
+        rounds: int = 1,
+        advantage: bool = False,
+        disadvantage: bool = False,
+        sampling: str = "random",
+    ):
+        """
+        Construct an array of the total damage of each of a number of
+        rounds, in which the Character attacks `attacks_per_round` times.
+        Every attack of every round is rolled at once, and summed
+        per round.
+
+        Parameters
+        ----------
+        target: Character
+            the target of the attacks
+        rounds: int
+            The number of rounds, and the length of the resulting array
+        advantage/disadvantage: bool
+            Whether to roll twice and take the better/worse
+        sampling: str
+            "random" or "stratified", see `Character.hit`
+
+        Returns
+        -------
+        damage_arr: np.array
+            Array of the damage of each round
+        """
+        damage_arr = self.attack(
+            target,
+            rounds * self.attacks_per_round,
+            advantage,
+            disadvantage,
+            sampling,
+        )
+        return damage_arr.reshape(rounds, self.attacks_per_round).sum(axis=1)
+
 
 class Barbarian(Character):
     def __init__(
@@ -203,6 +303,7 @@ class Barbarian(Character):
         damage_dice: tuple = None,
         initiative_bonus: int = 0,
         great_weapon_fighting: bool = False,
+        attacks_per_round: int = 1,
     ):
         super().__init__(
             name=name,
@@ -217,6 +318,7 @@ class Barbarian(Character):
             hit_die=(12, 1),
             damage_dice=damage_dice,
             initiative_bonus=initiative_bonus,
+            attacks_per_round=attacks_per_round,
         )
         self.damage_bonus += self.rage_bonus
         self.great_weapon_fighting = great_weapon_fighting
@@ -241,33 +343,17 @@ class Barbarian(Character):
         else:
             return Die(*self._damage_dice)
 
-    def damage(self, hit_arr: np.array):
+    @property
+    def extra_critical_dice(self):
         """
-        Overloaded `damage` function for barbarians, to utilize the
+        Overloaded property for barbarians, to utilize the
         Brutal Critical feature:
         "Beginning at 9th level, you can roll one additional
         weapon damage die when determining the extra damage for
         a critical hit with a melee attack.
         This increases to two additional dice at 13th level
         and three additional dice at 17th level."
-
-        hit_arr: np.array
-            Array of the number of damage dice to roll
-        args:
-            Any damage modifiers
-
-        Returns
-        -------
-        damage_arr: np.array
-            Array of damage rolls
         """
-
-        # brutal critical
-        die_type = type(self.damage_dice)
-        extra_die = die_type(self.damage_dice.sides, 1)
-        # get a single extra damage die of the same type (Die or GWFDie) as
-        # the character's normal damage dice
-
         # determine the number of extra damage dice to roll
         level_conditions = [
             self.level <= 8,
@@ -284,18 +370,127 @@ class Barbarian(Character):
         brutal_critical_extra_rolls = np.select(
             level_conditions, extra_dice_rolls
         )
-        damage_roll = np.vectorize(
-            lambda to_hit: self.damage_dice.sum_roll(to_hit)
-            + (self.damage_bonus * to_hit)
-            # whenever to_hit==2, add 0-3 extra single damage die
-            # (e.g., damage dice of 2d6 gives an extra 1d6 roll) rolls
-            + (
-                max(0, to_hit - 1)
-                * extra_die.sum_roll(brutal_critical_extra_rolls)
-            )
+        return int(brutal_critical_extra_rolls)
+
+
+MONSTER_MAX_CR = 20
+MONSTER_CR_RANGE = 5
+
+
+def _triangular_cdf(
+    x: np.ndarray, left: float, mode: float, right: float
+) -> np.ndarray:
+    """
+    The cumulative distribution function of a triangular distribution
+    """
+    x = np.clip(np.asarray(x, dtype=float), left, right)
+    rising = x <= mode
+    cdf = np.zeros_like(x)
+    if mode > left:
+        cdf[rising] = (x[rising] - left) ** 2 / (
+            (right - left) * (mode - left)
         )
-        damage_arr = damage_roll(hit_arr)
-        return damage_arr
+    if mode < right:
+        cdf[~rising] = 1 - (right - x[~rising]) ** 2 / (
+            (right - left) * (right - mode)
+        )
+    return cdf
+
+
+def _index_probabilities(cr: int, option_count: int) -> np.ndarray:
+    """
+    The exact probability of each index into a list of options, for
+    a rounded, triangularly-distributed value that is roughly
+    centered on CR (see `Monster._choose_value`).
+    Bottom value is bounded by either 0 or CR - 5
+    Top value is bounded by either CR + 5 or max index of options
+    Mode is the scaled CR, which is obtained by dividing the CR
+    by the maximum CR (20) and multiplying by the maximum value of
+    the distribution (the length of the list of options).
+    """
+    # add max possible value of CR+5
+    max_value = min(option_count - 1, cr + MONSTER_CR_RANGE)
+    # add min possible value of CR-5, and force to be below max_value
+    # to be a valid Triangular distribution
+    min_value = min(max(0, cr - MONSTER_CR_RANGE), max_value - 1)
+    # force the mode's boundaries to be inclusively between max and min values
+    mode_value = max(
+        min(cr * max_value / MONSTER_MAX_CR, max_value), min_value
+    )
+    # an index is chosen by every value that rounds to it
+    edges = np.arange(option_count + 1) - 0.5
+    return np.diff(_triangular_cdf(edges, min_value, mode_value, max_value))
+
+
+# the ordered options for each of a Monster's random stats
+MONSTER_STAT_OPTIONS = dict(
+    hit_die=[(i, 1) for i in [6, 8, 10, 12]],
+    constitution_modifier=list(range(-2, 8)),
+    strength_modifier=list(range(-2, 8)),
+    ac=list(range(10, 22)),
+    initiative_bonus=list(range(-2, 9)),
+    hit_bonus=list(range(-2, 10)),
+    damage_bonus=list(range(-2, 7)),
+    # ordered by expected value
+    damage_dice=sorted(
+        itertools.product([4, 6, 8, 10, 12], [1]),
+        key=lambda damage_dice: Die(*damage_dice).expected_value,
+    ),
+)
+# the probability of each option of each stat, for every CR up to the
+# maximum, shaped (MONSTER_MAX_CR + 1, number of options)
+MONSTER_STAT_PROBABILITIES = {
+    stat: np.array(
+        [
+            _index_probabilities(cr, len(options))
+            for cr in range(MONSTER_MAX_CR + 1)
+        ]
+    )
+    for stat, options in MONSTER_STAT_OPTIONS.items()
+}
+# and the cumulative probabilities, to sample from by table lookup
+_MONSTER_STAT_CUMULATIVE = {
+    stat: np.cumsum(probabilities, axis=1)
+    for stat, probabilities in MONSTER_STAT_PROBABILITIES.items()
+}
+
+
+def _monster_stat_cumulative(stat: str, cr: float) -> np.ndarray:
+    """
+    The cumulative probabilities of a stat's options at a CR, from its
+    table for whole CRs, or computed for fractional CRs (e.g. 1/2).
+    """
+    if not 0 <= cr <= MONSTER_MAX_CR:
+        raise ValueError(
+            f"CR must be between 0 and {MONSTER_MAX_CR}, not {cr}"
+        )
+    if cr == int(cr):
+        return _MONSTER_STAT_CUMULATIVE[stat][int(cr)]
+    return np.cumsum(_index_probabilities(cr, len(MONSTER_STAT_OPTIONS[stat])))
+
+
+def monster_stat_distribution(stat: str, cr: int):
+    """
+    The exact distribution of one of a Monster's random stats.
+
+    Parameters
+    ----------
+    stat: str
+        One of MONSTER_STAT_OPTIONS, e.g. "ac"
+    cr: int
+        The CR of the Monster, from 0 to MONSTER_MAX_CR,
+        possibly fractional
+
+    Returns
+    -------
+    options: list
+        The possible values of the stat
+    probabilities: np.ndarray
+        The probability of each value
+    """
+    return MONSTER_STAT_OPTIONS[stat], np.diff(
+        _monster_stat_cumulative(stat, cr), prepend=0
+    )
 
 
 class Monster(Character):
@@ -318,83 +513,55 @@ class Monster(Character):
         self.level = self.cr
 
     @staticmethod
-    def _choose_value(cr: int, options: list, factor: int = 1, scale: int = 1):
+    def _choose_value(stat: str, cr: int):
         """
         Prototypical function for choosing values based
-        on CR. Choose a rounded, triangularly-distributed value
-        that is roughly centered on CR, and index the ordered options with
-        that value to produce an output.
-        Bottom value is bounded by either 0 or CR - 5
-        Top value is bounded by either CR + 5 or max index of options
-        Mode is the scaled CR, which is obtained by dividing the CR
-        by the maximum CR (20) and multiplying by the maximum value of
-        the distribution (the length of the list of options).
-        With the above parameters, as CR increases, so does the mode, and
-        potentially the bottom and top bounds.
-        E.g., with input options = [1, 2, 3, 4, 5, 6, 7], a higher CR will
+        on CR. Choose a rounded, triangularly-distributed index
+        that is roughly centered on CR into the ordered options of a stat,
+        by looking a uniform random number up in the stat's table of
+        cumulative probabilities (see `_index_probabilities`).
+        E.g., with options = [1, 2, 3, 4, 5, 6, 7], a higher CR will
         more often produce an index of [6], which corresponds to
-        a value of 3. A lower CR will more oftten produce an index
-        of [0], which corresponds to a value of 1. A CR of 20 will
-        have bounds (5, 6, 6), which will most often result in returning
-        an index of [6], and the corresponding value of 7.
+        a value of 7. A lower CR will more often produce an index
+        of [0], which corresponds to a value of 1.
 
         Parameters
         ----------
+        stat: str
+            One of MONSTER_STAT_OPTIONS, e.g. "ac"
         cr: int
-            The mean of the normal distribution
-        options: list
-            Ordered list of choices for the output
-        factor: int
-            The scaling factor to divide the normal RV by before
-            rounding to get the index - higher generally results in
-            a lower final value
-        scale: int
-            The standard deviation of the normal distribution
-        """
-        max_cr = 20
-        cr_range = 5
-        if cr > max_cr:
-            raise NotImplementedError("Only up to CR 20 is supported!")
-        # add max possible value of CR+5
-        max_value = min(len(options) - 1, cr + cr_range)
-        # add min possible value of CR-5, and force to be below max_value
-        # to be a valid Triangular distribution
-        min_value = min(max(0, cr - cr_range), max_value - 1)
-        # force the mode's boundaries to be inclusively between max and min values
-        mode_value = max(min(cr * max_value / max_cr, max_value), min_value)
-        index = round(np.random.triangular(min_value, mode_value, max_value))
-        return options[index]
+            The CR of the Monster, from 0 to MONSTER_MAX_CR,
+            possibly fractional
+        """
+        cumulative = _monster_stat_cumulative(stat, cr)
+        index = min(
+            np.searchsorted(
+                cumulative, random_state().random_sample(), "right"
+            ),
+            len(cumulative) - 1,
+        )
+        return MONSTER_STAT_OPTIONS[stat][index]
 
     def choose_hit_die(self, cr: int) -> Tuple[int, int]:
         """
         Randomly choose a Hit Die (the Die to use to roll for HP increase
         at each level up).
         """
-        hit_die_options = [(i, 1) for i in [6, 8, 10, 12]]
-        hit_die = self._choose_value(cr, hit_die_options, factor=3, scale=2)
-        return hit_die
+        return self._choose_value("hit_die", cr)
 
     def choose_constitution_modifier(self, cr: int) -> int:
         """
         Randomly choose a constitution modifier (the static value
         added to a Character's HP at each level up).
         """
-        constituion_modifier_options = list(range(-2, 8))
-        constituion_modifier = self._choose_value(
-            cr, constituion_modifier_options, factor=3, scale=2
-        )
-        return constituion_modifier
+        return self._choose_value("constitution_modifier", cr)
 
     def choose_strength_modifier(self, cr: int) -> int:
         """
         Randomly choose a strength modifier (the static value
         added to a Character's to-hit and damage rolls).
         """
-        strength_modifier_options = list(range(-2, 8))
-        strength_modifier = self._choose_value(
-            cr, strength_modifier_options, factor=3, scale=2
-        )
-        return strength_modifier
+        return self._choose_value("strength_modifier", cr)
 
     def choose_ac(self, cr: int) -> int:
         """
@@ -402,20 +569,14 @@ class Monster(Character):
         whether or not an attack against it hits (to-hit>=AC) or
         misses (to-hit<AC)).
         """
-        ac_options = list(range(10, 22))
-        ac = self._choose_value(cr, ac_options, factor=5, scale=2)
-        return ac
+        return self._choose_value("ac", cr)
 
     def choose_initiative_bonus(self, cr: int) -> int:
         """
         Randomly choose an initiative bonus (the static value added
         to a d20 roll to determine which character goes first in a round).
         """
-        initiative_bonus_options = list(range(-2, 9))
-        initiative_bonus = self._choose_value(
-            cr, initiative_bonus_options, factor=2, scale=1
-        )
-        return initiative_bonus
+        return self._choose_value("initiative_bonus", cr)
 
     def choose_hit_bonus(self, cr: int) -> int:
         """
@@ -423,30 +584,19 @@ class Monster(Character):
         attack roll to determine whether or not an attack hits (to-hit>=AC)
         or misses (to-hit<AC)).
         """
-        hit_bonus_options = list(range(-2, 10))
-        hit_bonus = self._choose_value(
-            cr, hit_bonus_options, factor=2, scale=2
-        )
-        return hit_bonus
+        return self._choose_value("hit_bonus", cr)
 
     def choose_damage_bonus(self, cr: int) -> int:
         """
         Randomly choose a damage bonus (the static value added to a damage roll
         to determine how much damange is dealt to the target on a successful hit).
         """
-        damage_bonus_options = list(range(-2, 7))
-        damage_bonus = self._choose_value(
-            cr, damage_bonus_options, factor=2, scale=2
-        )
-        return damage_bonus
+        return self._choose_value("damage_bonus", cr)
 
     def choose_damage_dice(self, cr: int) -> Tuple[int, int]:
         """
-        Choose the damage dice of a monster based on its CR
-        Damage dice will be normally distributed around the index
-        that corresponds to the input CR.
-        Do some fancy ordering based on the expected value of each
-        dice tuple.
+        Choose the damage dice of a monster based on its CR,
+        from the options ordered by expected value.
 
         Parameters
         ----------
@@ -458,22 +608,4 @@ class Monster(Character):
         damage_dice: tuple(int, int)
             The tuple of damage dice
         """
-
-        damage_dice_options = itertools.product([4, 6, 8, 10, 12], [1])
-
-        unordered_dice = {
-            damage_dice: Die(*damage_dice).expected_value
-            for damage_dice in damage_dice_options
-        }
-        ordered_dice = OrderedDict(
-            {
-                die: expected_value
-                for die, expected_value in sorted(
-                    unordered_dice.items(), key=lambda item: item[1]
-                )
-            }
-        )
-        damage_dice = self._choose_value(
-            cr, list(ordered_dice), factor=4, scale=1
-        )
-        return damage_dice
+        return self._choose_value("damage_dice", cr)
@@ -1,7 +1,192 @@
-import functools
+import contextlib
+import itertools
+import math
+import threading
+from typing import Callable
+
 import numpy as np
 
 
+SAMPLING_MODES = ["random", "stratified"]
+
+_thread_local = threading.local()
+
+
+def random_state():
+    """
+    The random state to roll dice with: the calling thread's own, if it
+    was given one by `use_random_state`, otherwise NumPy's global random
+    state (the `np.random` module, which has the same methods).
+    """
+    return getattr(_thread_local, "random_state", np.random)
+
+
+@contextlib.contextmanager
+def use_random_state(state: np.random.RandomState):
+    """
+    Roll every die in the calling thread with `state` instead of NumPy's
+    global random state, within the context. Other threads are unaffected,
+    so threads with their own random states can roll dice in parallel.
+    """
+    previous = random_state()
+    _thread_local.random_state = state
+    try:
+        yield state
+    finally:
+        _thread_local.random_state = previous
+
+
+def _primes(count: int) -> list:
+    primes = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % prime for prime in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def scrambled_halton(n: int, dimensions: int) -> np.ndarray:
+    """
+    Construct n points of a Halton low-discrepancy sequence, with every
+    digit of every dimension scrambled by a random permutation.
+    Each point is uniformly distributed on [0, 1)^dimensions,
+    while the n points together cover it far more evenly
+    than independent uniform points would.
+
+    Parameters
+    ----------
+    n: int
+        The number of points
+    dimensions: int
+        The number of dimensions of each point
+
+    Returns
+    -------
+    points: np.ndarray
+        Array of shape (dimensions, n)
+    """
+    points = np.zeros((dimensions, n))
+    for dimension, base in enumerate(_primes(dimensions)):
+        index = np.arange(n)
+        scale = 1.0
+        for _ in range(max(1, math.ceil(math.log(max(n, 2), base)))):
+            scale /= base
+            points[dimension] += (
+                random_state().permutation(base)[index % base] * scale
+            )
+            index //= base
+        # digits beyond those that distinguish the n points are random
+        points[dimension] += random_state().random_sample(n) * scale
+    return points
+
+
+def _face_table(sides: int) -> np.ndarray:
+    """
+    The face of a die for every value of a random byte (or pair of bytes,
+    for dice with more than 256 sides), or 0 for the values past the
+    largest multiple of `sides`, which would favor the lowest faces.
+    """
+    if sides not in _face_tables:
+        span = 256 if sides <= 256 else 2**16
+        values = np.arange(span)
+        _face_tables[sides] = np.where(
+            values < span - span % sides, values % sides + 1, 0
+        )
+    return _face_tables[sides]
+
+
+_face_tables = dict()
+
+
+def randint_faces(sides: int, size) -> np.ndarray:
+    """
+    Roll faces of a die with one call to `randint`.
+    """
+    return random_state().randint(1, sides + 1, size)
+
+
+def bytes_faces(sides: int, size) -> np.ndarray:
+    """
+    Roll faces of a die from raw random bytes drawn in bulk: every byte
+    (or pair of bytes) is looked up in a table of faces, and only the
+    few that fall past the largest multiple of `sides` are drawn again,
+    so every face is equally likely. Dice whose sides divide 256
+    never draw again.
+    """
+    table = _face_table(sides)
+    dtype = np.uint8 if len(table) == 256 else np.uint16
+    n = int(np.prod(size))
+    faces = table[
+        np.frombuffer(random_state().bytes(n * dtype().itemsize), dtype)
+    ]
+    if table[-1] == 0:
+        rejected = np.flatnonzero(faces == 0)
+        while len(rejected):
+            faces[rejected] = table[
+                np.frombuffer(
+                    random_state().bytes(len(rejected) * dtype().itemsize),
+                    dtype,
+                )
+            ]
+            rejected = rejected[faces[rejected] == 0]
+    return faces.reshape(size)
+
+
+face_backends = {
+    "bytes": bytes_faces,
+    "randint": randint_faces,
+}
+DEFAULT_FACE_BACKEND = "bytes"
+
+
+def roll_faces(sides: int, size, backend: str = None) -> np.ndarray:
+    """
+    Roll independent, uniformly random faces of a die.
+
+    Parameters
+    ----------
+    sides: int
+        The number of sides of the die, at most 2**16
+    size: int or tuple
+        The shape of the array of faces
+    backend: str
+        "bytes" or "randint", defaults to DEFAULT_FACE_BACKEND
+
+    Returns
+    -------
+    faces: np.ndarray
+        Array of faces from 1 to sides
+    """
+    return face_backends[backend or DEFAULT_FACE_BACKEND](sides, size)
+
+
+def stratified_faces(sides: int, n: int) -> np.ndarray:
+    """
+    Construct an array of length n of faces of a single die in random
+    order, with every face occurring equally often. When n isn't a
+    multiple of `sides`, the remainder is drawn without replacement.
+    """
+    repeats, remainder = divmod(n, sides)
+    faces = np.concatenate(
+        [
+            np.tile(np.arange(1, sides + 1), repeats),
+            random_state().choice(sides, remainder, replace=False) + 1,
+        ]
+    )
+    return random_state().permutation(faces)
+
+
+def _convolve_dice(pmf: np.ndarray, number: int) -> np.ndarray:
+    """
+    The PMF of the total of `number` independent dice with the same PMF.
+    """
+    total = np.ones(1)
+    for _ in range(number):
+        total = np.convolve(total, pmf)
+    return total
+
+
 class Die:
     """
     A class that supports generating arrays of discrete random numbers
@@ -15,7 +200,7 @@ class Die:
     def display(self):
         return f"{self.number}d{self.sides}"
 
-    def roll(self, n: int = 1):
+    def roll(self, n: int = 1, sampling: str = "random"):
         """
         Construct an array of length n of the sum of x rolls
         e.g., Die(sides=6, number=2).roll(n=10) -> an array of 10 2d6 rolls
@@ -24,22 +209,45 @@ class Die:
         ----------
         n: int
             The number of trials
+        sampling: str
+            "random" for independent rolls, or "stratified" for rolls
+            from a scrambled low-discrepancy sequence, which estimate
+            averages far more precisely for the same n
 
         Returns
         -------
         roll_arr: np.ndarray
             The array of roll results
         """
+        if sampling == "stratified":
+            return self.low_discrepancy_faces(n, self.number).sum(axis=0)
 
-        roll_arr = functools.reduce(
-            np.add,
-            (
-                np.random.randint(1, self.sides + 1, n)
-                for _ in range(self.number)
-            ),
-        )
+        roll_arr = roll_faces(self.sides, (self.number, n)).sum(axis=0)
         return roll_arr
 
+    def pmf(self) -> np.ndarray:
+        """
+        The exact probability of every total, indexed by value
+        """
+        return _convolve_dice(
+            np.concatenate([[0], np.full(self.sides, 1 / self.sides)]),
+            self.number,
+        )
+
+    def with_number(self, number: int):
+        """
+        The same kind of dice, with a different number of dice
+        """
+        return type(self)(self.sides, number)
+
+    def low_discrepancy_faces(self, n: int, dimensions: int) -> np.ndarray:
+        """
+        Construct an array of shape (dimensions, n) of die faces
+        from a scrambled Halton sequence
+        """
+        points = scrambled_halton(n, dimensions)
+        return np.floor(points * self.sides).astype(int) + 1
+
     def sum_roll(self, n: int = 1):
         """
         Calculate the sum of n rolls
@@ -86,58 +294,333 @@ class D20(Die):
     def __init__(self):
         super().__init__(sides=20, number=1)
 
-    def roll_with_advantage(self, n=1):
+    def roll(self, n: int = 1, sampling: str = "random"):
+        """
+        Overloaded function for rolling that stratifies the faces
+        when sampling is "stratified": every face occurs
+        in equal proportion, in random order
+        """
+        if sampling == "stratified":
+            return stratified_faces(self.sides, n)
+        return super().roll(n)
+
+    def _roll_pair(self, n: int, sampling: str):
+        if sampling == "stratified":
+            # enumerate every pair of faces in equal proportion
+            pairs = stratified_faces(self.sides**2, n) - 1
+            return pairs // self.sides + 1, pairs % self.sides + 1
+        return roll_faces(self.sides, (2, n))
+
+    def roll_with_advantage(self, n=1, sampling: str = "random"):
         """
         Roll a D20 n*2 times, keeping the better of each pair of rolls
         """
-        return np.maximum(self.roll(n), self.roll(n))
+        return np.maximum(*self._roll_pair(n, sampling))
 
-    def roll_with_disadvantage(self, n=1):
+    def roll_with_disadvantage(self, n=1, sampling: str = "random"):
         """
         Roll a D20 n*2 times, keeping the worse of each pair of rolls
         """
-        return np.minimum(self.roll(n), self.roll(n))
+        return np.minimum(*self._roll_pair(n, sampling))
 
 
-class GWFDie(Die):
+class DieModifier:
     """
-    A damage die/dice to use with the feat:
-    Great Weapon Fighting
-    When you roll a 1 or 2 on a damage die for an Attack
-    you make with a melee weapon that you are Wielding with two hands,
-    you can Reroll the die and must use the new roll,
-    even if the new roll is a 1 or a 2. The weapon must have
-    the Two-Handed or Versatile property for you to gain this benefit.
+    A rule that changes how a set of dice is rolled, applied to the faces
+    of every die in a batch of rolls at once, with a matching exact PMF.
+
+    Per-die modifiers (`per_die = True`) change each die on its own,
+    so their PMF is a change to the PMF of a single die. The others
+    combine the dice of a roll, and produce the PMF of its total.
     """
 
-    def __init__(self, sides, number):
+    per_die = True
+    # whether `pmf` changes the PMF of a single die, or of the total
+    pmf_of = "die"
+
+    def apply(
+        self, faces: np.ndarray, sides: int, redraw: Callable
+    ) -> np.ndarray:
+        """
+        Apply the rule to a batch of rolls.
+
+        Parameters
+        ----------
+        faces: np.ndarray
+            Array of faces shaped (n, number of dice)
+        sides: int
+            The number of sides of the dice
+        redraw: Callable
+            redraw() -> np.ndarray
+            Roll a fresh array of faces shaped like `faces`, following
+            every modifier before this one, for any dice rolled again
+
+        Returns
+        -------
+        faces: np.ndarray
+            Array of faces shaped (n, number of dice kept)
+        """
+        raise NotImplementedError
+
+    def pmf(self, pmf: np.ndarray, sides: int, number: int) -> np.ndarray:
+        """
+        Change a PMF indexed by value: that of a single die, or of
+        the total of a roll of `number` dice, as given by `pmf_of`.
+        """
+        raise NotImplementedError
+
+    def kept(self, number: int) -> int:
+        """
+        The number of dice left after the rule is applied
+        """
+        return number
+
+
+class Reroll(DieModifier):
+    """
+    Reroll any die showing at_most or less once, and use the new roll,
+    e.g. Reroll(2) for Great Weapon Fighting.
+    """
+
+    def __init__(self, at_most: int) -> None:
+        self.at_most = at_most
+
+    def apply(self, faces, sides, redraw):
+        return np.where(faces <= self.at_most, redraw(), faces)
+
+    def pmf(self, pmf, sides, number):
+        rerolled = pmf[: self.at_most + 1].sum()
+        kept = pmf.copy()
+        kept[: self.at_most + 1] = 0
+        return kept + rerolled * pmf
+
+
+class Minimum(DieModifier):
+    """
+    Treat any die showing less than face as face,
+    e.g. Minimum(2) for Elemental Adept.
+    """
+
+    def __init__(self, face: int) -> None:
+        self.face = face
+
+    def apply(self, faces, sides, redraw):
+        return np.maximum(faces, self.face)
+
+    def pmf(self, pmf, sides, number):
+        raised = np.zeros(max(len(pmf), self.face + 1))
+        raised[: len(pmf)] = pmf
+        raised[self.face] = raised[: self.face + 1].sum()
+        raised[: self.face] = 0
+        return raised
+
+
+class Explode(DieModifier):
+    """
+    Roll any die showing its highest face again, and add the new roll,
+    up to limit extra rolls per die.
+    """
+
+    def __init__(self, limit: int = 5) -> None:
+        self.limit = limit
+
+    def apply(self, faces, sides, redraw):
+        last = faces
+        total = faces.copy()
+        for _ in range(self.limit):
+            exploding = last == sides
+            if not exploding.any():
+                break
+            last = np.where(exploding, redraw(), 0)
+            total += last
+        return total
+
+    def pmf(self, pmf, sides, number):
+        exploded = pmf
+        for _ in range(self.limit):
+            # a die showing its highest face adds another exploding roll
+            chained = np.zeros(sides + len(exploded))
+            chained[: len(pmf)] = pmf
+            chained[sides] = 0
+            chained[sides:] += pmf[sides] * exploded
+            exploded = chained
+        return exploded
+
+
+class KeepHighest(DieModifier):
+    """
+    Keep only the highest `keep` dice of each roll.
+    """
+
+    per_die = False
+    highest = True
+
+    def __init__(self, keep: int) -> None:
+        self.keep = keep
+
+    def kept(self, number):
+        return min(self.keep, number)
+
+    def apply(self, faces, sides, redraw):
+        faces = np.sort(faces, axis=1)
+        if self.highest:
+            return faces[:, faces.shape[1] - self.kept(faces.shape[1]) :]
+        return faces[:, : self.kept(faces.shape[1])]
+
+    def pmf(self, pmf, sides, number):
+        # enumerate every combination of faces, which grows
+        # as (number of values a die can show) ** number
+        values = np.flatnonzero(pmf)
+        combinations = np.array(
+            list(itertools.product(range(len(values)), repeat=number))
+        ).reshape(-1, number)
+        faces = np.sort(values[combinations], axis=1)
+        if self.highest:
+            faces = faces[:, number - self.kept(number) :]
+        else:
+            faces = faces[:, : self.kept(number)]
+        probabilities = np.prod(pmf[values][combinations], axis=1)
+        return np.bincount(faces.sum(axis=1), weights=probabilities)
+
+
+class KeepLowest(KeepHighest):
+    """
+    Keep only the lowest `keep` dice of each roll.
+    """
+
+    highest = False
+
+
+class KeepHigherRoll(DieModifier):
+    """
+    Roll every die twice, and keep the roll with the higher total,
+    e.g. for Savage Attacker.
+    """
+
+    per_die = False
+    pmf_of = "total"
+
+    def apply(self, faces, sides, redraw):
+        second = redraw()
+        keep_first = faces.sum(axis=1) >= second.sum(axis=1)
+        return np.where(keep_first[:, np.newaxis], faces, second)
+
+    def pmf(self, pmf, sides, number):
+        # the larger of two independent totals
+        return np.diff(np.cumsum(pmf) ** 2, prepend=0)
+
+
+class ModifiedDie(Die):
+    """
+    Dice rolled with any number of modifiers, applied in order to every
+    die of every roll at once. Per-die modifiers (e.g. `Reroll`,
+    `Minimum`, `Explode`) must come before those that combine the dice
+    of a roll (e.g. `KeepHighest`, `KeepHigherRoll`).
+
+    Parameters
+    ----------
+    sides: int
+        The number of sides of each die
+    number: int
+        The number of dice rolled
+    modifiers: list
+        The DieModifiers to apply, in order
+    """
+
+    def __init__(
+        self, sides: int, number: int = 1, modifiers: list = ()
+    ) -> None:
+        self.modifiers = list(modifiers)
+        per_die = [modifier.per_die for modifier in self.modifiers]
+        if per_die != sorted(per_die, reverse=True):
+            raise ValueError(
+                "Per-die modifiers must come before modifiers "
+                "that combine the dice of a roll"
+            )
         super().__init__(sides=sides, number=number)
+        pmf = self.pmf()
+        self.expected_value = float(np.dot(np.arange(len(pmf)), pmf))
 
-    def roll(self, n: int = 1):
+    def with_number(self, number: int):
+        return ModifiedDie(self.sides, number, self.modifiers)
+
+    def _faces(self, n: int, count: int, sampling: str) -> np.ndarray:
+        """
+        Roll the faces of a batch of n rolls, shaped (n, dice),
+        with the first `count` modifiers applied
         """
-        Overloaded function for rolling that allows for
-        rerolling 1s and 2s once per attack.
+        if sampling == "stratified":
+            # shuffled, so the points of a redraw aren't correlated
+            # with the points at the same index in the first draw
+            faces = random_state().permutation(
+                self.low_discrepancy_faces(n, self.number).T
+            )
+        else:
+            faces = roll_faces(self.sides, (n, self.number))
+        for index, modifier in enumerate(self.modifiers[:count]):
 
-        Construct an array of length n of the sum of x rolls
-        e.g., Die(sides=6, number=2).roll(n=10) -> an array of 10 2d6 rolls
+            def redraw(index=index):
+                return self._faces(n, index, sampling)
+
+            faces = modifier.apply(faces, self.sides, redraw)
+        return faces
+
+    def roll(self, n: int = 1, sampling: str = "random"):
+        """
+        Construct an array of length n of the total of each roll,
+        after every modifier.
 
         Parameters
         ----------
         n: int
             The number of trials
+        sampling: str
+            "random" or "stratified", see `Die.roll`
 
         Returns
         -------
         roll_arr: np.ndarray
             The array of roll results
         """
-        all_arr = []
-        for _ in range(self.number):
-            roll_arr = np.random.randint(1, self.sides + 1, n)
-            roll_arr[roll_arr <= 2] = np.random.randint(
-                1, self.sides + 1, len(roll_arr[roll_arr <= 2])
-            )
-            all_arr.append(roll_arr)
-        gwf_roll_arr = functools.reduce(np.add, all_arr)
+        return self._faces(n, len(self.modifiers), sampling).sum(axis=1)
+
+    def pmf(self) -> np.ndarray:
+        """
+        The exact probability of every total, indexed by value
+        """
+        pmf = Die(self.sides).pmf()
+        number = self.number
+        # whether pmf is of the total of a roll, rather than of one die
+        combined = False
+        for modifier in self.modifiers:
+            if modifier.pmf_of == "total" and not combined:
+                pmf, combined = _convolve_dice(pmf, number), True
+            elif modifier.pmf_of == "die" and combined:
+                raise ValueError(
+                    f"{type(modifier).__name__} has no exact PMF "
+                    "once the dice of a roll have been combined"
+                )
+            pmf = modifier.pmf(pmf, self.sides, number)
+            number = modifier.kept(number)
+            combined = combined or not modifier.per_die
+        if not combined:
+            pmf = _convolve_dice(pmf, number)
+        return pmf
+
+
+class GWFDie(ModifiedDie):
+    """
+    A damage die/dice to use with the feat:
+    Great Weapon Fighting
+    When you roll a 1 or 2 on a damage die for an Attack
+    you make with a melee weapon that you are Wielding with two hands,
+    you can Reroll the die and must use the new roll,
+    even if the new roll is a 1 or a 2. The weapon must have
+    the Two-Handed or Versatile property for you to gain this benefit.
+    """
+
+    def __init__(self, sides, number):
+        super().__init__(sides=sides, number=number, modifiers=[Reroll(2)])
 
-        return gwf_roll_arr
+    def with_number(self, number: int):
+        return GWFDie(self.sides, number)
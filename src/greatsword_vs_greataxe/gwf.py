@@ -4,18 +4,18 @@ Great Weapon Fighting feat, which allows 1s and 2s to be
 rerolled once.
 """
 
-import os
+import argparse
 from collections import OrderedDict
 
 import plotly.graph_objects as go
 
 from die import Die, GWFDie
-from utils import images_directory
+from rendering import ChartRenderer, render_arguments
 
 
 def create_chart(
-    data: dict, filename: str, xaxis_title: str = None, yaxis_title: str = None
-):
+    data: dict, xaxis_title: str = None, yaxis_title: str = None
+) -> go.Figure:
     fig = go.Figure(
         go.Bar(
             x=list(data.keys()),
@@ -30,10 +30,18 @@ def create_chart(
         width=800,
         height=400,
     )
-    fig.write_image(os.path.join(images_directory, filename))
+    return fig
 
 
-def main():
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        parents=[render_arguments()],
+    )
+    args = parser.parse_args(argv)
+    renderer = ChartRenderer.from_args(args)
+
     replications = 100_000
     greatsword_die = (6, 2)
     greataxe_die = (12, 1)
@@ -55,12 +63,15 @@ def main():
     }
     data = OrderedDict(**greatsword, **greataxe)
 
-    create_chart(
-        data,
+    renderer.add(
+        create_chart(
+            data,
+            xaxis_title="Weapon",
+            yaxis_title="Average Damage",
+        ),
         filename,
-        xaxis_title="Weapon",
-        yaxis_title="Average Damage",
     )
+    renderer.render()
 
 
 if __name__ == "__main__":
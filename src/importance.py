@@ -0,0 +1,287 @@
+"""
+Importance sampling for rare events, like a Barbarian killing a
+monster within two rounds, or landing several critical hits in a row.
+
+Plain simulation almost never produces these events, so estimating their
+probability would need an enormous number of replications. Instead, the
+d20 and damage dice are rolled from distributions tilted towards high
+faces, where the event is common, and every replication is weighted by
+its likelihood ratio: the probability of its rolls under fair dice
+divided by their probability under the tilted dice. The weighted average
+of the event's indicator is an unbiased estimate of its probability.
+
+The tilt is a (critical_rate, damage_tilt) pair: the probability of
+rolling a natural 20 on each d20, where 0.05 is a fair die, and how
+strongly damage dice favor high faces, where 0 is a fair die.
+"""
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from accumulators import MeanVarianceAccumulator
+from die import random_state
+from kernels import attack_profile
+
+
+FAIR_TILT = (0.05, 0.0)
+# tilts tried by pilot runs when none is given
+TILT_GRID = [
+    (critical_rate, damage_tilt)
+    for critical_rate in [0.05, 0.15, 0.3, 0.5, 0.7]
+    for damage_tilt in [0.0, 1.0, 2.0, 3.0, 4.0]
+]
+
+
+class Estimate(NamedTuple):
+    """
+    A weighted estimate of a probability, with its standard error
+    and the tilt it was estimated with.
+    """
+
+    probability: float
+    standard_error: float
+    tilt: tuple
+
+
+def biased_faces(log_q: np.ndarray, shape: tuple):
+    """
+    Roll biased dice, with the log-probability of each face given by log_q
+
+    Parameters
+    ----------
+    log_q: np.ndarray
+        Array of the log-probability of each face, starting from 1
+    shape: tuple
+        The shape of the array of faces to roll
+
+    Returns
+    -------
+    faces: np.ndarray
+        Array of faces
+    log_weights: np.ndarray
+        Array of the log-likelihood ratio (fair/biased) of each face
+    """
+    sides = len(log_q)
+    faces = random_state().choice(sides, size=shape, p=np.exp(log_q)) + 1
+    log_weights = -np.log(sides) - log_q[faces - 1]
+    return faces, log_weights
+
+
+def tilted_damage_faces(sides: int, shape: tuple, tilt: float):
+    """
+    Roll damage dice with the probability of each face proportional to
+    exp(tilt * face / sides), i.e. favoring high faces when tilt > 0.
+    See `biased_faces`.
+    """
+    log_q = tilt * np.arange(1, sides + 1) / sides
+    log_q -= np.log(np.sum(np.exp(log_q)))
+    return biased_faces(log_q, shape)
+
+
+def tilted_d20_faces(shape: tuple, critical_rate: float):
+    """
+    Roll d20s with a natural 20 rolled with probability critical_rate,
+    and every other face equally likely. See `biased_faces`.
+    """
+    q = np.full(20, (1 - critical_rate) / 19)
+    q[19] = critical_rate
+    return biased_faces(np.log(q), shape)
+
+
+def tilted_attacks(
+    attacker,
+    target,
+    n: int,
+    advantage: bool = False,
+    tilt: tuple = FAIR_TILT,
+):
+    """
+    Roll n attacks with tilted dice, following the same rules as
+    `Character.hit` and `Character.damage`.
+
+    Parameters
+    ----------
+    attacker: Character
+    target: Character
+    n: int
+        The number of attacks
+    advantage: bool
+        Whether to roll the d20 twice and take the better
+    tilt: tuple
+        The (critical_rate, damage_tilt) to roll with
+
+    Returns
+    -------
+    hit_arr: np.ndarray
+        Array of misses (0), hits (1) and critical hits (2)
+    damage_arr: np.ndarray
+        Array of damage rolls
+    log_weight_arr: np.ndarray
+        Array of the log-likelihood ratio of each attack's rolls
+    """
+    profile = attack_profile(attacker)
+    critical_rate, damage_tilt = tilt
+
+    d20_faces, d20_log_weights = tilted_d20_faces(
+        (n, 2 if advantage else 1), critical_rate
+    )
+    natural_roll = d20_faces.max(axis=1)
+    hit_arr = np.select(
+        [
+            natural_roll == 20,
+            natural_roll == 1,
+            natural_roll + profile.hit_bonus >= target.ac,
+        ],
+        [2, 0, 1],
+    )
+    log_weight_arr = d20_log_weights.sum(axis=1)
+
+    # roll every die an attack could use: two sets of damage dice,
+    # the extra critical dice, and a reroll for each of them
+    dice = 2 * profile.damage_number + profile.extra_critical_dice
+    faces, face_log_weights = tilted_damage_faces(
+        profile.damage_sides, (n, dice), damage_tilt
+    )
+    rerolls, reroll_log_weights = tilted_damage_faces(
+        profile.damage_sides, (n, dice), damage_tilt
+    )
+    dice_rolled = np.concatenate(
+        [
+            np.repeat(1, profile.damage_number),
+            np.repeat(2, profile.damage_number + profile.extra_critical_dice),
+        ]
+    )
+    used = hit_arr[:, np.newaxis] >= dice_rolled
+    rerolled = used & (faces <= profile.reroll_at_most)
+    faces = np.where(rerolled, rerolls, faces)
+
+    # only the rolls that were used count towards the likelihood ratio
+    damage_arr = (faces * used).sum(axis=1) + profile.damage_bonus * hit_arr
+    log_weight_arr += (face_log_weights * used).sum(axis=1)
+    log_weight_arr += (reroll_log_weights * rerolled).sum(axis=1)
+    return hit_arr, damage_arr, log_weight_arr
+
+
+def tail_probability(
+    attacker,
+    target,
+    rounds: int,
+    event: Callable,
+    replications: int = 100_000,
+    advantage: bool = False,
+    tilt: tuple = None,
+    batch_size: int = 100_000,
+) -> Estimate:
+    """
+    Estimate the probability of a rare event over a number of rounds
+    of attacks against a target, with importance sampling.
+
+    Parameters
+    ----------
+    attacker: Character
+    target: Character
+    rounds: int
+        The number of rounds of attacks in each replication, each with
+        the attacker's `attacks_per_round` attacks
+    event: Callable
+        event(hit_arr, damage_arr, hp_arr) -> np.ndarray
+        Whether the event occurred in each replication, given arrays
+        of hits and damage shaped (replications, rounds, attacks per
+        round), and the target's hp in each replication
+    replications: int
+        The number of replications
+    advantage: bool
+        Whether the attacker rolls with advantage
+    tilt: tuple
+        The (critical_rate, damage_tilt) to roll with
+        Chosen with short pilot runs when not given
+    batch_size: int
+        The number of replications to simulate at once
+
+    Returns
+    -------
+    estimate: Estimate
+    """
+    if tilt is None:
+        tilt = choose_tilt(attacker, target, rounds, event, advantage)
+
+    weighted_events = MeanVarianceAccumulator()
+    for start in range(0, replications, batch_size):
+        n = min(batch_size, replications - start)
+        shape = (n, rounds, attacker.attacks_per_round)
+        hit_arr, damage_arr, log_weight_arr = tilted_attacks(
+            attacker, target, np.prod(shape), advantage, tilt
+        )
+        occurred = event(
+            hit_arr.reshape(shape),
+            damage_arr.reshape(shape),
+            target.roll_hp(n),
+        )
+        weights = np.exp(log_weight_arr.reshape(n, -1).sum(axis=1))
+        weighted_events.update(occurred * weights)
+    return Estimate(weighted_events.mean, weighted_events.standard_error, tilt)
+
+
+def choose_tilt(
+    attacker,
+    target,
+    rounds: int,
+    event: Callable,
+    advantage: bool = False,
+    pilot_replications: int = 2_000,
+) -> tuple:
+    """
+    Run a short pilot for every tilt in TILT_GRID, and choose the one
+    with the smallest relative standard error.
+    """
+    best_tilt, best_error = TILT_GRID[-1], np.inf
+    for tilt in TILT_GRID:
+        probability, standard_error, _ = tail_probability(
+            attacker,
+            target,
+            rounds,
+            event,
+            pilot_replications,
+            advantage,
+            tilt,
+        )
+        if probability > 0 and standard_error / probability < best_error:
+            best_tilt, best_error = tilt, standard_error / probability
+    return best_tilt
+
+
+def kill_probability(attacker, target, rounds: int, **kwargs) -> Estimate:
+    """
+    Estimate the probability that an attacker reduces a target
+    to 0 hit points within a number of rounds.
+    See `tail_probability` for other arguments.
+    """
+
+    def killed(hit_arr, damage_arr, hp_arr):
+        return damage_arr.sum(axis=(1, 2)) >= hp_arr
+
+    return tail_probability(attacker, target, rounds, killed, **kwargs)
+
+
+def critical_streak_probability(
+    attacker, target, rounds: int, streak: int, **kwargs
+) -> Estimate:
+    """
+    Estimate the probability that an attacker lands at least `streak`
+    critical hits in a row within a number of rounds, counting every
+    attack of a round in order.
+    See `tail_probability` for other arguments.
+    """
+
+    def critical_streak(hit_arr, damage_arr, hp_arr):
+        critical = (hit_arr == 2).reshape(len(hit_arr), -1).astype(int)
+        run = np.zeros(len(critical), dtype=int)
+        longest = np.zeros(len(critical), dtype=int)
+        for round_critical in critical.T:
+            run = (run + 1) * round_critical
+            longest = np.maximum(longest, run)
+        return longest >= streak
+
+    return tail_probability(
+        attacker, target, rounds, critical_streak, **kwargs
+    )
@@ -0,0 +1,428 @@
+"""
+Kernels for simulating many one-on-one fights at once.
+
+Three interchangeable backends run the round-by-round duel loop:
+
+* `numpy_fight` - batched over replications, rolling every attack of
+  every round of every fight up front, summing the attacks of each
+  round, and searching the cumulative damage for the round of defeat
+* `numba_fight` - a JIT-compiled loop that stops each replication as
+  soon as one side is defeated, running replications in parallel.
+  Only available when the optional `numba` package is installed.
+* `threaded_numpy_fight` - the numpy backend, with chunks of
+  replications spread across a pool of threads, each rolling with its
+  own random state. NumPy's bulk random draws and array operations
+  release the GIL, so the threads run in parallel without the cost of
+  starting processes or copying results between them.
+
+All three take the hp of each Character in every replication, and return
+the round at which each Character was defeated, with `rolls` standing
+in for "not defeated". A fight ends with its first defeat, so at most
+one Character is defeated, unless both fall in the same round.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from die import Reroll, random_state, use_random_state
+
+try:
+    import numba
+except ImportError:  # numba is optional
+    numba = None
+
+
+HAVE_NUMBA = numba is not None
+BACKENDS = (
+    ["numba", "numpy", "threads"] if HAVE_NUMBA else ["numpy", "threads"]
+)
+DEFAULT_BACKEND = BACKENDS[0]
+
+# cap the number of rolls held in memory at once by the numpy backend
+MAX_CHUNK_ROLLS = 2_000_000
+# the number of rolls in each chunk of the threaded backend: small enough
+# for a chunk's arrays to stay in cache, and for every thread to get
+# a chunk in mid-sized jobs, large enough that NumPy calls (which release
+# the GIL) take much longer than the Python code between them (which doesn't)
+THREAD_CHUNK_ROLLS = 2**18
+THREADS = os.cpu_count() or 1
+# the number of fights the numba backend runs with each seed: enough
+# that reseeding its Mersenne Twister is a small part of the work,
+# few enough for every thread to get several chunks in mid-sized jobs
+NUMBA_CHUNK_FIGHTS = 256
+
+
+class AttackProfile(NamedTuple):
+    """
+    The static numbers needed to roll a Character's attacks
+    without the Character object itself.
+    """
+
+    hit_bonus: int
+    damage_sides: int
+    damage_number: int
+    damage_bonus: int
+    reroll_at_most: int
+    extra_critical_dice: int
+    attacks_per_round: int = 1
+
+
+def _reroll_at_most(damage_dice) -> int:
+    """
+    The highest face a Character's damage dice reroll, or 0. A single
+    `Reroll` (e.g. Great Weapon Fighting) is the only modifier
+    the kernels can roll.
+    """
+    modifiers = getattr(damage_dice, "modifiers", [])
+    if not modifiers:
+        return 0
+    if len(modifiers) == 1 and isinstance(modifiers[0], Reroll):
+        return modifiers[0].at_most
+    raise ValueError(
+        "Only damage dice with a single Reroll can be flattened into "
+        "an AttackProfile, not "
+        + ", ".join(type(modifier).__name__ for modifier in modifiers)
+    )
+
+
+def attack_profile(char) -> AttackProfile:
+    """
+    Flatten a Character's attack into an AttackProfile.
+    Raises a ValueError for damage dice the kernels can't roll.
+
+    Parameters
+    ----------
+    char: Character
+        The attacking Character
+
+    Returns
+    -------
+    profile: AttackProfile
+    """
+    damage_dice = char.damage_dice
+    return AttackProfile(
+        hit_bonus=int(char.hit_bonus),
+        damage_sides=damage_dice.sides,
+        damage_number=damage_dice.number,
+        damage_bonus=int(char.damage_bonus),
+        reroll_at_most=_reroll_at_most(damage_dice),
+        extra_critical_dice=int(char.extra_critical_dice),
+        attacks_per_round=int(char.attacks_per_round),
+    )
+
+
+def chunk_seeds(count: int) -> np.ndarray:
+    """
+    Distinct 32-bit seeds for `count` chunks of fights, drawn from
+    the calling thread's random state. Seeds that happen to be drawn
+    twice are drawn again, so no two chunks roll the same numbers.
+    """
+    seeds = random_state().randint(0, 2**32, count, dtype=np.int64)
+    while True:
+        _, first = np.unique(seeds, return_index=True)
+        if len(first) == count:
+            return seeds
+        repeated = np.ones(count, dtype=bool)
+        repeated[first] = False
+        seeds[repeated] = random_state().randint(
+            0, 2**32, np.count_nonzero(repeated), dtype=np.int64
+        )
+
+
+def find_defeat_indices(hp_arr: np.ndarray, damage_arr: np.ndarray):
+    """
+    Vectorized `utils.find_defeat_index`: find, for every replication,
+    the round at which the cumulative damage reaches that replication's hp.
+
+    Parameters
+    ----------
+    hp_arr: np.ndarray
+        Array of hp, one per replication
+    damage_arr: np.ndarray
+        Array of the damage of each round, shaped (replications, rolls)
+
+    Returns
+    -------
+    defeat_arr: np.ndarray
+        Array of defeat rounds, equal to the number of rolls
+        for replications where the target was never defeated
+    """
+    defeated = np.cumsum(damage_arr, axis=1) >= hp_arr[:, np.newaxis]
+    defeat_arr = defeated.argmax(axis=1)
+    defeat_arr[~defeated.any(axis=1)] = damage_arr.shape[1]
+    return defeat_arr
+
+
+def numpy_fight(
+    char1,
+    char2,
+    char1_hp: np.ndarray,
+    char2_hp: np.ndarray,
+    rolls: int = 500,
+):
+    """
+    Simulate one fight between two Characters for every pair of hp
+    with NumPy, rolling all `rolls` rounds of every fight.
+
+    Parameters
+    ----------
+    char1: Character
+    char2: Character
+    char1_hp, char2_hp: np.ndarray
+        Arrays of each Character's hp, one per fight
+    rolls: int = 500
+        The number of rounds for a single fight
+
+    Returns
+    -------
+    char1_defeated_at, char2_defeated_at: np.ndarray
+        Arrays of the rounds at which each Character was defeated
+    """
+    replications = len(char1_hp)
+    char1_defeated_at = np.empty(replications, dtype=int)
+    char2_defeated_at = np.empty(replications, dtype=int)
+    attacks_per_round = max(char1.attacks_per_round, char2.attacks_per_round)
+    chunk_size = max(1, MAX_CHUNK_ROLLS // (rolls * attacks_per_round))
+    for start in range(0, replications, chunk_size):
+        chunk = slice(start, min(start + chunk_size, replications))
+        n = chunk.stop - chunk.start
+        # every attack of every round of the chunk's fights, laid out
+        # as (fights, rounds, attacks) and summed per round
+        char1_damage_arr = char1.attack_rounds(char2, n * rolls).reshape(
+            n, rolls
+        )
+        char2_damage_arr = char2.attack_rounds(char1, n * rolls).reshape(
+            n, rolls
+        )
+        char1_defeated_at[chunk] = find_defeat_indices(
+            char1_hp[chunk], char2_damage_arr
+        )
+        char2_defeated_at[chunk] = find_defeat_indices(
+            char2_hp[chunk], char1_damage_arr
+        )
+    # a fight ends with its first defeat, so the other side survives it
+    char1_defeated_at[char1_defeated_at > char2_defeated_at] = rolls
+    char2_defeated_at[char2_defeated_at > char1_defeated_at] = rolls
+    return char1_defeated_at, char2_defeated_at
+
+
+if HAVE_NUMBA:
+
+    @numba.njit(cache=True)
+    def _roll_damage_dice(sides, number, reroll_at_most):
+        total = 0
+        for _ in range(number):
+            face = np.random.randint(1, sides + 1)
+            if face <= reroll_at_most:
+                face = np.random.randint(1, sides + 1)
+            total += face
+        return total
+
+    @numba.njit(cache=True)
+    def _roll_attack(profile, ac):
+        (
+            hit_bonus,
+            damage_sides,
+            damage_number,
+            damage_bonus,
+            reroll_at_most,
+            extra_critical_dice,
+            _,
+        ) = profile
+        natural_roll = np.random.randint(1, 21)
+        if natural_roll == 20:
+            dice_rolled = 2
+        elif natural_roll == 1 or natural_roll + hit_bonus < ac:
+            return 0
+        else:
+            dice_rolled = 1
+        damage = 0
+        for _ in range(dice_rolled):
+            damage += damage_bonus + _roll_damage_dice(
+                damage_sides, damage_number, reroll_at_most
+            )
+        if dice_rolled == 2:
+            damage += _roll_damage_dice(
+                damage_sides, extra_critical_dice, reroll_at_most
+            )
+        return damage
+
+    @numba.njit(cache=True)
+    def _roll_round(profile, ac):
+        damage = 0
+        for _ in range(profile.attacks_per_round):
+            damage += _roll_attack(profile, ac)
+        return damage
+
+    @numba.njit(parallel=True, cache=True)
+    def _numba_fight_kernel(
+        seeds,
+        chunk_fights,
+        char1_hp,
+        char2_hp,
+        char1_profile,
+        char2_profile,
+        ac1,
+        ac2,
+        rolls,
+    ):
+        replications = len(char1_hp)
+        char1_defeated_at = np.full(replications, rolls)
+        char2_defeated_at = np.full(replications, rolls)
+        for chunk in numba.prange(len(seeds)):
+            # seed per chunk so results don't depend on
+            # how chunks are spread across threads
+            np.random.seed(seeds[chunk])
+            start = chunk * chunk_fights
+            for i in range(start, min(start + chunk_fights, replications)):
+                char1_damage = 0
+                char2_damage = 0
+                for round_index in range(rolls):
+                    char2_damage += _roll_round(char1_profile, ac2)
+                    char1_damage += _roll_round(char2_profile, ac1)
+                    char1_defeated = char1_damage >= char1_hp[i]
+                    char2_defeated = char2_damage >= char2_hp[i]
+                    if char1_defeated:
+                        char1_defeated_at[i] = round_index
+                    if char2_defeated:
+                        char2_defeated_at[i] = round_index
+                    if char1_defeated or char2_defeated:
+                        break
+        return char1_defeated_at, char2_defeated_at
+
+
+def numba_fight(
+    char1,
+    char2,
+    char1_hp: np.ndarray,
+    char2_hp: np.ndarray,
+    rolls: int = 500,
+):
+    """
+    Simulate one fight between two Characters for every pair of hp
+    with a JIT-compiled kernel, stopping each fight at its first defeat.
+    Fights run in chunks of NUMBA_CHUNK_FIGHTS, each with its own seed
+    (see `chunk_seeds`) drawn from the calling thread's random state,
+    so `np.random.seed` controls this backend too.
+
+    Parameters
+    ----------
+    char1: Character
+    char2: Character
+    char1_hp, char2_hp: np.ndarray
+        Arrays of each Character's hp, one per fight
+    rolls: int = 500
+        The maximum number of rounds for a single fight
+
+    Returns
+    -------
+    char1_defeated_at, char2_defeated_at: np.ndarray
+        Arrays of the rounds at which each Character was defeated
+    """
+    if not HAVE_NUMBA:
+        raise ImportError("The numba backend requires numba to be installed")
+    seeds = chunk_seeds(-(-len(char1_hp) // NUMBA_CHUNK_FIGHTS))
+    # the kernel already runs in parallel, and not every numba threading
+    # layer supports launching parallel kernels from several threads
+    with _numba_lock:
+        return _numba_fight_kernel(
+            seeds,
+            NUMBA_CHUNK_FIGHTS,
+            char1_hp,
+            char2_hp,
+            attack_profile(char1),
+            attack_profile(char2),
+            char1.ac,
+            char2.ac,
+            rolls,
+        )
+
+
+_numba_lock = threading.Lock()
+
+
+def start_numba_threads():
+    """
+    Start numba's threading layer from the calling thread, by running
+    the fight kernel for no rounds. Some threading layers (TBB) hang at
+    exit when they are first started from any thread but the main one,
+    so call this before running fights in a pool of threads.
+    """
+    if not HAVE_NUMBA:
+        return
+    # laid out like the hp fields of `utils.FIGHT_DTYPE`,
+    # so the kernel isn't compiled for another signature
+    hp = np.zeros(2, dtype=[("hp", np.int32), ("other", np.int32)])["hp"]
+    profile = AttackProfile(0, 1, 1, 0, 0, 0, 1)
+    with _numba_lock:
+        _numba_fight_kernel(
+            np.zeros(2, dtype=np.int64), 1, hp, hp, profile, profile, 0, 0, 0
+        )
+
+
+def threaded_numpy_fight(
+    char1,
+    char2,
+    char1_hp: np.ndarray,
+    char2_hp: np.ndarray,
+    rolls: int = 500,
+    threads: int = None,
+):
+    """
+    Simulate one fight between two Characters for every pair of hp
+    with `numpy_fight`, in chunks spread across a pool of threads.
+    Every chunk rolls with its own random state, with a distinct seed
+    (see `chunk_seeds`) drawn from the calling thread's random state,
+    so results don't depend on the number of threads.
+
+    Parameters
+    ----------
+    char1: Character
+    char2: Character
+    char1_hp, char2_hp: np.ndarray
+        Arrays of each Character's hp, one per fight
+    rolls: int = 500
+        The number of rounds for a single fight
+    threads: int = None
+        The number of threads, by default one per CPU
+
+    Returns
+    -------
+    char1_defeated_at, char2_defeated_at: np.ndarray
+        Arrays of the rounds at which each Character was defeated
+    """
+    replications = len(char1_hp)
+    attacks_per_round = max(char1.attacks_per_round, char2.attacks_per_round)
+    chunk_size = max(1, THREAD_CHUNK_ROLLS // (rolls * attacks_per_round))
+    chunks = [
+        slice(start, min(start + chunk_size, replications))
+        for start in range(0, replications, chunk_size)
+    ]
+    seeds = chunk_seeds(len(chunks))
+
+    def fight_chunk(chunk: slice, seed: int):
+        with use_random_state(np.random.RandomState(seed)):
+            return numpy_fight(
+                char1, char2, char1_hp[chunk], char2_hp[chunk], rolls
+            )
+
+    char1_defeated_at = np.empty(replications, dtype=int)
+    char2_defeated_at = np.empty(replications, dtype=int)
+    with ThreadPoolExecutor(
+        max_workers=min(threads or THREADS, len(chunks) or 1)
+    ) as executor:
+        for chunk, defeated_at in zip(
+            chunks, executor.map(fight_chunk, chunks, seeds)
+        ):
+            char1_defeated_at[chunk], char2_defeated_at[chunk] = defeated_at
+    return char1_defeated_at, char2_defeated_at
+
+
+fight_backends = {
+    "numpy": numpy_fight,
+    "numba": numba_fight,
+    "threads": threaded_numpy_fight,
+}
@@ -0,0 +1,244 @@
+"""
+Report the progress of a running sweep: cells completed, replications
+per second, the running estimates of the current cell with their
+standard errors, and the estimated time remaining.
+
+Reports are printed to the console, and can also be written to a JSON
+status file that is atomically rewritten with every report, for a job
+monitor to read. A `ProgressReporter` is told about every batch a sweep
+simulates, but only builds a report once every `interval` seconds,
+so reporting costs a clock read per batch.
+"""
+import datetime
+import json
+import math
+import os
+import sys
+import time
+from typing import Callable
+
+
+def running_estimates(cell: tuple, accumulator) -> dict:
+    """
+    The running estimates of an accumulator (see `accumulators.py`):
+    the proportion of each value counted by a CountAccumulator, or the
+    mean of a MeanVarianceAccumulator, each with its standard error.
+
+    Returns
+    -------
+    estimates: dict
+        Dictionary of name -> (estimate, standard error)
+    """
+    if hasattr(accumulator, "proportion"):
+        total = accumulator.total
+        if total == 0:
+            return dict()
+        return {
+            value: (
+                accumulator.proportion(value),
+                math.sqrt(
+                    accumulator.proportion(value)
+                    * (1 - accumulator.proportion(value))
+                    / total
+                ),
+            )
+            for value in sorted(accumulator.counts)
+        }
+    if hasattr(accumulator, "standard_error") and accumulator.count > 1:
+        return dict(mean=(accumulator.mean, accumulator.standard_error))
+    return dict()
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds is None:
+        return "unknown"
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+class ProgressReporter:
+    """
+    Parameters
+    ----------
+    interval: float
+        The minimum number of seconds between reports
+    status_path: str
+        The JSON file to write every report to
+    stream:
+        The stream to print reports to, or None not to print them
+    estimates: Callable
+        estimates(cell, accumulator) -> dict
+        The running estimates to report for a cell, as a dictionary
+        of name -> (estimate, standard error)
+        Defaults to `running_estimates`
+    """
+
+    def __init__(
+        self,
+        interval: float = 10.0,
+        status_path: str = None,
+        stream=sys.stderr,
+        estimates: Callable = running_estimates,
+    ) -> None:
+        self.interval = interval
+        self.status_path = status_path
+        self.stream = stream
+        self.estimates = estimates
+
+        self.cell_count = 0
+        self.replications = 0
+        self.replications_total = 0
+        self.cells_completed = 0
+        self.replications_completed = 0
+        self.cell = None
+        self.cell_completed = 0
+        self.accumulator = None
+        self._start_time = None
+        self._start_replications = 0
+        self._last_report = None
+
+    def start(
+        self,
+        cell_count: int,
+        replications: int,
+        cells_completed: int = 0,
+        cell_completed: int = 0,
+        replications_completed: int = None,
+    ):
+        """
+        Start timing a sweep, which may be resuming from a checkpoint.
+
+        Parameters
+        ----------
+        cell_count: int
+            The number of cells in the sweep
+        replications: int or dict
+            The number of replications per cell, or a dictionary
+            of cell -> number of replications
+        cells_completed: int
+            The number of cells already finished
+        cell_completed: int
+            The number of replications of a partially simulated cell
+            already finished
+        replications_completed: int
+            The number of replications of the finished cells
+            Defaults to cells_completed * replications
+        """
+        self.cell_count = cell_count
+        self.replications = replications
+        if isinstance(replications, dict):
+            self.replications_total = sum(replications.values())
+        else:
+            self.replications_total = cell_count * replications
+        self.cells_completed = cells_completed
+        self.replications_completed = (
+            replications_completed
+            if replications_completed is not None
+            else cells_completed * replications
+        )
+        self.cell_completed = cell_completed
+        self.cell = None
+        self.accumulator = None
+        self._start_replications = self.replications_completed + cell_completed
+        self._start_time = self._last_report = time.monotonic()
+        self.report("running")
+
+    def update(self, cell: tuple, completed: int, accumulator):
+        """
+        Record that a cell has simulated `completed` replications so far,
+        and report if the interval has passed since the last report.
+        """
+        self.cell = cell
+        self.cell_completed = completed
+        self.accumulator = accumulator
+        if time.monotonic() - self._last_report >= self.interval:
+            self.report("running")
+
+    def finish_cell(self, cell: tuple, accumulator):
+        """
+        Record that a cell has finished all of its replications.
+        """
+        self.cells_completed += 1
+        self.replications_completed += (
+            self.replications[cell]
+            if isinstance(self.replications, dict)
+            else self.replications
+        )
+        self.update(cell, 0, accumulator)
+
+    def finish(self):
+        """
+        Report that the sweep has finished.
+        """
+        self.report("finished")
+
+    @property
+    def status(self) -> dict:
+        """
+        The current progress, as a JSON-able dictionary.
+        """
+        elapsed = time.monotonic() - self._start_time
+        completed = self.replications_completed + self.cell_completed
+        simulated = completed - self._start_replications
+        rate = simulated / elapsed if elapsed > 0 else None
+        remaining = self.replications_total - completed
+        if remaining == 0:
+            eta = 0.0
+        elif rate:
+            eta = remaining / rate
+        else:
+            eta = None
+        estimates = (
+            self.estimates(self.cell, self.accumulator)
+            if self.accumulator is not None
+            else dict()
+        )
+        return dict(
+            cells_completed=self.cells_completed,
+            cell_count=self.cell_count,
+            replications_completed=completed,
+            replications_total=self.replications_total,
+            replications_per_second=rate,
+            elapsed_seconds=elapsed,
+            eta_seconds=eta,
+            cell=None if self.cell is None else list(self.cell),
+            estimates={
+                str(name): dict(estimate=estimate, standard_error=error)
+                for name, (estimate, error) in estimates.items()
+            },
+        )
+
+    def report(self, state: str):
+        """
+        Print the current progress, and write it to the status file.
+        """
+        self._last_report = time.monotonic()
+        status = dict(state=state, updated_at=time.time(), **self.status)
+        if self.stream is not None:
+            print(self.format(status), file=self.stream, flush=True)
+        if self.status_path is not None:
+            temporary_path = f"{self.status_path}.tmp"
+            with open(temporary_path, "w") as f:
+                json.dump(status, f, indent=2)
+            os.replace(temporary_path, self.status_path)
+
+    @staticmethod
+    def format(status: dict) -> str:
+        """
+        A single console line for a status.
+        """
+        rate = status["replications_per_second"]
+        line = (
+            f"[{status['state']}] cells {status['cells_completed']}"
+            f"/{status['cell_count']}, "
+            f"{rate or 0:,.0f} replications/s, "
+            f"elapsed {_format_duration(status['elapsed_seconds'])}, "
+            f"ETA {_format_duration(status['eta_seconds'])}"
+        )
+        if status["estimates"]:
+            estimates = ", ".join(
+                f"{name} {value['estimate']:.4g}"
+                f" ± {value['standard_error']:.2g}"
+                for name, value in status["estimates"].items()
+            )
+            line += f" | {tuple(status['cell'])}: {estimates}"
+        return line
@@ -0,0 +1,214 @@
+"""
+Frozen reference implementations of the original dice, damage and
+fight code, before any of it was vectorized or compiled.
+
+These are deliberately slow, one-roll-at-a-time copies that should
+never be changed to match an engine: `validation.py` compares the
+current engines against them, so that a faster engine can be adopted
+knowing that it produces the same distributions. They only change
+when the rules being simulated do. Each function takes the current Character
+objects, but only reads their static numbers (level, modifiers, dice
+sizes and whether they use Great Weapon Fighting).
+
+The oracle has been extended once, for such a change of rules: Extra
+Attack, which the original code didn't simulate, gives Characters
+several attacks per round, and without it in the reference the fight
+checks could only cover single-attack Characters. `round_damage` adds
+it in the same one-roll-at-a-time style, rolling each attack of a round
+with its own call to the unchanged `attack`, and `fight` sums each
+round's attacks through it rather than rolling a single attack.
+
+One quirk of the original is not kept: `find_defeat_index` read
+`target.hp`, which rolls new hit points, twice, so the check for
+surviving and the search for the round of defeat could use different
+hit points. The reference rolls hit points once per fight.
+"""
+import functools
+
+import numpy as np
+
+from die import GWFDie
+from utils import CHAR1_WINS, CHAR2_WINS, TIE
+
+
+def die_roll(sides: int, number: int, n: int) -> np.ndarray:
+    """
+    `Die.roll`: the sum of `number` independent rolls, n times
+    """
+    return functools.reduce(
+        np.add,
+        (np.random.randint(1, sides + 1, n) for _ in range(number)),
+    )
+
+
+def gwf_die_roll(sides: int, number: int, n: int) -> np.ndarray:
+    """
+    `GWFDie.roll`: every die showing a 1 or 2 is rerolled once
+    """
+    all_arr = []
+    for _ in range(number):
+        roll_arr = np.random.randint(1, sides + 1, n)
+        roll_arr[roll_arr <= 2] = np.random.randint(
+            1, sides + 1, len(roll_arr[roll_arr <= 2])
+        )
+        all_arr.append(roll_arr)
+    return functools.reduce(np.add, all_arr)
+
+
+def _damage_dice_sum(char, n: int) -> int:
+    """
+    `Die.sum_roll`: the sum of n rolls of a Character's damage dice
+    """
+    damage_dice = char.damage_dice
+    roll = gwf_die_roll if isinstance(damage_dice, GWFDie) else die_roll
+    return int(np.sum(roll(damage_dice.sides, damage_dice.number, n)))
+
+
+def _single_die_sum(char, n: int) -> int:
+    """
+    The sum of n rolls of a single one of a Character's damage dice
+    """
+    damage_dice = char.damage_dice
+    roll = gwf_die_roll if isinstance(damage_dice, GWFDie) else die_roll
+    return int(np.sum(roll(damage_dice.sides, 1, n)))
+
+
+def brutal_critical_dice(level: int) -> int:
+    """
+    The extra damage dice a Barbarian rolls on a critical hit
+    """
+    level_conditions = [
+        level <= 8,
+        9 <= level <= 12,
+        13 <= level <= 16,
+        17 <= level,
+    ]
+    return int(np.select(level_conditions, [0, 1, 2, 3]))
+
+
+def hit(
+    char,
+    target,
+    rolls: int = 1,
+    advantage: bool = False,
+    disadvantage: bool = False,
+) -> np.ndarray:
+    """
+    `Character.hit`: misses (0), hits (1) and critical hits (2)
+    """
+    natural_20 = 20 + char.hit_bonus
+    natural_1 = 1 + char.hit_bonus
+    if advantage:
+        roll_arr = np.maximum(die_roll(20, 1, rolls), die_roll(20, 1, rolls))
+    elif disadvantage:
+        roll_arr = np.minimum(die_roll(20, 1, rolls), die_roll(20, 1, rolls))
+    else:
+        roll_arr = die_roll(20, 1, rolls)
+    roll_arr += char.hit_bonus
+    hit_conditions = [
+        roll_arr == natural_20,
+        roll_arr == natural_1,
+        roll_arr >= target.ac,
+        roll_arr < target.ac,
+    ]
+    return np.select(hit_conditions, [2, 0, 1, 0])
+
+
+def damage(char, hit_arr: np.ndarray, brutal_critical: bool = False):
+    """
+    `Character.damage`, or `Barbarian.damage` with brutal_critical,
+    one attack at a time
+    """
+    extra_rolls = brutal_critical_dice(char.level) if brutal_critical else 0
+    damage_roll = np.vectorize(
+        lambda to_hit: _damage_dice_sum(char, to_hit)
+        + (char.damage_bonus * to_hit)
+        + (max(0, to_hit - 1) * _single_die_sum(char, extra_rolls))
+    )
+    return damage_roll(hit_arr)
+
+
+def attack(
+    char,
+    target,
+    rolls: int = 1,
+    advantage: bool = False,
+    disadvantage: bool = False,
+    brutal_critical: bool = False,
+) -> np.ndarray:
+    """
+    `Character.attack`
+    """
+    hit_arr = hit(char, target, rolls, advantage, disadvantage)
+    return damage(char, hit_arr, brutal_critical)
+
+
+def round_damage(
+    char, target, rolls: int = 1, brutal_critical: bool = False
+) -> np.ndarray:
+    """
+    `Character.attack_rounds`: the sum of `attacks_per_round`
+    separately rolled attacks, for each of `rolls` rounds.
+    Added to the original code for Extra Attack, see above.
+    """
+    damage_arr = np.zeros(rolls, dtype=int)
+    for _ in range(char.attacks_per_round):
+        damage_arr += attack(
+            char, target, rolls, brutal_critical=brutal_critical
+        )
+    return damage_arr
+
+
+def hp(char) -> int:
+    """
+    `Character.hp`: a single roll of a Character's hit points
+    """
+    hit_die = char.hit_die
+    return int(
+        hit_die.sides
+        + np.sum(die_roll(hit_die.sides, hit_die.number, char.level - 1))
+        + char.constitution_modifier * char.level
+    )
+
+
+def find_defeat_index(hp: int, damage_arr: np.ndarray) -> int:
+    """
+    `utils.find_defeat_index`, for a fixed number of hit points
+    """
+    total_damage_arr = np.cumsum(damage_arr)
+    if total_damage_arr[-1] < hp:
+        return len(damage_arr)
+    return int((total_damage_arr >= hp).argmax())
+
+
+def fight(
+    char1,
+    char2,
+    rolls: int = 500,
+    char1_brutal_critical: bool = False,
+    char2_brutal_critical: bool = False,
+) -> int:
+    """
+    `utils.fight`, returning the outcome code of `utils.fights`
+    """
+    char1_damage_arr = round_damage(
+        char1, char2, rolls, brutal_critical=char1_brutal_critical
+    )
+    char2_damage_arr = round_damage(
+        char2, char1, rolls, brutal_critical=char2_brutal_critical
+    )
+    char1_defeated_at = find_defeat_index(hp(char1), char2_damage_arr)
+    char2_defeated_at = find_defeat_index(hp(char2), char1_damage_arr)
+    if rolls == char1_defeated_at == char2_defeated_at:
+        return TIE
+
+    char1_initiative, char2_initiative = char1.initiative, char2.initiative
+    while char1_initiative == char2_initiative:
+        char1_initiative = die_roll(20, 1, 1) + char1.initiative_bonus
+        char2_initiative = die_roll(20, 1, 1) + char2.initiative_bonus
+    if (char1_defeated_at > char2_defeated_at) or (
+        char1_initiative > char2_initiative
+        and char1_defeated_at == char2_defeated_at
+    ):
+        return CHAR1_WINS
+    return CHAR2_WINS
@@ -0,0 +1,134 @@
+"""
+Export the charts produced by a simulation run in one batch.
+
+Scripts add their figures to a `ChartRenderer` as they are created,
+and call `render` once at the end of the run. Images are rasterized by
+a single long-lived kaleido renderer per process, with figures spread
+across several processes when more than one worker is requested.
+The "json" and "html" formats write plotly figure specs instead,
+without starting kaleido at all, for headless batch runs.
+"""
+import argparse
+import os
+from pathlib import Path
+
+import plotly.io as pio
+
+from shared import process_pool
+from utils import images_directory
+
+
+IMAGE_FORMATS = ["png", "jpeg", "webp", "svg", "pdf"]
+DATA_FORMATS = ["json", "html"]
+
+
+def _export(fig_dict: dict, path: str, output_format: str) -> str:
+    """
+    Write a single figure to disk in the given format.
+    Images go through the process' kaleido scope, which starts
+    once and is reused by every later call in the same process.
+    """
+    if output_format == "json":
+        pio.write_json(fig_dict, path)
+    elif output_format == "html":
+        pio.write_html(fig_dict, path, include_plotlyjs="cdn")
+    else:
+        image_bytes = pio.kaleido.scope.transform(
+            fig_dict, format=output_format
+        )
+        Path(path).write_bytes(image_bytes)
+    return path
+
+
+def _export_batch(batch: list, output_format: str) -> list:
+    return [_export(fig_dict, path, output_format) for fig_dict, path in batch]
+
+
+class ChartRenderer:
+    """
+    Collect figures from a run and export them all at once.
+
+    Parameters
+    ----------
+    output_format: str
+        One of the image formats (e.g. "png"), or "json"/"html"
+        to write figure specs without rasterizing
+    workers: int
+        The number of renderer processes to spread images across
+    directory: str
+        The directory to write charts to
+    """
+
+    def __init__(
+        self,
+        output_format: str = "png",
+        workers: int = 1,
+        directory: str = images_directory,
+    ) -> None:
+        if output_format not in IMAGE_FORMATS + DATA_FORMATS:
+            raise ValueError(f"Unsupported chart format: {output_format}")
+        self.output_format = output_format
+        self.workers = workers
+        self.directory = directory
+        self.figures = []
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace):
+        """
+        Create a ChartRenderer from arguments parsed with `render_arguments`.
+        """
+        return cls(
+            output_format=args.chart_format, workers=args.render_workers
+        )
+
+    def add(self, fig, filename: str):
+        """
+        Queue a figure for export. The extension of `filename`
+        is replaced to match the output format.
+        """
+        stem = os.path.splitext(filename)[0]
+        path = os.path.join(self.directory, f"{stem}.{self.output_format}")
+        self.figures.append((fig.to_dict(), path))
+
+    def render(self) -> list:
+        """
+        Export every queued figure, and clear the queue.
+
+        Returns
+        -------
+        paths: list
+            The paths of the written files
+        """
+        figures, self.figures = self.figures, []
+        workers = min(self.workers, len(figures))
+        if workers <= 1 or self.output_format in DATA_FORMATS:
+            return _export_batch(figures, self.output_format)
+
+        # deal the figures out so each process starts kaleido only once
+        batches = [figures[i::workers] for i in range(workers)]
+        with process_pool(workers) as executor:
+            results = executor.map(
+                _export_batch, batches, [self.output_format] * workers
+            )
+        return [path for batch in results for path in batch]
+
+
+def render_arguments() -> argparse.ArgumentParser:
+    """
+    Command line arguments shared by all scripts that produce charts,
+    to be used as a parent parser.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--chart-format",
+        default="png",
+        choices=IMAGE_FORMATS + DATA_FORMATS,
+        help="image format, or json/html to skip rasterizing",
+    )
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=1,
+        help="number of processes to render images with",
+    )
+    return parser
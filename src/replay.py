@@ -0,0 +1,219 @@
+"""
+Record the raw rolls of a batch of attacks once, and replay them
+with different numbers.
+
+The d20 and damage die faces of an attack don't depend on the target's
+AC, the attacker's hit bonus or damage bonus, or whether they use Great
+Weapon Fighting; those only change how the faces are added up.
+`record_attacks` rolls the faces of n attacks, along with the reroll
+each damage die would get with Great Weapon Fighting, and
+`replay_attacks` applies any of those numbers to the recorded faces,
+following the same rules as `Character.hit` and `Character.damage`.
+Sweeping over ACs then costs a comparison per attack instead of rolling
+every attack again, and every configuration sees the same rolls.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from die import D20, Die, roll_faces
+from kernels import attack_profile
+
+
+class RecordedAttacks(NamedTuple):
+    """
+    The raw rolls of a batch of attacks.
+    Damage dice are laid out as the dice rolled on a hit, the extra
+    set rolled on a critical hit, then any extra critical dice.
+    """
+
+    natural_roll: np.ndarray  # d20 roll of each attack, shaped (n,)
+    faces: np.ndarray  # damage die faces, shaped (n, dice)
+    rerolls: np.ndarray  # Great Weapon Fighting rerolls, shaped (n, dice)
+    damage_sides: int
+    damage_number: int
+    extra_critical_dice: int
+
+
+def record_attacks(
+    n: int,
+    damage_sides: int,
+    damage_number: int,
+    extra_critical_dice: int = 0,
+    advantage: bool = False,
+    disadvantage: bool = False,
+    sampling: str = "random",
+) -> RecordedAttacks:
+    """
+    Roll the raw faces of n attacks.
+
+    Parameters
+    ----------
+    n: int
+        The number of attacks
+    damage_sides: int
+        The number of sides of the damage dice
+    damage_number: int
+        The number of damage dice rolled on a hit
+    extra_critical_dice: int
+        The most extra damage dice rolled on a critical hit
+        that will be replayed, e.g. for Brutal Critical
+    advantage/disadvantage: bool
+        Whether to roll twice and take the better/worse
+    sampling: str
+        "random" or "stratified", see `Die.roll`
+
+    Returns
+    -------
+    recorded: RecordedAttacks
+    """
+    d20 = D20()
+    if advantage:
+        natural_roll = d20.roll_with_advantage(n, sampling)
+    elif disadvantage:
+        natural_roll = d20.roll_with_disadvantage(n, sampling)
+    else:
+        natural_roll = d20.roll(n, sampling)
+
+    dice = 2 * damage_number + extra_critical_dice
+    damage_die = Die(damage_sides)
+    if sampling == "stratified":
+        faces, rerolls = np.split(
+            damage_die.low_discrepancy_faces(n, 2 * dice).T, 2, axis=1
+        )
+    else:
+        faces, rerolls = roll_faces(damage_sides, (2, n, dice))
+    return RecordedAttacks(
+        natural_roll=natural_roll,
+        faces=faces,
+        rerolls=rerolls,
+        damage_sides=damage_sides,
+        damage_number=damage_number,
+        extra_critical_dice=extra_critical_dice,
+    )
+
+
+def record_character_attacks(
+    char,
+    n: int,
+    advantage: bool = False,
+    disadvantage: bool = False,
+    sampling: str = "random",
+) -> RecordedAttacks:
+    """
+    Roll the raw faces of n attacks with a Character's damage dice.
+    See `record_attacks`.
+    """
+    profile = attack_profile(char)
+    return record_attacks(
+        n,
+        profile.damage_sides,
+        profile.damage_number,
+        profile.extra_critical_dice,
+        advantage,
+        disadvantage,
+        sampling,
+    )
+
+
+def replay_attacks(
+    recorded: RecordedAttacks,
+    hit_bonus: int,
+    ac: int,
+    damage_bonus: int,
+    great_weapon_fighting: bool = False,
+    extra_critical_dice: int = None,
+):
+    """
+    Apply an attacker's and target's numbers to recorded attacks.
+
+    Parameters
+    ----------
+    recorded: RecordedAttacks
+        The rolls to replay
+    hit_bonus: int
+        The attacker's hit bonus
+    ac: int
+        The target's AC
+    damage_bonus: int
+        The attacker's damage bonus
+    great_weapon_fighting: bool
+        Whether damage dice showing 1 or 2 are rerolled
+    extra_critical_dice: int
+        The number of extra damage dice rolled on a critical hit
+        Defaults to every recorded extra die
+
+    Returns
+    -------
+    hit_arr: np.ndarray
+        Array of misses (0), hits (1) and critical hits (2)
+    damage_arr: np.ndarray
+        Array of damage rolls
+    """
+    if extra_critical_dice is None:
+        extra_critical_dice = recorded.extra_critical_dice
+    if extra_critical_dice > recorded.extra_critical_dice:
+        raise ValueError(
+            f"Only {recorded.extra_critical_dice} extra critical dice "
+            f"were recorded, can't replay {extra_critical_dice}"
+        )
+
+    natural_roll = recorded.natural_roll
+    hit_arr = np.select(
+        [
+            natural_roll == 20,
+            natural_roll == 1,
+            natural_roll + hit_bonus >= ac,
+        ],
+        [2, 0, 1],
+    )
+
+    # the number of hit results (1 or 2) each damage die is rolled for
+    number = recorded.damage_number
+    dice_rolled = np.concatenate(
+        [
+            np.repeat(1, number),
+            np.repeat(2, number + extra_critical_dice),
+            # extra critical dice that were recorded but not replayed
+            np.repeat(3, recorded.extra_critical_dice - extra_critical_dice),
+        ]
+    )
+    faces = recorded.faces
+    if great_weapon_fighting:
+        faces = np.where(faces <= 2, recorded.rerolls, faces)
+    used = hit_arr[:, np.newaxis] >= dice_rolled
+    damage_arr = (faces * used).sum(axis=1) + damage_bonus * hit_arr
+    return hit_arr, damage_arr
+
+
+def replay_character_attacks(
+    recorded: RecordedAttacks, char, target, **kwargs
+):
+    """
+    Replay recorded attacks with a Character's numbers against a target,
+    as if rolled by `Character.hit` and `Character.damage`.
+    Any keyword arguments override those of `replay_attacks`.
+    """
+    profile = attack_profile(char)
+    if profile.reroll_at_most not in (0, 2):
+        raise ValueError(
+            "Only Great Weapon Fighting rerolls can be replayed, "
+            f"not rerolls of {profile.reroll_at_most} or less"
+        )
+    if (profile.damage_sides, profile.damage_number) != (
+        recorded.damage_sides,
+        recorded.damage_number,
+    ):
+        raise ValueError(
+            f"{char.name}'s damage dice don't match the recorded "
+            f"{recorded.damage_number}d{recorded.damage_sides}"
+        )
+    replay_kwargs = dict(
+        hit_bonus=profile.hit_bonus,
+        ac=target.ac,
+        damage_bonus=profile.damage_bonus,
+        great_weapon_fighting=profile.reroll_at_most > 0,
+        extra_critical_dice=profile.extra_critical_dice,
+    )
+    replay_kwargs.update(kwargs)
+    return replay_attacks(recorded, **replay_kwargs)
@@ -0,0 +1,316 @@
+"""
+Fight every Character of a roster against every other, and chart
+the matrix of win rates as a heatmap.
+
+Simulating every pair with `fights` rolls each Character's attacks and
+hit points again for every opponent. A tournament instead rolls, for
+every batch of replications:
+
+* each Character's hit points once, shared by all of their fights
+* the raw rolls of each Character's attacks once (see `replay.py`),
+  replayed against every distinct AC in the roster, so each AC's damage
+  stream is shared by every opponent with that AC
+
+A pair's fight then only needs the rounds at which each side's damage
+stream against the other's AC reaches the other's hit points. Every
+fight has the same distribution as one simulated by `fights`, but fights
+in the same replication share rolls, so the win rates in a row of the
+matrix are positively correlated, which makes comparisons between
+opponents more precise than with independent simulations.
+"""
+import argparse
+from typing import NamedTuple
+
+import numpy as np
+from plotly import graph_objects as go
+
+from character import Barbarian, Character, Monster
+from die import SAMPLING_MODES
+from rendering import ChartRenderer, render_arguments
+from replay import record_character_attacks, replay_character_attacks
+from sweep import seed_random_state
+from utils import acts_first, generate_barbarian_stats, generate_fighter_stats
+
+
+class TournamentResult(NamedTuple):
+    """
+    The outcomes of every pair of Characters in a roster.
+    wins[i, j] counts the fights roster[i] won against roster[j],
+    and ties[i, j] those neither of them won.
+    """
+
+    names: list
+    wins: np.ndarray
+    ties: np.ndarray
+    replications: int
+
+    @property
+    def win_rates(self) -> np.ndarray:
+        """
+        The proportion of fights each Character won against each other,
+        with NaN on the diagonal
+        """
+        win_rates = self.wins / self.replications
+        np.fill_diagonal(win_rates, np.nan)
+        return win_rates
+
+
+def _defeat_rounds(roster: list, n: int, rolls: int, sampling: str):
+    """
+    Simulate n replications of every fight in a roster.
+
+    Rounds are rolled in blocks of doubling length, until every fight
+    has ended, since most fights end long before `rolls` rounds.
+
+    Returns
+    -------
+    defeated_at: np.ndarray
+        defeated_at[i, j] is the array of rounds at which roster[j]
+        is defeated by roster[i]'s attacks, or `rolls` if they aren't
+        before the fight has ended
+    """
+    hp = np.array([char.roll_hp(n) for char in roster])
+    defeated_at = np.full((len(roster), len(roster), n), rolls)
+    total_damage = np.zeros((len(roster), len(roster), n), dtype=np.int64)
+    opponents_by_ac = [dict() for _ in roster]
+    for i, j in zip(*np.nonzero(~np.eye(len(roster), dtype=bool))):
+        opponents_by_ac[i].setdefault(roster[j].ac, []).append(j)
+
+    start, block = 0, 8
+    while start < rolls:
+        block = min(block, rolls - start)
+        for i, attacker in enumerate(roster):
+            attacks_per_round = attacker.attacks_per_round
+            recorded = record_character_attacks(
+                attacker, n * block * attacks_per_round, sampling=sampling
+            )
+            for opponents in opponents_by_ac[i].values():
+                _, damage_arr = replay_character_attacks(
+                    recorded, attacker, roster[opponents[0]]
+                )
+                round_damage = damage_arr.reshape(
+                    n, block, attacks_per_round
+                ).sum(axis=2)
+                total_damage_arr = total_damage[
+                    i, opponents[0], :, np.newaxis
+                ] + np.cumsum(round_damage, axis=1)
+                # damage only accumulates, so the round of defeat is
+                # the number of rounds before reaching the hp
+                rounds_survived = np.sum(
+                    total_damage_arr[np.newaxis]
+                    < hp[opponents, :, np.newaxis],
+                    axis=2,
+                )
+                defeated_at[i, opponents] = np.minimum(
+                    defeated_at[i, opponents],
+                    np.where(
+                        rounds_survived < block, start + rounds_survived, rolls
+                    ),
+                )
+                total_damage[i, opponents] = total_damage_arr[:, -1]
+        start += block
+        block *= 2
+        # a fight has ended once either side is defeated
+        ended = np.minimum(defeated_at, defeated_at.transpose(1, 0, 2)) < start
+        if np.all(ended | np.eye(len(roster), dtype=bool)[..., np.newaxis]):
+            break
+    return defeated_at
+
+
+def tournament(
+    roster: list,
+    replications: int,
+    rolls: int = 500,
+    batch_size: int = 1_000,
+    sampling: str = "random",
+) -> TournamentResult:
+    """
+    Simulate fights between every pair of Characters in a roster.
+
+    Parameters
+    ----------
+    roster: list
+        List of Characters, with distinct names
+    replications: int
+        The number of fights per pair
+    rolls: int
+        The number of rounds for a single fight
+    batch_size: int
+        The number of replications to simulate at once, which bounds
+        memory to about batch_size * rolls rounds of attacks per Character
+    sampling: str
+        "random" or "stratified", see `Die.roll`
+
+    Returns
+    -------
+    result: TournamentResult
+    """
+    # first[i, j]: whether roster[i] acts before roster[j]
+    first = np.zeros((len(roster), len(roster)), dtype=bool)
+    for i, char1 in enumerate(roster):
+        for j, char2 in enumerate(roster[i + 1 :], i + 1):
+            first[i, j] = acts_first(char1, char2)
+            first[j, i] = not first[i, j]
+
+    wins = np.zeros((len(roster), len(roster)), dtype=np.int64)
+    ties = np.zeros((len(roster), len(roster)), dtype=np.int64)
+    for start in range(0, replications, batch_size):
+        n = min(batch_size, replications - start)
+        defeated_at = _defeat_rounds(roster, n, rolls, sampling)
+        # defeated_at[i, j] is when j falls to i, and falls_at[i, j]
+        # when i falls to j; whoever acts first wins a shared round
+        falls_at = defeated_at.transpose(1, 0, 2)
+        tie = (falls_at == rolls) & (defeated_at == rolls)
+        win = (falls_at > defeated_at) | (
+            (falls_at == defeated_at) & first[:, :, np.newaxis]
+        )
+        wins += np.sum(win & ~tie, axis=2)
+        ties += np.sum(tie, axis=2)
+    np.fill_diagonal(wins, 0)
+    np.fill_diagonal(ties, 0)
+    return TournamentResult(
+        names=[char.name for char in roster],
+        wins=wins,
+        ties=ties,
+        replications=replications,
+    )
+
+
+def create_heatmap(result: TournamentResult, title: str) -> go.Figure:
+    """
+    Create a heatmap of the win rate of every Character (rows)
+    against every opponent (columns).
+    """
+    fig = go.Figure(
+        go.Heatmap(
+            z=result.win_rates,
+            x=result.names,
+            y=result.names,
+            zmin=0,
+            zmax=1,
+            colorscale="RdBu",
+            text=[
+                ["" if np.isnan(rate) else f"{rate:.2f}" for rate in row]
+                for row in result.win_rates
+            ],
+            texttemplate="%{text}",
+            colorbar=dict(title="Win Rate"),
+        )
+    )
+    fig.update_layout(
+        width=200 + 60 * len(result.names),
+        height=150 + 50 * len(result.names),
+        xaxis_title="Opponent",
+        yaxis=dict(title="Character", autorange="reversed"),
+        title={
+            "text": title,
+            "xanchor": "center",
+            "yanchor": "top",
+            "x": 0.5,
+        },
+    )
+    return fig
+
+
+# damage dice of each weapon, and whether it leaves a hand for a shield
+WEAPONS = {
+    "Longsword & Shield": ((8, 1), True),
+    "Longsword": ((10, 1), False),
+    "Greatsword": ((6, 2), False),
+    "Greataxe": ((12, 1), False),
+}
+
+
+def build_roster(level: int, crs: list) -> list:
+    """
+    Create a roster of builds at a given level: a Fighter with each
+    weapon, a Barbarian with each two-handed weapon, with and without
+    Great Weapon Fighting, and a Monster of each CR.
+    """
+    # equal base AC for every build, which increases by 1 every 4 levels,
+    # with +2 for a shield
+    ac = 17 + level // 4
+    roster = [
+        Character(
+            name=f"Fighter {weapon}",
+            **generate_fighter_stats(level),
+            ac=ac + 2 * shield,
+            damage_dice=damage_dice,
+        )
+        for weapon, (damage_dice, shield) in WEAPONS.items()
+    ]
+    roster.extend(
+        Barbarian(
+            name=f"Barbarian {weapon}{' GWF' if gwf else ''}",
+            **generate_barbarian_stats(level, gwf),
+            ac=ac,
+            damage_dice=damage_dice,
+        )
+        for weapon, (damage_dice, shield) in WEAPONS.items()
+        if not shield
+        for gwf in [False, True]
+    )
+    roster.extend(Monster(name=f"Monster CR {cr}", cr=cr) for cr in crs)
+    return roster
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        parents=[render_arguments()],
+    )
+    parser.add_argument(
+        "--level", type=int, default=10, help="level of every build"
+    )
+    parser.add_argument(
+        "--crs",
+        type=int,
+        nargs="*",
+        default=None,
+        help="CRs of the Monsters to include, by default the level",
+    )
+    parser.add_argument(
+        "--replications",
+        type=int,
+        default=10_000,
+        help="number of fights per pair",
+    )
+    parser.add_argument(
+        "--sampling",
+        default="random",
+        choices=SAMPLING_MODES,
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="seed for the whole run"
+    )
+    args = parser.parse_args(argv)
+    renderer = ChartRenderer.from_args(args)
+
+    seed_random_state(
+        args.seed
+        if args.seed is not None
+        else np.random.SeedSequence().entropy
+    )
+    crs = args.crs if args.crs is not None else [args.level]
+    roster = build_roster(args.level, crs)
+    result = tournament(roster, args.replications, sampling=args.sampling)
+
+    width = max(len(name) for name in result.names)
+    for name, win_rates in zip(result.names, result.win_rates):
+        print(
+            f"{name:<{width}}",
+            " ".join(
+                "  -  " if np.isnan(win_rate) else f"{win_rate:.3f}"
+                for win_rate in win_rates
+            ),
+        )
+    renderer.add(
+        create_heatmap(result, f"Level {args.level} Tournament"),
+        f"tournament_level{args.level}.png",
+    )
+    renderer.render()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Estimate how much +1 to a Character's AC, hit bonus, damage bonus or hp
+changes its chance of winning a fight, and the damage it deals and takes,
+from a single set of simulated fights.
+
+Rather than simulating separate sweeps at neighbouring values and
+differencing two noisy estimates, every change is evaluated against
+the same rolls:
+
+* +1 hit bonus or +1 AC only change which d20 rolls hit, so the fights
+  are reweighted by the likelihood ratio of each attack's result (miss,
+  hit or critical hit) under the changed and the original numbers,
+  up to the round the fight ended
+* +1 damage bonus or +1 hp are applied to the recorded damage and hp,
+  and the fights are re-evaluated with the same rolls
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from accumulators import MeanVarianceAccumulator
+from analytic import hit_probabilities
+from kernels import find_defeat_indices
+from utils import acts_first
+
+
+CHANGES = ["ac", "hit_bonus", "damage_bonus", "hp"]
+QUANTITIES = ["win_probability", "damage_dealt", "damage_taken"]
+
+
+class Sensitivity(NamedTuple):
+    """
+    The estimated change in a quantity, and its standard error.
+    """
+
+    effect: float
+    standard_error: float
+
+
+def _log_likelihood_ratios(hit_arr, hit_bonus, ac, new_hit_bonus, new_ac):
+    """
+    The log-likelihood ratio of every attack's result,
+    under the new numbers against the original numbers.
+    """
+    probabilities = hit_probabilities(hit_bonus, ac)
+    new_probabilities = hit_probabilities(new_hit_bonus, new_ac)
+    if np.any((probabilities == 0) & (new_probabilities > 0)):
+        raise ValueError(
+            f"An attack with hit bonus {hit_bonus} against AC {ac} can't "
+            f"show the effect of hit bonus {new_hit_bonus} against "
+            f"AC {new_ac} by reweighting"
+        )
+    with np.errstate(divide="ignore"):
+        log_ratios = np.log(new_probabilities) - np.log(probabilities)
+    return np.nan_to_num(log_ratios)[hit_arr]
+
+
+def _wins(char1_defeated_at, char2_defeated_at, char1_first, rolls):
+    """
+    Whether char1 won each fight, as decided by `utils.fights`
+    """
+    return (
+        (char1_defeated_at > char2_defeated_at)
+        | (
+            (char1_defeated_at == char2_defeated_at)
+            & (char1_defeated_at < rolls)
+            & char1_first
+        )
+    ).astype(int)
+
+
+def _fight_weights(log_ratios, last_round):
+    """
+    The likelihood ratio of every fight, from its attacks
+    up to and including its last round
+    """
+    return np.exp(
+        np.take_along_axis(
+            np.cumsum(log_ratios, axis=1), last_round[:, np.newaxis], axis=1
+        )[:, 0]
+    )
+
+
+def sensitivity(
+    char1,
+    char2,
+    replications: int = 10_000,
+    rolls: int = 500,
+    batch_size: int = 2_000,
+) -> dict:
+    """
+    Estimate the effect of +1 to each of char1's AC, hit bonus,
+    damage bonus and hp, on fights against char2.
+
+    Parameters
+    ----------
+    char1: Character
+        The Character whose numbers are changed
+    char2: Character
+        Their opponent
+    replications: int
+        The number of fights to simulate
+    rolls: int
+        The number of rounds for a single fight
+    batch_size: int
+        The number of fights to simulate at once
+
+    Returns
+    -------
+    sensitivities: dict
+        Dictionary of change -> quantity -> Sensitivity, for each of
+        CHANGES and QUANTITIES:
+        win_probability: char1's probability of winning a fight
+        damage_dealt: the mean damage of an attack by char1
+        damage_taken: the mean damage of an attack by char2
+    """
+    char1_first = acts_first(char1, char2)
+
+    effects = {
+        change: {
+            quantity: MeanVarianceAccumulator() for quantity in QUANTITIES
+        }
+        for change in CHANGES
+    }
+    for start in range(0, replications, batch_size):
+        n = min(batch_size, replications - start)
+        # every attack, shaped (fights, rounds, attacks per round)
+        char1_shape = (n, rolls, char1.attacks_per_round)
+        char2_shape = (n, rolls, char2.attacks_per_round)
+        char1_hit_arr = char1.hit(char2, np.prod(char1_shape))
+        char2_hit_arr = char2.hit(char1, np.prod(char2_shape))
+        char1_damage_arr = char1.damage(char1_hit_arr).reshape(char1_shape)
+        char2_damage_arr = char2.damage(char2_hit_arr).reshape(char2_shape)
+        char1_hit_arr = char1_hit_arr.reshape(char1_shape)
+        char2_hit_arr = char2_hit_arr.reshape(char2_shape)
+        # and the damage of each round
+        char1_round_damage = char1_damage_arr.sum(axis=2)
+        char2_round_damage = char2_damage_arr.sum(axis=2)
+        char1_hp = char1.roll_hp(n)
+        char2_hp = char2.roll_hp(n)
+
+        char1_defeated_at = find_defeat_indices(char1_hp, char2_round_damage)
+        char2_defeated_at = find_defeat_indices(char2_hp, char1_round_damage)
+        wins = _wins(char1_defeated_at, char2_defeated_at, char1_first, rolls)
+        # only the rounds up to the end of a fight affect its outcome
+        last_round = np.minimum(
+            np.minimum(char1_defeated_at, char2_defeated_at), rolls - 1
+        )
+
+        # reweighted changes
+        no_change = np.zeros(n)
+        ac_log_ratios = _log_likelihood_ratios(
+            char2_hit_arr,
+            char2.hit_bonus,
+            char1.ac,
+            char2.hit_bonus,
+            char1.ac + 1,
+        )
+        effects["ac"]["win_probability"].update(
+            wins * (_fight_weights(ac_log_ratios.sum(axis=2), last_round) - 1)
+        )
+        effects["ac"]["damage_dealt"].update(no_change)
+        effects["ac"]["damage_taken"].update(
+            np.mean(char2_damage_arr * np.expm1(ac_log_ratios), axis=(1, 2))
+        )
+
+        hit_bonus_log_ratios = _log_likelihood_ratios(
+            char1_hit_arr,
+            char1.hit_bonus,
+            char2.ac,
+            char1.hit_bonus + 1,
+            char2.ac,
+        )
+        effects["hit_bonus"]["win_probability"].update(
+            wins
+            * (
+                _fight_weights(hit_bonus_log_ratios.sum(axis=2), last_round)
+                - 1
+            )
+        )
+        effects["hit_bonus"]["damage_dealt"].update(
+            np.mean(
+                char1_damage_arr * np.expm1(hit_bonus_log_ratios),
+                axis=(1, 2),
+            )
+        )
+        effects["hit_bonus"]["damage_taken"].update(no_change)
+
+        # re-evaluated changes
+        damage_bonus_wins = _wins(
+            char1_defeated_at,
+            find_defeat_indices(
+                char2_hp, char1_round_damage + char1_hit_arr.sum(axis=2)
+            ),
+            char1_first,
+            rolls,
+        )
+        effects["damage_bonus"]["win_probability"].update(
+            damage_bonus_wins - wins
+        )
+        effects["damage_bonus"]["damage_dealt"].update(
+            char1_hit_arr.mean(axis=(1, 2))
+        )
+        effects["damage_bonus"]["damage_taken"].update(no_change)
+
+        hp_wins = _wins(
+            find_defeat_indices(char1_hp + 1, char2_round_damage),
+            char2_defeated_at,
+            char1_first,
+            rolls,
+        )
+        effects["hp"]["win_probability"].update(hp_wins - wins)
+        effects["hp"]["damage_dealt"].update(no_change)
+        effects["hp"]["damage_taken"].update(no_change)
+
+    return {
+        change: {
+            quantity: Sensitivity(
+                accumulator.mean,
+                accumulator.standard_error,
+            )
+            for quantity, accumulator in quantities.items()
+        }
+        for change, quantities in effects.items()
+    }
@@ -0,0 +1,345 @@
+"""
+A local HTTP service for simulating fights and attacks, so that
+notebooks and scripts can share one warm simulation process instead of
+each paying for startup, imports and compilation.
+
+Endpoints take and return JSON:
+
+* `POST /fights` - simulate fights between two characters, e.g.
+  {"char1": {"kind": "fighter", "level": 5, "ac": 18, "damage_dice": [10, 1]},
+  "char2": {"kind": "monster", "cr": 5}, "replications": 10000, "seed": 1}
+* `POST /damage` - simulate the damage of an attacker's attacks against
+  a target, alongside the exact expected damage, e.g.
+  {"attacker": {"kind": "barbarian", "level": 10, "damage_dice": [12, 1],
+  "gwf": true}, "target": {"kind": "monster", "cr": 10, "ac": 20},
+  "replications": 100000, "advantage": true}
+* `GET /health` - the state of the service
+
+Simulations run on a pool of worker processes, each of which compiles
+the fight kernels once when it starts. Results are cached by request,
+and identical requests that arrive while one is already being computed
+wait for the same computation instead of starting another. The service
+only listens on 127.0.0.1 by default.
+"""
+import argparse
+import asyncio
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from accumulators import MeanVarianceAccumulator
+from analytic import expected_damage
+from character import Barbarian, Character, Monster
+from shared import process_pool
+from sweep import seed_random_state
+from utils import (
+    fights,
+    generate_barbarian_stats,
+    generate_fighter_stats,
+    outcome_names,
+)
+
+
+MAX_REPLICATIONS = 10_000_000
+MAX_LEVEL = 20
+MAX_ROLLS = 100_000
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+def build_character(spec: dict) -> Character:
+    """
+    Create a Character from a JSON spec, with "kind" one of:
+
+    * "fighter" - level, ac, damage_dice, and optionally name
+    * "barbarian" - level, damage_dice, and optionally ac, gwf and name
+    * "monster" - cr, and optionally ac and name
+    """
+    spec = dict(spec)
+    kind = spec.pop("kind", None)
+    if kind == "fighter":
+        level = _bounded(spec.pop("level"), "level", 1, MAX_LEVEL)
+        return Character(**generate_fighter_stats(level), **spec)
+    if kind == "barbarian":
+        level = _bounded(spec.pop("level"), "level", 1, MAX_LEVEL)
+        gwf = spec.pop("gwf", False)
+        return Barbarian(**generate_barbarian_stats(level, gwf), **spec)
+    if kind == "monster":
+        # fractional CRs, e.g. 0.5, are allowed, and checked by Monster
+        cr = float(spec.pop("cr"))
+        return Monster(cr=int(cr) if cr.is_integer() else cr, **spec)
+    raise ValueError(f"Unknown kind of character: {kind}")
+
+
+def _bounded(value, name: str, low: int, high: int) -> int:
+    value = int(value)
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _replications(request: dict) -> int:
+    return _bounded(
+        request.get("replications", 10_000),
+        "replications",
+        1,
+        MAX_REPLICATIONS,
+    )
+
+
+def _seed(request: dict):
+    seed = request.get("seed")
+    seed_random_state(
+        seed if seed is not None else np.random.SeedSequence().entropy
+    )
+
+
+def simulate_fights(request: dict) -> dict:
+    """
+    Simulate the fights described by a /fights request.
+    """
+    replications = _replications(request)
+    _seed(request)
+    char1 = build_character(request["char1"])
+    char2 = build_character(request["char2"])
+    rolls = _bounded(request.get("rolls", 500), "rolls", 1, MAX_ROLLS)
+    fight_arr = fights(char1, char2, replications, rolls)
+    names = outcome_names(char1.name, char2.name)
+    counts = np.bincount(fight_arr["outcome"], minlength=len(names))
+    return dict(
+        replications=replications,
+        outcomes={
+            names[code]: int(count) for code, count in enumerate(counts)
+        },
+    )
+
+
+def simulate_damage(request: dict) -> dict:
+    """
+    Simulate the attacks described by a /damage request.
+    """
+    replications = _replications(request)
+    _seed(request)
+    attacker = build_character(request["attacker"])
+    target = build_character(request["target"])
+    advantage = bool(request.get("advantage", False))
+    disadvantage = bool(request.get("disadvantage", False))
+    damage = MeanVarianceAccumulator().update(
+        attacker.attack(target, replications, advantage, disadvantage)
+    )
+    return dict(
+        replications=replications,
+        mean=damage.mean,
+        standard_error=damage.standard_error if replications > 1 else None,
+        expected=expected_damage(attacker, target, advantage, disadvantage),
+    )
+
+
+ENDPOINTS = {
+    "/fights": simulate_fights,
+    "/damage": simulate_damage,
+}
+
+
+def _warm_up():
+    """
+    Compile the fight kernels and fill import caches once
+    when a worker process starts, rather than on its first request.
+    """
+    simulate_fights(
+        dict(
+            char1=dict(kind="monster", cr=1),
+            char2=dict(kind="monster", cr=1),
+            replications=10,
+            seed=0,
+        )
+    )
+
+
+def _ready() -> bool:
+    return True
+
+
+class SimulationService:
+    """
+    Parameters
+    ----------
+    workers: int
+        The number of processes to run simulations on
+    cache_size: int
+        The number of results to keep, least recently used first out
+    """
+
+    def __init__(self, workers: int = 1, cache_size: int = 256) -> None:
+        self.workers = workers
+        self.executor = process_pool(workers, initializer=_warm_up)
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.in_flight = dict()
+        self.computed = 0
+
+    async def start(self):
+        """
+        Start every worker process, so they are warm before
+        the first request arrives.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, _ready)
+                for _ in range(self.workers)
+            )
+        )
+
+    async def compute(self, path: str, request: dict) -> dict:
+        """
+        The result of a request, from the cache, from an identical
+        request already being computed, or from a new computation.
+        """
+        key = (path, json.dumps(request, sort_keys=True))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if key not in self.in_flight:
+            self.in_flight[key] = asyncio.ensure_future(
+                self._compute(key, path, request)
+            )
+        # one waiting client disconnecting shouldn't cancel the others
+        return await asyncio.shield(self.in_flight[key])
+
+    async def _compute(self, key: tuple, path: str, request: dict) -> dict:
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, ENDPOINTS[path], request
+            )
+        finally:
+            del self.in_flight[key]
+        self.computed += 1
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def health(self) -> dict:
+        return dict(
+            status="ok",
+            cached=len(self.cache),
+            in_flight=len(self.in_flight),
+            computed=self.computed,
+        )
+
+    async def route(self, method: str, path: str, body: bytes):
+        """
+        Answer a request, with an HTTP status and a JSON-able payload.
+        """
+        if path == "/health":
+            if method != "GET":
+                return 405, dict(error="Use GET")
+            return 200, self.health()
+        if path not in ENDPOINTS:
+            return 404, dict(error=f"Unknown path: {path}")
+        if method != "POST":
+            return 405, dict(error="Use POST")
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError("The request must be a JSON object")
+            return 200, await self.compute(path, request)
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, dict(error=f"{type(error).__name__}: {error}")
+        except Exception as error:
+            # e.g. a worker process that died, which the client
+            # should still hear about rather than be hung up on
+            return 500, dict(error=f"{type(error).__name__}: {error}")
+
+    async def handle(self, reader, writer):
+        """
+        Serve a single HTTP/1.1 request on a connection, then close it.
+        """
+        try:
+            request_line = await reader.readline()
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = dict()
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(
+                int(headers.get("content-length", 0))
+            )
+            status, payload = await self.route(method, path, body)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = 400, dict(error="Malformed HTTP request")
+
+        content = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Connection: close\r\n\r\n".encode() + content
+        )
+        await writer.drain()
+        writer.close()
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, **kwargs):
+    """
+    Run a SimulationService until cancelled.
+    Any keyword arguments are passed on to the SimulationService.
+    """
+    service = SimulationService(**kwargs)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes to simulate with",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        help="number of results to keep cached",
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(
+            serve(
+                args.host,
+                args.port,
+                workers=args.workers,
+                cache_size=args.cache_size,
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
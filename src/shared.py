@@ -0,0 +1,208 @@
+"""
+Collect results from worker processes without copying them.
+
+Returning NumPy arrays from a process pool means pickling them through
+a pipe, which gets expensive once results are large, e.g. the outcome
+of every replication. Instead, the parent process creates a
+`SharedArray` with one row per task, workers write their results
+directly into their task's row, and the parent reads the rows
+as NumPy views of the same memory.
+
+When tasks spend most of their time in NumPy calls that release the GIL,
+such as bulk random draws, cumulative sums and comparisons, `map_threads`
+runs them in a pool of threads instead, which costs nothing to start
+and shares memory to begin with.
+"""
+import multiprocessing
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from multiprocessing import shared_memory
+from typing import Callable
+
+import numpy as np
+
+from die import use_random_state
+from kernels import start_numba_threads
+
+
+class SharedArray:
+    """
+    A NumPy array backed by a shared memory block, which other processes
+    can attach to by its `spec`. The process that creates the block owns
+    it, and frees it when closed; use it as a context manager.
+    Views of `array` must not be kept after it is closed.
+
+    Parameters
+    ----------
+    shape: tuple
+        The shape of the array
+    dtype: np.dtype
+        The data type of the array
+    name: str
+        The name of an existing block to attach to
+        A new block is created when not given
+    """
+
+    def __init__(self, shape: tuple, dtype: np.dtype, name: str = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        self.memory = shared_memory.SharedMemory(
+            name=name, create=self.owner, size=size if self.owner else 0
+        )
+        self.array = np.ndarray(
+            self.shape, dtype=self.dtype, buffer=self.memory.buf
+        )
+
+    @property
+    def spec(self) -> tuple:
+        """
+        Everything another process needs to attach to this array.
+        """
+        return self.memory.name, self.shape, self.dtype
+
+    @classmethod
+    def attach(cls, spec: tuple):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name)
+
+    def close(self):
+        self.array = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_pool(workers: int, **kwargs) -> ProcessPoolExecutor:
+    """
+    A pool of worker processes started fresh rather than forked.
+    Forking a process whose numba threading layer has started, e.g. by
+    running a fight with the numba backend, can hang the pool or the
+    interpreter at exit, or break the pool.
+    Any keyword arguments are passed on to the ProcessPoolExecutor.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        **kwargs,
+    )
+
+
+# blocks attached by a worker process, which stay attached
+# for every task the process runs
+_attached = dict()
+
+
+def _run_task(function: Callable, spec: tuple, index: int, task):
+    name = spec[0]
+    if name not in _attached:
+        _attached[name] = SharedArray.attach(spec)
+    function(task, _attached[name].array[index])
+
+
+def map_shared(
+    function: Callable, tasks: list, shared: SharedArray, workers: int = 1
+):
+    """
+    Run a function for every task in a pool of worker processes,
+    with each task writing its results into its own row of a shared array.
+
+    Parameters
+    ----------
+    function: Callable
+        function(task, out)
+        Run a task, and write its results into `out`, the task's row
+        of the shared array; must be picklable, e.g. defined
+        at the top level of a module
+    tasks: list
+        The tasks to run, one per row of the shared array
+    shared: SharedArray
+        The array to write results into
+    workers: int
+        The number of worker processes, see `process_pool`
+        Tasks are run in this process when 1 or fewer
+
+    Yields
+    ------
+    index: int
+        The index of each task, as soon as its row has been written
+    """
+    if workers <= 1:
+        for index, task in enumerate(tasks):
+            function(task, shared.array[index])
+            yield index
+        return
+
+    with process_pool(workers) as executor:
+        futures = {
+            executor.submit(_run_task, function, shared.spec, index, task): (
+                index
+            )
+            for index, task in enumerate(tasks)
+        }
+        for future in as_completed(futures):
+            future.result()
+            yield futures[future]
+
+
+def _run_thread_task(function: Callable, task, out: np.ndarray):
+    # every task rolls with its own random state, which it seeds itself
+    with use_random_state(np.random.RandomState()):
+        function(task, out)
+
+
+def map_threads(
+    function: Callable, tasks: list, out: np.ndarray, workers: int = 1
+):
+    """
+    Run a function for every task in a pool of threads, with each task
+    writing its results into its own row of an array. Each task rolls
+    dice with its own random state (see `die.use_random_state`), so a task
+    that seeds its random state gets the same results as in a process.
+
+    Parameters
+    ----------
+    function: Callable
+        function(task, out)
+        Run a task, and write its results into `out`, the task's row
+        of the array
+    tasks: list
+        The tasks to run, one per row of the array
+    out: np.ndarray
+        The array to write results into
+    workers: int
+        The number of threads
+        Tasks are run in this thread when 1 or fewer
+
+    Yields
+    ------
+    index: int
+        The index of each task, as soon as its row has been written
+    """
+    if workers <= 1:
+        for index, task in enumerate(tasks):
+            _run_thread_task(function, task, out[index])
+            yield index
+        return
+
+    start_numba_threads()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_run_thread_task, function, task, out[index]): (
+                index
+            )
+            for index, task in enumerate(tasks)
+        }
+        for future in as_completed(futures):
+            future.result()
+            yield futures[future]
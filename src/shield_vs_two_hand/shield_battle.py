@@ -29,23 +29,25 @@ Each set of parameters (level, hit die, and AC) will be considered its own
 simulation, with the outputs averaged within that simulation only. However,
 in the overarching analysis, all simulations will be considered cohesively.
 """
-import os
+import argparse
 import math
 
 import numpy as np
 from plotly import graph_objects as go
 
 from character import Character, Monster
-from utils import fight, generate_fighter_stats, images_directory
+from progress import running_estimates
+from rendering import ChartRenderer, render_arguments
+from sweep import run_sweep, sweep_arguments
+from utils import fights, generate_fighter_stats, outcome_names
 
 
 def create_chart(
     results: dict,
     colors: dict,
     title: str,
-    filename: str,
     replications: int,
-):
+) -> go.Figure:
     """
     Create a bar chart to track simulation results
 
@@ -57,10 +59,13 @@ def create_chart(
         Dictionary of colors for names of characters
     title: str
         Title for the chart
-    filename: str
-        Name of the file for the chart
     replications: int
         Number of replications used in the simulation
+
+    Returns
+    -------
+    fig: go.Figure
+        The bar chart, ready to be rendered
     """
 
     # list comprehensions are hard
@@ -106,69 +111,127 @@ def create_chart(
             "x": 0.5,
         },
     )
-    fig.write_image(os.path.join(images_directory, filename))
+    return fig
+
+
+# the names of the Characters, only used when presenting results
+NAMES = dict(
+    longswordington="Longswordington",
+    shieldsworth="Shieldsworth",
+    monster="Zombie",
+)
+# which Characters fight each other in each chart
+MATCHUPS = {
+    "char_fight": ("longswordington", "shieldsworth"),
+    "longsword_mon_fight": ("longswordington", "monster"),
+    "shield_mon_fight": ("shieldsworth", "monster"),
+}
+
+
+def build_characters(level: int) -> dict:
+    """
+    Create the duelling characters and the monster for a given level.
+    """
+    # assume both players have equal AC, which increases
+    # by 1 every 4 levels
+    # up to a non-shield value of 22 at level 20
+    ac = 17 + math.floor(level / 4)
+    shared_stats = generate_fighter_stats(level)
+    longswordington = Character(
+        name=NAMES["longswordington"],
+        **shared_stats,
+        ac=ac,
+        damage_dice=(10, 1),
+    )
+    shieldsworth = Character(
+        name=NAMES["shieldsworth"],
+        **shared_stats,
+        ac=ac + 2,
+        damage_dice=(8, 1),
+    )
+    monster = Monster(
+        name=NAMES["monster"],
+        cr=level,
+    )
+    return dict(
+        longswordington=longswordington,
+        shieldsworth=shieldsworth,
+        monster=monster,
+    )
+
+
+def simulate_matchup(characters: dict, cell: tuple, replications: int):
+    """
+    Simulate a batch of fights for one (level, matchup) cell of the sweep,
+    and return the outcome code of each fight.
+    """
+    _, matchup = cell
+    char1, char2 = (characters[name] for name in MATCHUPS[matchup])
+    return fights(char1, char2, replications)["outcome"]
+
 
+def outcome_estimates(cell: tuple, outcomes) -> dict:
+    """
+    The running proportion of each outcome of a cell, by name,
+    for progress reports.
+    """
+    _, matchup = cell
+    names = outcome_names(*(NAMES[name] for name in MATCHUPS[matchup]))
+    return {
+        names[code]: estimate
+        for code, estimate in running_estimates(cell, outcomes).items()
+    }
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        parents=[render_arguments(), sweep_arguments()],
+    )
+    parser.add_argument(
+        "--replications",
+        type=int,
+        default=10_000,
+        help="number of fights per level and matchup",
+    )
+    args = parser.parse_args(argv)
+    renderer = ChartRenderer.from_args(args)
 
-def main():
-    REPLICATIONS = 10_000
     levels = range(1, 21)
-    char_fight_results = dict()
-    longsword_mon_fight_results = dict()
-    shield_mon_fight_results = dict()
-
-    for level in levels:
-        # assume both players have equal AC, which increases
-        # by 1 every 4 levels
-        # up to a non-shield value of 22 at level 20
-        ac = 17 + math.floor(level / 4)
-        shared_stats = generate_fighter_stats(level)
-        longswordington = Character(
-            name="Longswordington",
-            **shared_stats,
-            ac=ac,
-            damage_dice=(10, 1),
-        )
-        shieldsworth = Character(
-            name="Shieldsworth",
-            **shared_stats,
-            ac=ac + 2,
-            damage_dice=(8, 1),
-        )
-        monster = Monster(
-            name="Zombie",
-            cr=level,
-        )
+    sweep_results, REPLICATIONS = run_sweep(
+        args,
+        script=__file__,
+        argv=[f"--replications={args.replications}"],
+        cells=[(level, matchup) for level in levels for matchup in MATCHUPS],
+        setup=build_characters,
+        simulate=simulate_matchup,
+        estimates=outcome_estimates,
+        replications=args.replications,
+        outcome_dtype=np.int8,
+    )
+    if sweep_results is None:
+        # this shard's partial results will be charted after merging
+        return
 
-        char_fight_results[level] = np.unique(
-            [
-                fight(
-                    longswordington,
-                    shieldsworth,
-                )
-                for _ in range(REPLICATIONS)
-            ],
-            return_counts=True,
-        )
-        longsword_mon_fight_results[level] = np.unique(
-            [
-                fight(
-                    longswordington,
-                    monster,
-                )
-                for _ in range(REPLICATIONS)
-            ],
-            return_counts=True,
-        )
-        shield_mon_fight_results[level] = np.unique(
+    if isinstance(REPLICATIONS, dict):
+        # with a budget, every cell has its own number of replications,
+        # so counts are charted per --replications fights
+        REPLICATIONS = args.replications
+    results = {matchup: dict() for matchup in MATCHUPS}
+    for (level, matchup), outcomes in sweep_results.items():
+        names = outcome_names(*(NAMES[name] for name in MATCHUPS[matchup]))
+        codes = sorted(outcomes.counts)
+        results[matchup][level] = (
+            [names[code] for code in codes],
             [
-                fight(
-                    shieldsworth,
-                    monster,
-                )
-                for _ in range(REPLICATIONS)
+                round(outcomes.counts[code] * REPLICATIONS / outcomes.total)
+                for code in codes
             ],
-            return_counts=True,
         )
+    char_fight_results = results["char_fight"]
+    longsword_mon_fight_results = results["longsword_mon_fight"]
+    shield_mon_fight_results = results["shield_mon_fight"]
 
     # generate combinations of results for each chart
     tie = {"Tie": "green"}
@@ -179,27 +242,34 @@ def main():
     longsword_mon_fight_colors = {**tie, **ls, **mon}
     shield_mon_fight_colors = {**tie, **sh, **mon}
 
-    create_chart(
-        char_fight_results,
-        char_fight_colors,
-        "Longswordington vs Shieldsworth",
+    renderer.add(
+        create_chart(
+            char_fight_results,
+            char_fight_colors,
+            "Longswordington vs Shieldsworth",
+            REPLICATIONS,
+        ),
         "shield_battle.png",
-        REPLICATIONS,
     )
-    create_chart(
-        longsword_mon_fight_results,
-        longsword_mon_fight_colors,
-        "Longswordington vs Monster",
+    renderer.add(
+        create_chart(
+            longsword_mon_fight_results,
+            longsword_mon_fight_colors,
+            "Longswordington vs Monster",
+            REPLICATIONS,
+        ),
         "ls_mon.png",
-        REPLICATIONS,
     )
-    create_chart(
-        shield_mon_fight_results,
-        shield_mon_fight_colors,
-        "Shieldsworth vs Monster",
+    renderer.add(
+        create_chart(
+            shield_mon_fight_results,
+            shield_mon_fight_colors,
+            "Shieldsworth vs Monster",
+            REPLICATIONS,
+        ),
         "sh_mon.png",
-        REPLICATIONS,
     )
+    renderer.render()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,813 @@
+"""
+Run a simulation over a grid of cells, with checkpoints.
+
+A sweep is a list of cells, e.g. (level, matchup) pairs, each of which
+is simulated for the same number of replications (or for its own number,
+see `budget.py`), in batches.
+Cells are (row, column) tuples: every cell in a row shares the objects
+built by `setup(row)`, e.g. the Characters of a given level.
+
+Every row and every cell gets its own random seed, derived from the
+sweep's seed, so a cell's results depend only on the seed and not
+on which cells were simulated before it. Finished cells and the
+partial accumulator of the current cell, along with NumPy's random state,
+are periodically written to a checkpoint file. A sweep restarted
+with the same checkpoint resumes where it stopped, and produces
+exactly the same results as one that was never interrupted.
+
+Very large sweeps can be split into shards, e.g. one per machine.
+Each shard simulates its slice of every cell's replications, with
+random streams derived from the shard index, and writes a partial
+result file. `merge_partials` combines the partial results of all shards.
+`run_local_shards` runs every shard as its own process on one machine.
+
+Cells can also be spread across several worker processes on one machine,
+which write every replication's outcome directly into shared memory
+(see `shared.py`) for the parent to accumulate, or across several threads,
+each rolling with its own random state, which skips starting processes
+for mid-sized sweeps.
+"""
+import argparse
+import functools
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from accumulators import CountAccumulator
+from budget import (
+    OBJECTIVES,
+    achieved_precision,
+    allocate,
+    format_precision,
+    replication_variance,
+)
+from die import random_state
+from progress import ProgressReporter, running_estimates
+from shared import SharedArray, map_shared, map_threads
+
+
+SETUP_STREAM = 0
+CELL_STREAM = 1
+# the cell streams of a second pass over the same cells, see `budget.py`
+ALLOCATED_STREAM = 2
+EXECUTORS = ["process", "thread"]
+
+
+def seed_random_state(seed: int, *spawn_key: int):
+    """
+    Seed the calling thread's random state (see `die.random_state`)
+    with an independent stream for the given spawn key,
+    derived from the seed.
+    """
+    seed_sequence = np.random.SeedSequence(seed, spawn_key=spawn_key)
+    random_state().seed(seed_sequence.generate_state(4))
+
+
+def _simulate_cell(
+    task: tuple,
+    out: np.ndarray,
+    setup: Callable,
+    simulate: Callable,
+    seed: int,
+    cell_stream: int,
+    shard_index: int,
+    batch_size: int,
+):
+    """
+    Simulate every replication of a cell in a worker process,
+    with the same random streams as `Sweep.run`, and write
+    their outcomes into `out`, the start of the cell's row
+    of a shared array.
+    """
+    cell_index, row_index, cell, replications = task
+    out = out[:replications]
+    seed_random_state(seed, SETUP_STREAM, row_index)
+    context = setup(cell[0])
+    seed_random_state(seed, cell_stream, cell_index, shard_index)
+    for start in range(0, len(out), batch_size):
+        batch = min(batch_size, len(out) - start)
+        out[start : start + batch] = simulate(context, cell, batch)
+
+
+class Sweep:
+    """
+    Parameters
+    ----------
+    cells: list
+        List of (row, column) tuples to simulate
+    setup: Callable
+        setup(row) -> context
+        Build the objects shared by a row of cells
+    simulate: Callable
+        simulate(context, cell, replications) -> np.ndarray
+        Simulate a batch of replications for a cell, and return
+        an array of their outcomes
+    accumulator: Callable
+        accumulator() -> accumulator
+        Create the streaming accumulator (see `accumulators.py`)
+        that a cell's batches of outcomes are added to
+    replications: int or dict
+        The number of replications per cell, or a dictionary
+        of cell -> number of replications
+    batch_size: int
+        The number of replications to simulate between checkpoints
+    seed: int
+        The seed every random stream is derived from
+        Defaults to the seed stored in the checkpoint, if any,
+        otherwise to fresh entropy
+    checkpoint_path: str
+        The file to write checkpoints to, and resume from
+    checkpoint_interval: float
+        The minimum number of seconds between checkpoints
+        of a partially simulated cell
+    shard_index: int
+        Which shard of the sweep to simulate
+    shard_count: int
+        The number of shards the sweep's replications are split into
+    workers: int
+        The number of processes or threads to simulate cells with
+        Results are the same for any number of workers
+    executor: str
+        "process" or "thread", what workers run in
+    outcome_dtype: np.dtype
+        The data type of the outcomes returned by `simulate`,
+        which workers write into shared memory
+    progress: ProgressReporter
+        The reporter to tell about every batch and finished cell
+    cell_stream: int
+        The spawn key the random streams of cells are derived from,
+        so that several sweeps with the same seed (and so the same
+        `setup`) can simulate independent replications of the same cells
+    """
+
+    def __init__(
+        self,
+        cells: list,
+        setup: Callable,
+        simulate: Callable,
+        replications: int,
+        accumulator: Callable = CountAccumulator,
+        batch_size: int = 1_000,
+        seed: int = None,
+        checkpoint_path: str = None,
+        checkpoint_interval: float = 60.0,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        workers: int = 1,
+        executor: str = "process",
+        outcome_dtype: np.dtype = np.int64,
+        progress: ProgressReporter = None,
+        cell_stream: int = CELL_STREAM,
+    ) -> None:
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(
+                f"Shard index {shard_index} is out of range "
+                f"for {shard_count} shards"
+            )
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor: {executor}")
+        self.cells = list(cells)
+        self.rows = list(dict.fromkeys(row for row, _ in self.cells))
+        self.setup = setup
+        self.simulate = simulate
+        self.accumulator = accumulator
+        self.replications = replications
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.workers = workers
+        self.executor = executor
+        self.outcome_dtype = outcome_dtype
+        self.progress = progress
+        self.cell_stream = cell_stream
+
+        self.finished = dict()
+        self.partial = None
+        checkpoint = self.load_checkpoint()
+        if checkpoint is not None:
+            if seed is None:
+                seed = checkpoint["config"]["seed"]
+            self.seed = seed
+            if checkpoint["config"] != self.config:
+                raise ValueError(
+                    f"Checkpoint {checkpoint_path} was written by a sweep "
+                    "with a different configuration"
+                )
+            self.finished = checkpoint["finished"]
+            self.partial = checkpoint["partial"]
+        else:
+            self.seed = (
+                seed if seed is not None else np.random.SeedSequence().entropy
+            )
+        self._last_checkpoint = time.monotonic()
+
+    @property
+    def config(self) -> dict:
+        """
+        Everything that determines a sweep's results, which must match
+        between a checkpoint and the sweep resuming from it.
+        """
+        return dict(
+            cells=self.cells,
+            replications=self.replications,
+            batch_size=self.batch_size,
+            seed=self.seed,
+            shard_index=self.shard_index,
+            shard_count=self.shard_count,
+            cell_stream=self.cell_stream,
+        )
+
+    def shard_replications(self, cell: tuple) -> int:
+        """
+        The number of replications of a cell simulated by this shard.
+        """
+        replications, remainder = divmod(
+            (
+                self.replications[cell]
+                if isinstance(self.replications, dict)
+                else self.replications
+            ),
+            self.shard_count,
+        )
+        return replications + int(self.shard_index < remainder)
+
+    def _start_progress(self, cell_completed: int = 0):
+        self.progress.start(
+            len(self.cells),
+            {cell: self.shard_replications(cell) for cell in self.cells},
+            len(self.finished),
+            cell_completed,
+            sum(self.shard_replications(cell) for cell in self.finished),
+        )
+
+    def seed_random_state(self, *spawn_key: int):
+        """
+        Seed NumPy's global random state with an independent
+        stream for the given row, or cell and shard.
+        """
+        seed_random_state(self.seed, *spawn_key)
+
+    def run(self) -> dict:
+        """
+        Simulate every cell that hasn't finished yet.
+
+        Returns
+        -------
+        results: dict
+            Dictionary of cell -> accumulator of outcomes, in cell order
+        """
+        if self.workers > 1:
+            return self.run_workers()
+
+        if self.progress is not None:
+            self._start_progress(
+                self.partial["completed"] if self.partial is not None else 0
+            )
+        for cell_index, cell in enumerate(self.cells):
+            if cell in self.finished:
+                continue
+            row, _ = cell
+            self.seed_random_state(SETUP_STREAM, self.rows.index(row))
+            context = self.setup(row)
+
+            if self.partial is not None and self.partial["cell"] == cell:
+                accumulator = self.partial["accumulator"]
+                completed = self.partial["completed"]
+                random_state().set_state(self.partial["random_state"])
+            else:
+                accumulator = self.accumulator()
+                completed = 0
+                self.seed_random_state(
+                    self.cell_stream, cell_index, self.shard_index
+                )
+
+            replications = self.shard_replications(cell)
+            while completed < replications:
+                batch = min(self.batch_size, replications - completed)
+                accumulator.update(self.simulate(context, cell, batch))
+                completed += batch
+                self.partial = dict(
+                    cell=cell,
+                    accumulator=accumulator,
+                    completed=completed,
+                    random_state=random_state().get_state(),
+                )
+                if self.progress is not None:
+                    self.progress.update(cell, completed, accumulator)
+                if (
+                    time.monotonic() - self._last_checkpoint
+                    >= self.checkpoint_interval
+                ):
+                    self.save_checkpoint()
+
+            self.finished[cell] = accumulator
+            self.partial = None
+            self.save_checkpoint()
+            if self.progress is not None:
+                self.progress.finish_cell(cell, accumulator)
+
+        if self.progress is not None:
+            self.progress.finish()
+        return {cell: self.finished[cell] for cell in self.cells}
+
+    def run_workers(self) -> dict:
+        """
+        Simulate every cell that hasn't finished yet, spread across
+        worker processes or threads. Every replication's outcome is
+        written into an array shared with the workers, and accumulated
+        as each cell finishes. A partially simulated cell is simulated
+        again from its start, with the same results.
+
+        Returns
+        -------
+        results: dict
+            Dictionary of cell -> accumulator of outcomes, in cell order
+        """
+        tasks = [
+            (
+                cell_index,
+                self.rows.index(cell[0]),
+                cell,
+                self.shard_replications(cell),
+            )
+            for cell_index, cell in enumerate(self.cells)
+            if cell not in self.finished
+        ]
+        self.partial = None
+        if self.progress is not None:
+            self._start_progress()
+        simulate_cell = functools.partial(
+            _simulate_cell,
+            setup=self.setup,
+            simulate=self.simulate,
+            seed=self.seed,
+            cell_stream=self.cell_stream,
+            shard_index=self.shard_index,
+            batch_size=self.batch_size,
+        )
+        # every task's outcomes fill the start of its row
+        shape = (
+            len(tasks),
+            max((replications for *_, replications in tasks), default=0),
+        )
+        if self.executor == "thread":
+            outcomes = np.empty(shape, self.outcome_dtype)
+            self._accumulate(
+                tasks,
+                outcomes,
+                map_threads(simulate_cell, tasks, outcomes, self.workers),
+            )
+        else:
+            with SharedArray(shape, self.outcome_dtype) as outcomes:
+                self._accumulate(
+                    tasks,
+                    outcomes.array,
+                    map_shared(simulate_cell, tasks, outcomes, self.workers),
+                )
+
+        if self.progress is not None:
+            self.progress.finish()
+        return {cell: self.finished[cell] for cell in self.cells}
+
+    def _accumulate(self, tasks: list, outcomes: np.ndarray, indices):
+        """
+        Accumulate the outcomes of every task, as their indices are yielded.
+        """
+        for index in indices:
+            _, _, cell, replications = tasks[index]
+            self.finished[cell] = self.accumulator().update(
+                outcomes[index, :replications]
+            )
+            self.save_checkpoint()
+            if self.progress is not None:
+                self.progress.finish_cell(cell, self.finished[cell])
+
+    def save_partial(self, path: str):
+        """
+        Write this shard's results to a partial result file,
+        to be combined with the other shards' by `merge_partials`.
+        """
+        partial = dict(config=self.config, results=self.run())
+        with open(path, "wb") as f:
+            pickle.dump(partial, f)
+
+    def load_checkpoint(self):
+        if self.checkpoint_path is None or not os.path.exists(
+            self.checkpoint_path
+        ):
+            return None
+        with open(self.checkpoint_path, "rb") as f:
+            return pickle.load(f)
+
+    def save_checkpoint(self):
+        """
+        Atomically write finished cells and the current cell's
+        progress to the checkpoint file.
+        """
+        self._last_checkpoint = time.monotonic()
+        if self.checkpoint_path is None:
+            return
+        checkpoint = dict(
+            config=self.config,
+            finished=self.finished,
+            partial=self.partial,
+        )
+        temporary_path = f"{self.checkpoint_path}.tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump(checkpoint, f)
+        os.replace(temporary_path, self.checkpoint_path)
+
+
+def merge_partials(paths: list):
+    """
+    Combine the partial result files written by every shard of a sweep.
+
+    Parameters
+    ----------
+    paths: list
+        Paths of the partial result files, one per shard
+
+    Returns
+    -------
+    results: dict
+        Dictionary of cell -> accumulator of outcomes, in cell order
+    replications: int
+        The total number of replications per cell
+    """
+    partials = []
+    for path in paths:
+        with open(path, "rb") as f:
+            partials.append(pickle.load(f))
+
+    # every shard's configuration is the same, besides its index
+    configs = [
+        dict(partial["config"], shard_index=None) for partial in partials
+    ]
+    sweep_config = configs[0]
+    if any(config != sweep_config for config in configs):
+        raise ValueError("Partial results come from different sweeps")
+    shard_indices = sorted(
+        partial["config"]["shard_index"] for partial in partials
+    )
+    if shard_indices != list(range(sweep_config["shard_count"])):
+        raise ValueError(
+            f"Expected one partial result for each of "
+            f"{sweep_config['shard_count']} shards, got shards {shard_indices}"
+        )
+
+    results = dict()
+    for partial in partials:
+        for cell, accumulator in partial["results"].items():
+            if cell in results:
+                results[cell].merge(accumulator)
+            else:
+                results[cell] = accumulator
+    return results, sweep_config["replications"]
+
+
+def sweep_arguments() -> argparse.ArgumentParser:
+    """
+    Command line arguments shared by all scripts that run a Sweep,
+    to be used as a parent parser.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--seed", type=int, default=None, help="seed for the whole sweep"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="file to checkpoint progress to, and to resume from",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=60.0,
+        help="minimum number of seconds between checkpoints",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes or threads to simulate cells with",
+    )
+    parser.add_argument(
+        "--executor",
+        default="process",
+        choices=EXECUTORS,
+        help="run workers as processes, or as threads, which start "
+        "faster but only help while NumPy releases the GIL",
+    )
+    reporting = parser.add_argument_group("progress")
+    reporting.add_argument(
+        "--progress-interval",
+        type=float,
+        default=10.0,
+        help="minimum number of seconds between progress reports",
+    )
+    reporting.add_argument(
+        "--status-file",
+        default=None,
+        help="JSON file to rewrite with every progress report",
+    )
+    reporting.add_argument(
+        "--quiet",
+        action="store_true",
+        help="don't print progress reports",
+    )
+    budgeting = parser.add_argument_group("budget")
+    budgeting.add_argument(
+        "--budget",
+        type=int,
+        default=None,
+        help="total number of replications shared by every cell, "
+        "allocated by the variance of a pilot pass, instead of "
+        "the same number for every cell",
+    )
+    budgeting.add_argument(
+        "--pilot-replications",
+        type=int,
+        default=1_000,
+        help="number of replications of every cell in the pilot pass",
+    )
+    budgeting.add_argument(
+        "--objective",
+        default="worst",
+        choices=OBJECTIVES,
+        help="minimize the worst standard error of any cell, "
+        "or the total squared standard error of every cell",
+    )
+    sharding = parser.add_argument_group("sharding")
+    sharding.add_argument(
+        "--shard-index",
+        type=int,
+        default=0,
+        help="which shard to simulate, starting from 0",
+    )
+    sharding.add_argument(
+        "--shard-count",
+        type=int,
+        default=1,
+        help="number of shards the sweep is split into",
+    )
+    sharding.add_argument(
+        "--partial-out",
+        default=None,
+        help="write this shard's results to a partial result file "
+        "instead of creating charts",
+    )
+    sharding.add_argument(
+        "--merge",
+        nargs="+",
+        default=None,
+        metavar="PARTIAL",
+        help="create charts from the partial result files of every shard",
+    )
+    sharding.add_argument(
+        "--local-shards",
+        type=int,
+        default=None,
+        help="run every shard as a separate local process, then merge "
+        "them; each shard runs with --workers workers",
+    )
+    return parser
+
+
+def run_local_shards(script: str, argv: list, shard_count: int, seed: int):
+    """
+    Run every shard of a sweep as its own process, as a stand-in
+    for running them on separate machines, and merge their results.
+
+    Parameters
+    ----------
+    script: str
+        The path of the script running the sweep
+    argv: list
+        The command line arguments to pass to every shard
+    shard_count: int
+        The number of shards
+    seed: int
+        The seed shared by all shards
+
+    Returns
+    -------
+    results, replications
+        See `merge_partials`
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [
+            os.path.join(directory, f"shard{shard_index}.pkl")
+            for shard_index in range(shard_count)
+        ]
+        processes = [
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    script,
+                    *argv,
+                    f"--seed={seed}",
+                    f"--shard-index={shard_index}",
+                    f"--shard-count={shard_count}",
+                    f"--partial-out={path}",
+                ]
+            )
+            for shard_index, path in enumerate(paths)
+        ]
+        for shard_index, process in enumerate(processes):
+            if process.wait() != 0:
+                raise RuntimeError(f"Shard {shard_index} failed")
+        return merge_partials(paths)
+
+
+def run_budgeted_sweep(
+    budget: int,
+    pilot_replications: int = 1_000,
+    objective: str = "worst",
+    seed: int = None,
+    checkpoint_path: str = None,
+    **kwargs,
+):
+    """
+    Run a sweep with a budget of replications shared by every cell:
+    a pilot pass of every cell, then a second pass of the replications
+    allocated to each cell by `allocate`.
+
+    Parameters
+    ----------
+    budget: int
+        The total number of replications of every cell
+    pilot_replications: int
+        The number of replications of every cell in the pilot pass
+    objective: str
+        "worst" or "total", see `allocate`
+    seed: int
+        The seed of both passes
+        Defaults to the seed stored in the pilot's checkpoint, if any,
+        otherwise to fresh entropy
+    checkpoint_path: str
+        The file to checkpoint the second pass to, and resume from;
+        the pilot is checkpointed next to it
+    kwargs:
+        Arguments for both passes' Sweeps, besides replications
+
+    Returns
+    -------
+    results: dict
+        Dictionary of cell -> accumulator of outcomes, in cell order
+    allocation: dict
+        Dictionary of cell -> number of replications
+    """
+    pilot = Sweep(
+        replications=pilot_replications,
+        seed=seed,
+        checkpoint_path=(
+            f"{checkpoint_path}.pilot" if checkpoint_path is not None else None
+        ),
+        **kwargs,
+    )
+    pilot_results = pilot.run()
+    allocation = allocate(
+        {
+            cell: replication_variance(accumulator)
+            for cell, accumulator in pilot_results.items()
+        },
+        budget,
+        minimum=pilot_replications,
+        objective=objective,
+    )
+    # the same seed builds the same rows, and the allocated stream
+    # rolls replications independent of the pilot's
+    allocated = Sweep(
+        replications={
+            cell: replications - pilot_replications
+            for cell, replications in allocation.items()
+        },
+        seed=pilot.seed,
+        checkpoint_path=checkpoint_path,
+        cell_stream=ALLOCATED_STREAM,
+        **kwargs,
+    )
+    allocated_results = allocated.run()
+    results = {
+        cell: pilot_results[cell].merge(allocated_results[cell])
+        for cell in pilot.cells
+    }
+    return results, allocation
+
+
+def run_sweep(
+    args: argparse.Namespace,
+    script: str,
+    argv: list,
+    estimates: Callable = running_estimates,
+    **kwargs,
+):
+    """
+    Run a sweep as requested by arguments parsed with `sweep_arguments`:
+    in full, as a single shard, as local shards, by merging partials,
+    or with a budget of replications (see `run_budgeted_sweep`).
+
+    Parameters
+    ----------
+    args: argparse.Namespace
+        The parsed command line arguments
+    script: str
+        The path of the script running the sweep, for local shards
+    argv: list
+        The script's other command line arguments, for local shards,
+        which are also given the sweep's workers, executor and progress
+        arguments
+    estimates: Callable
+        The running estimates to report progress with,
+        see `ProgressReporter`
+    kwargs:
+        Arguments for the Sweep, besides those set on the command line
+
+    Returns
+    -------
+    results: dict
+        Dictionary of cell -> accumulator of outcomes, in cell order,
+        or None if a single shard wrote its partial results instead
+    replications: int or dict
+        The total number of replications per cell, or with a budget,
+        a dictionary of cell -> number of replications
+    """
+    if args.budget is not None and (
+        args.merge is not None
+        or args.local_shards is not None
+        or args.shard_count > 1
+        or args.partial_out is not None
+    ):
+        raise ValueError("A sweep with a budget can't be sharded")
+    if args.merge is not None:
+        return merge_partials(args.merge)
+    if args.local_shards is not None:
+        seed = (
+            args.seed
+            if args.seed is not None
+            else np.random.SeedSequence().entropy
+        )
+        # every shard runs with the same workers, and reports progress
+        # the same way, as the sweep it stands in for
+        shard_argv = [
+            *argv,
+            f"--workers={args.workers}",
+            f"--executor={args.executor}",
+            f"--progress-interval={args.progress_interval}",
+        ]
+        if args.quiet:
+            shard_argv.append("--quiet")
+        return run_local_shards(script, shard_argv, args.local_shards, seed)
+
+    if args.shard_count > 1 and args.seed is None:
+        raise ValueError("Every shard of a sweep needs the same --seed")
+    progress = ProgressReporter(
+        interval=args.progress_interval,
+        status_path=args.status_file,
+        stream=None if args.quiet else sys.stderr,
+        estimates=estimates,
+    )
+    if args.budget is not None:
+        # every cell's replications come out of the budget instead
+        kwargs.pop("replications", None)
+        results, allocation = run_budgeted_sweep(
+            args.budget,
+            args.pilot_replications,
+            args.objective,
+            seed=args.seed,
+            checkpoint_path=args.checkpoint,
+            checkpoint_interval=args.checkpoint_interval,
+            workers=args.workers,
+            executor=args.executor,
+            progress=progress,
+            **kwargs,
+        )
+        if not args.quiet:
+            print(
+                format_precision(achieved_precision(results)), file=sys.stderr
+            )
+        return results, allocation
+
+    sweep = Sweep(
+        seed=args.seed,
+        checkpoint_path=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        shard_index=args.shard_index,
+        shard_count=args.shard_count,
+        workers=args.workers,
+        executor=args.executor,
+        progress=progress,
+        **kwargs,
+    )
+    if args.partial_out is not None:
+        sweep.save_partial(args.partial_out)
+        return None, sweep.replications
+    return sweep.run(), sweep.replications
@@ -0,0 +1,17 @@
+import math
+
+import numpy as np
+
+from accumulators import MeanVarianceAccumulator
+
+
+def test_empty_accumulator_standard_error_is_nan():
+    accumulator = MeanVarianceAccumulator()
+    assert math.isnan(accumulator.variance)
+    assert math.isnan(accumulator.standard_error)
+
+
+def test_standard_error():
+    accumulator = MeanVarianceAccumulator()
+    accumulator.update(np.array([1.0, 2.0, 3.0]))
+    assert math.isclose(accumulator.standard_error, math.sqrt(1 / 3))
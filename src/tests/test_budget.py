@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from budget import _round_allocation, allocate
+
+
+VARIANCES = {
+    (1, 1): 0.01,
+    (1, 5): 0.04,
+    (5, 5): 0.25,
+    (5, 11): 0.16,
+    (11, 11): 0.09,
+}
+
+
+@pytest.mark.parametrize("objective", ["worst", "total"])
+@pytest.mark.parametrize("budget", [5, 999, 10_000, 123_457])
+def test_allocation_adds_up_to_budget(objective, budget):
+    allocation = allocate(VARIANCES, budget, objective=objective)
+    assert list(allocation) == list(VARIANCES)
+    assert sum(allocation.values()) == budget
+    assert all(isinstance(n, int) for n in allocation.values())
+
+
+@pytest.mark.parametrize("objective", ["worst", "total"])
+@pytest.mark.parametrize("minimum", [100, 1_000, 1_900])
+def test_allocation_respects_minimum(objective, minimum):
+    allocation = allocate(VARIANCES, 10_000, minimum, objective)
+    assert sum(allocation.values()) == 10_000
+    assert min(allocation.values()) >= minimum
+
+
+@pytest.mark.parametrize(
+    "objective, weight", [("worst", lambda v: v), ("total", np.sqrt)]
+)
+def test_allocation_is_proportional(objective, weight):
+    budget = 100_003
+    allocation = allocate(VARIANCES, budget, objective=objective)
+    weights = np.array([weight(v) for v in VARIANCES.values()])
+    shares = budget * weights / weights.sum()
+    # rounding moves each cell by less than one replication
+    assert np.all(np.abs(np.array(list(allocation.values())) - shares) < 1)
+
+
+def test_allocation_shares_the_rest_above_minimum():
+    allocation = allocate({"a": 0.0, "b": 1.0, "c": 3.0}, 1_100, 100)
+    assert allocation == {"a": 100, "b": 250, "c": 750}
+
+
+def test_allocation_without_variance_is_even():
+    assert allocate({"a": 0.0, "b": 0.0}, 11) in [
+        {"a": 6, "b": 5},
+        {"a": 5, "b": 6},
+    ]
+
+
+def test_round_allocation_gives_leftover_to_largest_remainders():
+    allocation = _round_allocation(np.array([1.2, 2.7, 3.6, 2.5]), 10)
+    assert allocation.tolist() == [1, 3, 4, 2]
+
+
+def test_allocation_rejects_unknown_objective():
+    with pytest.raises(ValueError):
+        allocate(VARIANCES, 1_000, objective="mean")
+
+
+def test_allocation_rejects_budget_below_minimum():
+    with pytest.raises(ValueError):
+        allocate(VARIANCES, 1_000, minimum=201)
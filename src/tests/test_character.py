@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from analytic import expected_damage
+from character import (
+    MONSTER_CR_RANGE,
+    MONSTER_MAX_CR,
+    MONSTER_STAT_OPTIONS,
+    Barbarian,
+    Character,
+    Monster,
+    monster_stat_distribution,
+)
+from sweep import seed_random_state
+from utils import generate_barbarian_stats, generate_fighter_stats
+from validation import mean_test
+
+
+def triangular_index_probabilities(cr: float, option_count: int):
+    """
+    The probability of each index, as the rounded value of a triangular
+    distribution (see `Monster._choose_value`), by integrating its
+    density over the values that round to each index.
+    """
+    right = min(option_count - 1, cr + MONSTER_CR_RANGE)
+    left = min(max(0, cr - MONSTER_CR_RANGE), right - 1)
+    mode = min(max(cr * right / MONSTER_MAX_CR, left), right)
+    steps = 20_000
+    probabilities = []
+    for index in range(option_count):
+        x = index - 0.5 + (np.arange(steps) + 0.5) / steps
+        density = np.where(
+            x < mode,
+            2 * (x - left) / ((right - left) * max(mode - left, 1e-12)),
+            2 * (right - x) / ((right - left) * max(right - mode, 1e-12)),
+        )
+        density[(x < left) | (x > right)] = 0
+        probabilities.append(density.mean())
+    return np.array(probabilities)
+
+
+@pytest.mark.parametrize("stat", list(MONSTER_STAT_OPTIONS))
+@pytest.mark.parametrize("cr", list(range(MONSTER_MAX_CR + 1)) + [0.5, 2.25])
+def test_monster_stat_table_is_triangular(stat, cr):
+    options, probabilities = monster_stat_distribution(stat, cr)
+    assert len(probabilities) == len(options)
+    assert np.allclose(
+        probabilities,
+        triangular_index_probabilities(cr, len(options)),
+        atol=1e-6,
+    )
+
+
+@pytest.mark.parametrize("cr", [-1, -0.5, MONSTER_MAX_CR + 1, 30.5])
+def test_monster_cr_out_of_range(cr):
+    with pytest.raises(ValueError):
+        monster_stat_distribution("ac", cr)
+    with pytest.raises(ValueError):
+        Monster(cr=cr)
+
+
+def test_fractional_cr_monster():
+    monster = Monster(cr=0.5)
+    assert monster.ac in MONSTER_STAT_OPTIONS["ac"]
+
+
+@pytest.mark.parametrize(
+    "level, attacks",
+    [(1, 1), (4, 1), (5, 2), (10, 2), (11, 3), (19, 3), (20, 4)],
+)
+def test_fighter_extra_attacks(level, attacks):
+    assert generate_fighter_stats(level)["attacks_per_round"] == attacks
+
+
+@pytest.mark.parametrize(
+    "level, attacks", [(1, 1), (4, 1), (5, 2), (11, 2), (20, 2)]
+)
+def test_barbarian_extra_attack(level, attacks):
+    stats = generate_barbarian_stats(level, gwf=True)
+    assert stats["attacks_per_round"] == attacks
+
+
+@pytest.mark.parametrize(
+    "attacker",
+    [
+        Character(
+            name="Fighter",
+            **generate_fighter_stats(level),
+            ac=18,
+            damage_dice=(6, 2),
+        )
+        for level in [1, 5, 11, 20]
+    ]
+    + [
+        Barbarian(
+            name="Barbarian",
+            damage_dice=(12, 1),
+            **generate_barbarian_stats(9, gwf=True),
+            ac=16,
+        )
+    ],
+    ids=lambda attacker: f"{attacker.name}-{attacker.attacks_per_round}",
+)
+@pytest.mark.parametrize("advantage", [False, True])
+def test_attack_rounds_mean_is_every_attack(attacker, advantage):
+    seed_random_state(0)
+    target = Character(
+        name="Target", **generate_fighter_stats(5), ac=17, damage_dice=(6, 1)
+    )
+    damage_arr = attacker.attack_rounds(target, 100_000, advantage)
+    expected = attacker.attacks_per_round * expected_damage(
+        attacker, target, advantage
+    )
+    assert mean_test(damage_arr, expected)[1] > 1e-3
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from analytic import natural_roll_probabilities
+from die import D20, Die, GWFDie, bytes_faces, use_random_state
+from sweep import seed_random_state
+from validation import chi_square_goodness_of_fit
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    seed_random_state(0)
+
+
+def test_stratified_d20_block_is_every_face():
+    faces = D20().roll(20 * 5, "stratified")
+    assert np.array_equal(np.bincount(faces, minlength=21)[1:], np.full(20, 5))
+
+
+@pytest.mark.parametrize(
+    "advantage, disadvantage", [(True, False), (False, True)]
+)
+def test_stratified_pairs_block_has_exact_pmf(advantage, disadvantage):
+    d20 = D20()
+    roll = d20.roll_with_advantage if advantage else d20.roll_with_disadvantage
+    # one block of every pair of faces
+    faces = roll(20**2, "stratified")
+    expected = np.rint(
+        natural_roll_probabilities(advantage, disadvantage) * 20**2
+    )
+    assert np.array_equal(np.bincount(faces, minlength=21)[1:], expected)
+
+
+@pytest.mark.parametrize("dice", [D20(), Die(8, 2), GWFDie(6, 2)])
+def test_stratified_mean_has_lower_variance(dice):
+    def means(sampling: str) -> np.ndarray:
+        return np.array(
+            [dice.roll(1_000, sampling).mean() for _ in range(200)]
+        )
+
+    stratified, random = means("stratified"), means("random")
+    # still unbiased, within a few standard errors of a random mean
+    assert abs(stratified.mean() - dice.pmf() @ np.arange(len(dice.pmf()))) < (
+        4 * random.std() / np.sqrt(len(random))
+    )
+    assert stratified.var() < random.var() / 2
+
+
+@pytest.mark.parametrize("sides", [2, 6, 12, 20, 100, 256, 300, 2**16])
+def test_bytes_faces_stay_in_range(sides):
+    faces = bytes_faces(sides, (100, 1_000))
+    assert faces.shape == (100, 1_000)
+    assert faces.min() >= 1 and faces.max() <= sides
+
+
+@pytest.mark.parametrize("sides", [6, 12, 20])
+def test_bytes_faces_have_no_modulo_bias(sides):
+    # 256 % sides of the bytes would favor the lowest faces if kept
+    pmf = np.concatenate([[0], np.full(sides, 1 / sides)])
+    faces = bytes_faces(sides, 1_000_000)
+    assert chi_square_goodness_of_fit(faces, pmf)[1] > 1e-3
+
+
+class ScriptedState:
+    """
+    A random state whose `bytes` hands out scripted bytes, one batch per
+    call, recording how many were asked for.
+    """
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.requested = []
+
+    def bytes(self, length):
+        self.requested.append(length)
+        return np.array(self.batches.pop(0), dtype=np.uint8).tobytes()
+
+
+def test_bytes_faces_redraw_rejected_bytes():
+    # bytes from 252 up are past the largest multiple of 6
+    state = ScriptedState([255, 0, 253, 5], [254, 11], [7])
+    with use_random_state(state):
+        faces = bytes_faces(6, 4)
+    assert state.requested == [4, 2, 1]
+    assert np.array_equal(faces, [2, 1, 6, 6])
+
+
+def test_bytes_faces_never_redraw_for_sides_dividing_256():
+    state = ScriptedState([255, 0, 128, 7])
+    with use_random_state(state):
+        faces = bytes_faces(8, 4)
+    assert state.requested == [4]
+    assert np.array_equal(faces, [8, 1, 1, 8])
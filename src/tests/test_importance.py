@@ -0,0 +1,76 @@
+"""
+Importance sampling estimates of events that aren't rare, which should
+agree with plain simulation and exact probabilities within a few
+standard errors.
+"""
+import numpy as np
+import pytest
+
+from importance import (
+    critical_streak_probability,
+    kill_probability,
+    tilted_attacks,
+)
+from sweep import seed_random_state
+from validation import _characters
+
+
+TILT = (0.3, 2.0)
+Z = 4
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    seed_random_state(0)
+
+
+def test_weights_average_to_one():
+    fighter, barbarian = _characters(5)
+    *_, log_weight_arr = tilted_attacks(barbarian, fighter, 200_000, tilt=TILT)
+    weights = np.exp(log_weight_arr)
+    standard_error = weights.std() / np.sqrt(len(weights))
+    assert abs(weights.mean() - 1) < Z * standard_error
+
+
+def test_kill_probability_agrees_with_plain_simulation():
+    fighter, barbarian = _characters(5)
+    rounds, replications = 3, 100_000
+    estimate = kill_probability(
+        barbarian, fighter, rounds, replications=20_000, tilt=TILT
+    )
+
+    damage = (
+        barbarian.attack_rounds(fighter, replications * rounds)
+        .reshape(replications, rounds)
+        .sum(axis=1)
+    )
+    killed = damage >= fighter.roll_hp(replications)
+    standard_error = np.hypot(
+        estimate.standard_error, killed.std() / np.sqrt(replications)
+    )
+    assert abs(estimate.probability - killed.mean()) < Z * standard_error
+
+
+def test_critical_streak_probability_agrees_with_exact():
+    fighter, _ = _characters(1)
+    rounds, streak = 4, 2
+    estimate = critical_streak_probability(
+        fighter,
+        fighter,
+        rounds,
+        streak,
+        replications=50_000,
+        advantage=True,
+        tilt=TILT,
+    )
+
+    # the probability of no streak yet, by the length of the current run
+    critical = 1 - 0.95**2
+    run = np.zeros(streak)
+    run[0] = 1
+    for _ in range(rounds):
+        run = np.concatenate(
+            [[run.sum() * (1 - critical)], run[:-1] * critical]
+        )
+    exact = 1 - run.sum()
+    assert abs(estimate.probability - exact) < Z * estimate.standard_error
@@ -0,0 +1,138 @@
+"""
+Tests of the fight kernels, and every fight backend against the numpy
+backend at a fixed seed.
+
+Each backend draws its random numbers differently, so their fights can
+only agree in distribution: outcome rates are compared with two-sided
+two-proportion tests, at a strict alpha since the seed is fixed and
+a failure is a bug rather than bad luck.
+"""
+import numpy as np
+import pytest
+
+from character import Character
+from die import (
+    Explode,
+    KeepHighest,
+    Minimum,
+    ModifiedDie,
+    Reroll,
+    use_random_state,
+)
+from kernels import BACKENDS, attack_profile, chunk_seeds
+from sweep import seed_random_state
+from utils import CHAR1_WINS, TIE, fights, generate_fighter_stats
+from validation import _characters, two_proportion_test
+
+
+ALPHA = 1e-3
+REPLICATIONS = 20_000
+
+
+def outcome_rates(backend: str, level: int, rolls: int, seed: int) -> dict:
+    seed_random_state(seed)
+    fighter, barbarian = _characters(level)
+    outcomes = fights(
+        fighter, barbarian, REPLICATIONS, rolls=rolls, backend=backend
+    )["outcome"]
+    return {
+        outcome: int(np.count_nonzero(outcomes == outcome))
+        for outcome in [CHAR1_WINS, TIE]
+    }
+
+
+@pytest.mark.parametrize(
+    "backend", [backend for backend in BACKENDS if backend != "numpy"]
+)
+@pytest.mark.parametrize(
+    "level, rolls",
+    [
+        (3, 500),
+        (12, 500),
+        # too few rounds for most fights to finish, so ties are common
+        (5, 3),
+    ],
+)
+def test_backend_agrees_with_numpy(backend, level, rolls):
+    expected = outcome_rates("numpy", level, rolls, seed=1)
+    observed = outcome_rates(backend, level, rolls, seed=2)
+    for outcome in [CHAR1_WINS, TIE]:
+        _, p_value = two_proportion_test(
+            observed[outcome], REPLICATIONS, expected[outcome], REPLICATIONS
+        )
+        assert p_value > ALPHA, (backend, outcome, observed, expected)
+
+
+def test_long_fights_record_their_rounds():
+    seed_random_state(0)
+    fighter, barbarian = _characters(1)
+    rolls = np.iinfo(np.int16).max + 1
+    fight_arr = fights(fighter, barbarian, 100, rolls=rolls)
+    # the winner of every fight is recorded as defeated at `rolls`
+    assert fight_arr["char1_defeated_at"].max() == rolls
+    assert fight_arr["char2_defeated_at"].max() == rolls
+
+
+class ModifiedCharacter(Character):
+    """
+    A fighter whose damage dice are rolled with any modifiers
+    """
+
+    def __init__(self, modifiers: list) -> None:
+        super().__init__(
+            name="Modified",
+            **generate_fighter_stats(5),
+            ac=18,
+            damage_dice=(10, 1),
+        )
+        self.modifiers = modifiers
+
+    @property
+    def damage_dice(self):
+        return ModifiedDie(*self._damage_dice, self.modifiers)
+
+
+@pytest.mark.parametrize(
+    "modifiers, reroll_at_most",
+    [([], 0), ([Reroll(1)], 1), ([Reroll(2)], 2)],
+)
+def test_attack_profile_rerolls(modifiers, reroll_at_most):
+    profile = attack_profile(ModifiedCharacter(modifiers))
+    assert profile.reroll_at_most == reroll_at_most
+
+
+@pytest.mark.parametrize(
+    "modifiers",
+    [
+        [Explode()],
+        [Minimum(2)],
+        [KeepHighest(1)],
+        [Reroll(1), Reroll(2)],
+    ],
+)
+def test_attack_profile_rejects_other_modifiers(modifiers):
+    with pytest.raises(ValueError):
+        attack_profile(ModifiedCharacter(modifiers))
+
+
+class RepeatingState:
+    """
+    A random state whose first draw repeats one seed
+    """
+
+    def __init__(self) -> None:
+        self.state = np.random.RandomState(0)
+        self.draws = 0
+
+    def randint(self, low, high, size, dtype):
+        self.draws += 1
+        if self.draws == 1:
+            return np.full(size, 7, dtype=dtype)
+        return self.state.randint(low, high, size, dtype=dtype)
+
+
+def test_chunk_seeds_are_distinct():
+    with use_random_state(RepeatingState()):
+        seeds = chunk_seeds(1_000)
+    assert len(np.unique(seeds)) == 1_000
+    assert 7 in seeds
@@ -0,0 +1,98 @@
+"""
+Attacks replayed from recorded rolls against attacks rolled by
+`Character.attack`, and the exact expected damage.
+"""
+import numpy as np
+import pytest
+
+from analytic import expected_damage
+from character import Barbarian, Character
+from die import ModifiedDie, Reroll
+from replay import (
+    record_attacks,
+    record_character_attacks,
+    replay_character_attacks,
+)
+from sweep import seed_random_state
+from utils import generate_barbarian_stats, generate_fighter_stats
+from validation import chi_square_homogeneity, mean_test
+
+
+ALPHA = 1e-3
+REPLICATIONS = 100_000
+
+
+def barbarian(level: int, gwf: bool) -> Barbarian:
+    return Barbarian(
+        name="Barbarian",
+        damage_dice=(12, 1),
+        **generate_barbarian_stats(level, gwf),
+        ac=16,
+    )
+
+
+def fighter(level: int) -> Character:
+    return Character(
+        name="Fighter",
+        **generate_fighter_stats(level),
+        ac=18,
+        damage_dice=(6, 2),
+    )
+
+
+@pytest.mark.parametrize(
+    "attacker",
+    [
+        fighter(5),
+        # Great Weapon Fighting, with and without Brutal Critical
+        barbarian(5, gwf=True),
+        barbarian(17, gwf=True),
+        # Brutal Critical alone
+        barbarian(9, gwf=False),
+    ],
+    ids=["plain", "gwf", "gwf and brutal critical", "brutal critical"],
+)
+@pytest.mark.parametrize("advantage", [False, True])
+def test_replay_matches_attack(attacker, advantage):
+    seed_random_state(0)
+    target = fighter(5)
+    recorded = record_character_attacks(
+        attacker, REPLICATIONS, advantage=advantage
+    )
+    hit_arr, damage_arr = replay_character_attacks(recorded, attacker, target)
+
+    expected_hit_arr = attacker.hit(target, REPLICATIONS, advantage)
+    expected_damage_arr = attacker.attack(target, REPLICATIONS, advantage)
+    assert chi_square_homogeneity(hit_arr, expected_hit_arr)[1] > ALPHA
+    assert chi_square_homogeneity(damage_arr, expected_damage_arr)[1] > ALPHA
+    _, p_value = mean_test(
+        damage_arr, expected_damage(attacker, target, advantage)
+    )
+    assert p_value > ALPHA
+
+
+def test_replay_rejects_other_dice():
+    recorded = record_attacks(10, damage_sides=12, damage_number=1)
+    with pytest.raises(ValueError):
+        replay_character_attacks(recorded, fighter(5), fighter(5))
+
+
+def test_replay_rejects_unrecorded_critical_dice():
+    attacker = barbarian(17, gwf=True)
+    recorded = record_attacks(10, damage_sides=12, damage_number=1)
+    with pytest.raises(ValueError):
+        replay_character_attacks(recorded, attacker, fighter(5))
+
+
+def test_replay_rejects_other_rerolls():
+    class RerollOnes(Character):
+        @property
+        def damage_dice(self):
+            return ModifiedDie(*self._damage_dice, [Reroll(1)])
+
+    attacker = RerollOnes(
+        name="Reroll", **generate_fighter_stats(5), ac=18, damage_dice=(6, 2)
+    )
+    recorded = record_character_attacks(attacker, 10)
+    with pytest.raises(ValueError):
+        replay_character_attacks(recorded, attacker, fighter(5))
@@ -0,0 +1,81 @@
+"""
+Likelihood-ratio sensitivities against finite differences of fights
+replayed with common random numbers (see `replay.py`): the same
+recorded rolls, with and without the change.
+"""
+import numpy as np
+import pytest
+
+from kernels import find_defeat_indices
+from replay import record_character_attacks, replay_character_attacks
+from sensitivity import _wins, sensitivity
+from sweep import seed_random_state
+from utils import acts_first
+from validation import _characters
+
+
+ROLLS = 30
+Z = 4
+
+
+def finite_difference(char1, char2, n: int, change: str):
+    """
+    The change in char1's win probability from +1 AC or hit bonus,
+    and its standard error, from the same rolls replayed twice.
+    """
+    char1_first = acts_first(char1, char2)
+    char1_recorded = record_character_attacks(
+        char1, n * ROLLS * char1.attacks_per_round
+    )
+    char2_recorded = record_character_attacks(
+        char2, n * ROLLS * char2.attacks_per_round
+    )
+    char1_hp, char2_hp = char1.roll_hp(n), char2.roll_hp(n)
+
+    def wins(hit_bonus_change: int, ac_change: int):
+        _, char1_damage = replay_character_attacks(
+            char1_recorded,
+            char1,
+            char2,
+            hit_bonus=char1.hit_bonus + hit_bonus_change,
+        )
+        _, char2_damage = replay_character_attacks(
+            char2_recorded, char2, char1, ac=char1.ac + ac_change
+        )
+        return _wins(
+            find_defeat_indices(
+                char1_hp, char2_damage.reshape(n, ROLLS, -1).sum(axis=2)
+            ),
+            find_defeat_indices(
+                char2_hp, char1_damage.reshape(n, ROLLS, -1).sum(axis=2)
+            ),
+            char1_first,
+            ROLLS,
+        )
+
+    changed = wins(*((1, 0) if change == "hit_bonus" else (0, 1)))
+    differences = changed - wins(0, 0)
+    return differences.mean(), differences.std() / np.sqrt(n)
+
+
+@pytest.mark.parametrize("change", ["ac", "hit_bonus"])
+def test_sensitivity_agrees_with_finite_difference(change):
+    seed_random_state(0)
+    fighter, barbarian = _characters(5)
+    estimate = sensitivity(fighter, barbarian, 20_000, ROLLS)[change][
+        "win_probability"
+    ]
+    difference, standard_error = finite_difference(
+        fighter, barbarian, 100_000, change
+    )
+    assert abs(estimate.effect - difference) < Z * np.hypot(
+        estimate.standard_error, standard_error
+    )
+
+
+def test_sensitivity_rejects_new_results():
+    fighter, barbarian = _characters(5)
+    # the fighter only hits on a natural 20, and would hit with +1
+    barbarian.ac = fighter.hit_bonus + 20
+    with pytest.raises(ValueError):
+        sensitivity(fighter, barbarian, 100, ROLLS)
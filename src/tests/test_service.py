@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import pytest
+
+from service import SimulationService, simulate_fights
+
+
+def fights_request(**kwargs) -> dict:
+    request = dict(
+        char1=dict(kind="monster", cr=1),
+        char2=dict(kind="monster", cr=1),
+        replications=10,
+        seed=0,
+    )
+    request.update(kwargs)
+    return request
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        fights_request(char2=dict(kind="monster", cr=30)),
+        fights_request(char2=dict(kind="monster", cr=-1)),
+        fights_request(char2=dict(kind="fighter", level=0, ac=18)),
+        fights_request(rolls=0),
+        fights_request(replications=0),
+    ],
+)
+def test_out_of_range_requests_are_rejected(request_):
+    with pytest.raises(ValueError):
+        simulate_fights(request_)
+
+
+def test_unexpected_errors_are_answered():
+    service = SimulationService()
+    # a pool that can't run anything, like one whose workers died
+    service.shutdown()
+    status, payload = asyncio.run(
+        service.route("POST", "/fights", json.dumps(fights_request()))
+    )
+    assert status == 500
+    assert "error" in payload
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from shared import SharedArray, map_shared, map_threads
+
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fill_row(task: int, out: np.ndarray):
+    out[:] = task
+
+
+def test_map_shared():
+    tasks = list(range(5))
+    with SharedArray((len(tasks), 3), np.int64) as shared:
+        assert sorted(map_shared(fill_row, tasks, shared, workers=2)) == tasks
+        assert np.array_equal(
+            shared.array, np.repeat(np.array(tasks)[:, np.newaxis], 3, axis=1)
+        )
+
+
+def test_map_threads():
+    tasks = list(range(5))
+    out = np.zeros((len(tasks), 3), dtype=np.int64)
+    assert sorted(map_threads(fill_row, tasks, out, workers=2)) == tasks
+    assert np.array_equal(out[:, 0], tasks)
+
+
+def test_map_shared_after_numba_fights():
+    """
+    Start worker processes after the numba threading layer has started,
+    in a fresh interpreter, which must then exit cleanly.
+    """
+    code = """
+import numpy as np
+from shared import SharedArray, map_shared
+from tests.test_shared import fill_row
+from utils import fights
+from validation import _characters
+
+fighter, barbarian = _characters(3)
+fights(fighter, barbarian, 1_000)
+with SharedArray((4, 2), np.int64) as shared:
+    list(map_shared(fill_row, list(range(4)), shared, workers=2))
+    assert shared.array[:, 0].tolist() == [0, 1, 2, 3]
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=SRC,
+        env=dict(os.environ, PYTHONPATH=SRC),
+        timeout=120,
+    )
+    assert result.returncode == 0
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from die import random_state
+from sweep import Sweep, merge_partials, run_sweep, sweep_arguments
+
+
+CELLS = [(row, column) for row in range(3) for column in range(2)]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def setup(row: int) -> int:
+    return row
+
+
+def simulate(row: int, cell: tuple, replications: int):
+    return random_state().randint(0, 4 + row, replications)
+
+
+def build_sweep(**kwargs) -> Sweep:
+    kwargs = dict(
+        dict(
+            cells=CELLS,
+            setup=setup,
+            simulate=simulate,
+            replications=1_000,
+            batch_size=300,
+            seed=1,
+        ),
+        **kwargs,
+    )
+    return Sweep(**kwargs)
+
+
+def counts(results: dict) -> dict:
+    return {
+        cell: dict(accumulator.counts) for cell, accumulator in results.items()
+    }
+
+
+@pytest.mark.parametrize("batches", [1, 4, 9])
+def test_resumed_sweep_matches_uninterrupted(tmp_path, batches):
+    """
+    Interrupt a sweep after some batches, in the middle of a cell
+    (there are 4 batches per cell), and resume it from its checkpoint.
+    """
+    expected = counts(build_sweep().run())
+
+    checkpoint_path = str(tmp_path / "sweep.pkl")
+    simulated = 0
+
+    def interrupted_simulate(row, cell, replications):
+        nonlocal simulated
+        if simulated == batches:
+            raise Interrupted
+        simulated += 1
+        return simulate(row, cell, replications)
+
+    with pytest.raises(Interrupted):
+        build_sweep(
+            simulate=interrupted_simulate,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=0,
+        ).run()
+    resumed = build_sweep(seed=None, checkpoint_path=checkpoint_path)
+    assert len(resumed.finished) == batches // 4
+    assert counts(resumed.run()) == expected
+
+
+def test_checkpoint_of_another_sweep_is_rejected(tmp_path):
+    checkpoint_path = str(tmp_path / "sweep.pkl")
+    build_sweep(checkpoint_path=checkpoint_path).run()
+    with pytest.raises(ValueError):
+        build_sweep(checkpoint_path=checkpoint_path, replications=2_000)
+
+
+def column_outcomes(row: int, cell: tuple, replications: int):
+    """
+    Outcomes that only depend on the cell, so any split of its
+    replications across shards has the same counts
+    """
+    return np.full(replications, row + cell[1])
+
+
+def test_merged_shards_match_unsharded_sweep(tmp_path):
+    replications = 1_001
+    expected = build_sweep(
+        simulate=column_outcomes, replications=replications
+    ).run()
+    paths = []
+    for shard_index in range(3):
+        path = str(tmp_path / f"shard{shard_index}.pkl")
+        build_sweep(
+            simulate=column_outcomes,
+            replications=replications,
+            shard_index=shard_index,
+            shard_count=3,
+        ).save_partial(path)
+        paths.append(path)
+    merged, merged_replications = merge_partials(paths)
+    assert merged_replications == replications
+    assert counts(merged) == counts(expected)
+    assert list(merged) == CELLS
+
+
+def test_merged_shards_have_every_replication(tmp_path):
+    paths = []
+    for shard_index in range(2):
+        path = str(tmp_path / f"shard{shard_index}.pkl")
+        build_sweep(shard_index=shard_index, shard_count=2).save_partial(path)
+        paths.append(path)
+    merged, _ = merge_partials(paths)
+    assert all(accumulator.total == 1_000 for accumulator in merged.values())
+    with pytest.raises(ValueError):
+        merge_partials(paths[:1])
+
+
+def test_budget_rejects_partial_out(tmp_path):
+    args = sweep_arguments().parse_args(
+        ["--budget=1000", f"--partial-out={tmp_path / 'shard.pkl'}"]
+    )
+    with pytest.raises(ValueError):
+        run_sweep(args, "script.py", [], cells=CELLS, setup=setup)
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+
+from round_robin.tournament import build_roster, tournament
+from sweep import seed_random_state
+
+
+@pytest.mark.parametrize("rolls", [500, 3])
+def test_every_fight_is_won_once_or_tied(rolls):
+    seed_random_state(0)
+    roster = build_roster(5, [4])
+    result = tournament(roster, 200, rolls=rolls, batch_size=64)
+    off_diagonal = ~np.eye(len(roster), dtype=bool)
+    assert np.array_equal(result.ties, result.ties.T)
+    assert np.all(
+        (result.wins + result.wins.T + result.ties)[off_diagonal] == 200
+    )
+    if rolls == 3:
+        # too few rounds for every fight to finish
+        assert result.ties.sum() > 0
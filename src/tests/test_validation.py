@@ -0,0 +1,17 @@
+from die import D20
+from sweep import seed_random_state
+from validation import _stratified_check, fight_check_count, fight_checks
+
+
+def test_fight_check_count():
+    seed_random_state(0)
+    assert len(fight_checks(10)) == fight_check_count()
+
+
+def test_stratified_check_fails_random_rolls():
+    seed_random_state(0)
+    d20 = D20()
+    check = _stratified_check(
+        "D20", lambda n, sampling: d20.roll(n), d20.pmf(), 20, 10_000
+    )
+    assert check.p_value == 0
@@ -4,8 +4,23 @@ from pathlib import Path
 import numpy as np
 
 from character import Character
+from kernels import DEFAULT_BACKEND, fight_backends
 
 
+# outcome codes of a fight, as returned by `fights`
+TIE = 0
+CHAR1_WINS = 1
+CHAR2_WINS = 2
+FIGHT_DTYPE = np.dtype(
+    [
+        ("outcome", np.int8),
+        ("char1_defeated_at", np.int32),
+        ("char2_defeated_at", np.int32),
+        ("char1_hp", np.int32),
+        ("char2_hp", np.int32),
+    ]
+)
+
 images_directory = os.path.join(os.path.dirname(__file__), "images")
 Path(images_directory).mkdir(parents=True, exist_ok=True)
 
@@ -15,6 +30,7 @@ def _generate_character_stats(
     level_options: list,
     level_apis: list,
     hit_die: int = None,
+    attacks_per_round: int = 1,
 ) -> dict:
     """
     Prototype function for generating character stats.
@@ -30,6 +46,7 @@ def _generate_character_stats(
         level=level,
         strength_modifier=str_modifier,
         constitution_modifier=con_modifier,
+        attacks_per_round=attacks_per_round,
     )
     if hit_die is not None:
         stats = {
@@ -79,7 +96,19 @@ def generate_fighter_stats(level: int) -> dict:
     # +1 to con modifier, alternating until level 12,
     # then finishing off con to +5 at level 14
 
-    stats = _generate_character_stats(level, levels, apis, hit_die=10)
+    # Extra Attack: a second attack each round at level 5,
+    # a third at level 11 and a fourth at level 20
+    attacks_per_round = int(
+        np.select([level < 5, level < 11, level < 20], [1, 2, 3], 4)
+    )
+
+    stats = _generate_character_stats(
+        level,
+        levels,
+        apis,
+        hit_die=10,
+        attacks_per_round=attacks_per_round,
+    )
     return stats
 
 
@@ -115,14 +144,19 @@ def generate_barbarian_stats(level: int, gwf: bool = False) -> dict:
     else:
         apis = [(0, 0), (1, 0), (1, 1), (2, 1), (2, 2)]
 
-    stats = _generate_character_stats(level, levels, apis)
+    # Extra Attack: a second attack each round at level 5
+    attacks_per_round = 2 if level >= 5 else 1
+
+    stats = _generate_character_stats(
+        level, levels, apis, attacks_per_round=attacks_per_round
+    )
     return {**stats, "great_weapon_fighting": gwf}
 
 
 def find_defeat_index(target: Character, damage_arr: np.ndarray) -> int:
     """
     Find the index at which the cumulative damage from an array
-    of damage rolls exceeds the hp of the target
+    of damage rolls (e.g. of each round) exceeds the hp of the target
 
     Parameters
     ----------
@@ -162,8 +196,8 @@ def fight(char1: Character, char2: Character, rolls: int = 500) -> str:
         If neither Character was reduced to 0 hit points in the
         provided number of rounds, returns "Tie"
     """
-    char1_damage_arr = char1.attack(char2, rolls)
-    char2_damage_arr = char2.attack(char1, rolls)
+    char1_damage_arr = char1.attack_rounds(char2, rolls)
+    char2_damage_arr = char2.attack_rounds(char1, rolls)
 
     char1_defeated_at = find_defeat_index(char1, char2_damage_arr)
     char2_defeated_at = find_defeat_index(char2, char1_damage_arr)
@@ -184,3 +218,97 @@ def fight(char1: Character, char2: Character, rolls: int = 500) -> str:
     ):
         winner = char2.name
     return winner
+
+
+def acts_first(char1: Character, char2: Character) -> bool:
+    """
+    Whether char1 acts before char2. Initiative ties are broken
+    without changing either Character, so repeated calls
+    don't depend on each other.
+    """
+    char1_initiative, char2_initiative = char1.initiative, char2.initiative
+    while char1_initiative == char2_initiative:
+        char1_initiative = char1.d20.roll() + char1.initiative_bonus
+        char2_initiative = char2.d20.roll() + char2.initiative_bonus
+    return bool(char1_initiative > char2_initiative)
+
+
+def fights(
+    char1: Character,
+    char2: Character,
+    replications: int,
+    rolls: int = 500,
+    backend: str = None,
+) -> np.ndarray:
+    """
+    Simulate many one-on-one fights between two Characters at once.
+    Equivalent to calling `fight` `replications` times, except that
+    a fight where neither Character is defeated is always a tie, and
+    results are returned as compact outcome codes instead of names.
+
+    Parameters
+    ----------
+    char1: Character
+    char2: Character
+    replications: int
+        The number of fights to simulate
+    rolls: int = 500
+        The number of rounds for a single fight
+        Should be long enough to ensure one character wins
+    backend: str = None
+        The fight kernel to use, "numba", "numpy" or "threads"
+        Defaults to "numba" when it is installed
+
+    Returns
+    -------
+    fight_arr: np.ndarray
+        Structured array of FIGHT_DTYPE, one record per fight:
+        outcome: TIE, CHAR1_WINS or CHAR2_WINS
+        char1_defeated_at, char2_defeated_at: the round (starting from 0)
+            at which each Character was defeated, or `rolls` if they
+            weren't
+        char1_hp, char2_hp: each Character's hp at the start of the fight
+    """
+    fight_backend = fight_backends[backend or DEFAULT_BACKEND]
+    char1_first = acts_first(char1, char2)
+
+    fight_arr = np.empty(replications, dtype=FIGHT_DTYPE)
+    fight_arr["char1_hp"] = char1.roll_hp(replications)
+    fight_arr["char2_hp"] = char2.roll_hp(replications)
+    char1_defeated_at, char2_defeated_at = fight_backend(
+        char1, char2, fight_arr["char1_hp"], fight_arr["char2_hp"], rolls
+    )
+    # when both are defeated on the same round,
+    # whoever acts first wins, and isn't defeated
+    char1_wins = (char1_defeated_at > char2_defeated_at) | (
+        (char1_defeated_at == char2_defeated_at) & char1_first
+    )
+    fight_arr["outcome"] = np.where(char1_wins, CHAR1_WINS, CHAR2_WINS)
+    fight_arr["outcome"][
+        (char1_defeated_at == rolls) & (char2_defeated_at == rolls)
+    ] = TIE
+    fight_arr["char1_defeated_at"] = np.where(
+        fight_arr["outcome"] == CHAR1_WINS, rolls, char1_defeated_at
+    )
+    fight_arr["char2_defeated_at"] = np.where(
+        fight_arr["outcome"] == CHAR2_WINS, rolls, char2_defeated_at
+    )
+    return fight_arr
+
+
+def outcome_names(char1_name: str, char2_name: str) -> dict:
+    """
+    The names to present the outcome codes of `fights` with.
+
+    Parameters
+    ----------
+    char1_name: str
+    char2_name: str
+        The names of the Characters passed to `fights`
+
+    Returns
+    -------
+    names: dict
+        Dictionary of outcome code -> name
+    """
+    return {TIE: "Tie", CHAR1_WINS: char1_name, CHAR2_WINS: char2_name}
@@ -0,0 +1,608 @@
+"""
+Check that the current dice, damage and fight engines produce the same
+distributions as the frozen reference implementations in `reference.py`,
+and as exact PMFs where they are known.
+
+Every check draws samples from a current engine and from a reference
+(or an exact distribution), and runs a statistical test of the
+hypothesis that they are the same:
+
+* chi-square goodness of fit, against an exact PMF
+* chi-square homogeneity, and two-sample Kolmogorov-Smirnov,
+  between two sets of samples
+* a two-proportion z-test, between two win rates
+
+Stratified rolls are balanced by construction, so they would pass
+a chi-square test against their PMF whatever their distribution.
+Instead, stratified d20 rolls are drawn in blocks of a multiple of
+their strata, and every block is checked to be a permutation of them.
+
+A check fails when its p-value is below alpha divided by the number of
+checks (a Bonferroni correction), so that a correct engine fails the
+whole run with probability at most alpha. Runs are seeded, so a run
+is reproducible. The number of replications determines the smallest
+difference the checks can reliably detect; `required_replications`
+gives the replications needed to detect a difference in win rate
+with a given power.
+
+The tests are implemented with NumPy and the standard library only.
+"""
+import argparse
+import math
+import sys
+from statistics import NormalDist
+from typing import NamedTuple
+
+import numpy as np
+
+import reference
+from analytic import expected_damage, natural_roll_probabilities
+from character import Barbarian, Character
+from die import D20, Die, GWFDie
+from kernels import BACKENDS
+from sweep import seed_random_state
+from utils import (
+    CHAR1_WINS,
+    fights,
+    generate_barbarian_stats,
+    generate_fighter_stats,
+)
+
+
+class Check(NamedTuple):
+    """
+    The result of one statistical test.
+    """
+
+    name: str
+    test: str
+    statistic: float
+    p_value: float
+
+
+def chi_square_sf(statistic: float, dof: int) -> float:
+    """
+    The survival function of the chi-square distribution, i.e. the
+    regularized upper incomplete gamma function Q(dof / 2, statistic / 2),
+    by its series or continued fraction (whichever converges faster).
+    """
+    a, x = dof / 2, statistic / 2
+    if x <= 0:
+        return 1.0
+    log_prefactor = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        denominator = a
+        while abs(term) > abs(total) * 1e-15:
+            denominator += 1
+            term *= x / denominator
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefactor))
+    # Lentz's method for the continued fraction
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    fraction = d
+    i = 0
+    while True:
+        i += 1
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        fraction *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefactor) * fraction
+
+
+def _pool(observed: np.ndarray, expected: np.ndarray, minimum: float = 5):
+    """
+    Merge adjacent bins until every bin expects at least `minimum`
+    observations, so the chi-square approximation holds.
+    """
+    pooled_observed, pooled_expected = [], []
+    observed_sum = expected_sum = 0
+    for observed_count, expected_count in zip(observed, expected):
+        observed_sum += observed_count
+        expected_sum += expected_count
+        if expected_sum >= minimum:
+            pooled_observed.append(observed_sum)
+            pooled_expected.append(expected_sum)
+            observed_sum = expected_sum = 0
+    if pooled_expected:
+        pooled_observed[-1] += observed_sum
+        pooled_expected[-1] += expected_sum
+    return np.array(pooled_observed), np.array(pooled_expected)
+
+
+def chi_square_goodness_of_fit(samples: np.ndarray, pmf: np.ndarray):
+    """
+    Test integer samples against an exact PMF indexed by value.
+
+    Returns
+    -------
+    statistic: float
+    p_value: float
+    """
+    counts = np.bincount(samples, minlength=len(pmf))
+    if len(counts) > len(pmf):
+        # a value the PMF says is impossible
+        return math.inf, 0.0
+    observed, expected = _pool(counts, pmf * len(samples))
+    statistic = float(np.sum((observed - expected) ** 2 / expected))
+    return statistic, chi_square_sf(statistic, len(observed) - 1)
+
+
+def chi_square_homogeneity(samples1: np.ndarray, samples2: np.ndarray):
+    """
+    Test whether two sets of integer samples come from the same
+    distribution.
+
+    Returns
+    -------
+    statistic: float
+    p_value: float
+    """
+    offset = min(samples1.min(), samples2.min())
+    length = max(samples1.max(), samples2.max()) - offset + 1
+    counts = np.array(
+        [
+            np.bincount(samples - offset, minlength=length)
+            for samples in [samples1, samples2]
+        ]
+    )
+    # pool both samples into the same bins, by the expected counts
+    # of the smaller sample
+    expected_share = counts.sum(axis=0) / counts.sum()
+    smaller = counts.sum(axis=1).min()
+    pooled = np.array(
+        [_pool(row, expected_share * smaller)[0] for row in counts]
+    )
+    expected = (
+        pooled.sum(axis=1, keepdims=True)
+        * pooled.sum(axis=0, keepdims=True)
+        / pooled.sum()
+    )
+    statistic = float(np.sum((pooled - expected) ** 2 / expected))
+    return statistic, chi_square_sf(statistic, pooled.shape[1] - 1)
+
+
+def ks_two_sample(samples1: np.ndarray, samples2: np.ndarray):
+    """
+    Two-sample Kolmogorov-Smirnov test, with the asymptotic p-value
+    (which is conservative for discrete samples).
+
+    Returns
+    -------
+    statistic: float
+    p_value: float
+    """
+    values = np.union1d(samples1, samples2)
+    cdf1 = np.searchsorted(np.sort(samples1), values, "right") / len(samples1)
+    cdf2 = np.searchsorted(np.sort(samples2), values, "right") / len(samples2)
+    statistic = float(np.abs(cdf1 - cdf2).max())
+    effective_n = (
+        len(samples1) * len(samples2) / (len(samples1) + len(samples2))
+    )
+    root_n = math.sqrt(effective_n)
+    lam = (root_n + 0.12 + 0.11 / root_n) * statistic
+    if lam < 0.2:
+        return statistic, 1.0
+    p_value = 2 * sum(
+        (-1) ** (k - 1) * math.exp(-2 * k**2 * lam**2)
+        for k in range(1, 101)
+    )
+    return statistic, min(1.0, max(0.0, p_value))
+
+
+def two_proportion_test(successes1: int, n1: int, successes2: int, n2: int):
+    """
+    Two-sided z-test of whether two proportions are equal.
+
+    Returns
+    -------
+    statistic: float
+    p_value: float
+    """
+    pooled = (successes1 + successes2) / (n1 + n2)
+    standard_error = math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    if standard_error == 0:
+        return 0.0, 1.0
+    statistic = (successes1 / n1 - successes2 / n2) / standard_error
+    return statistic, 2 * (1 - NormalDist().cdf(abs(statistic)))
+
+
+def mean_test(samples: np.ndarray, expected: float):
+    """
+    Two-sided z-test of whether samples have an exact expected mean.
+
+    Returns
+    -------
+    statistic: float
+    p_value: float
+    """
+    standard_error = samples.std(ddof=1) / math.sqrt(len(samples))
+    statistic = (samples.mean() - expected) / standard_error
+    return statistic, 2 * (1 - NormalDist().cdf(abs(statistic)))
+
+
+def required_replications(
+    effect: float, alpha: float = 0.01, power: float = 0.9
+) -> int:
+    """
+    The replications per engine needed for a two-proportion test to
+    detect a difference of `effect` in win rate with the given power,
+    at the worst case win rate of 0.5.
+    """
+    z_alpha = NormalDist().inv_cdf(1 - alpha / 2)
+    z_power = NormalDist().inv_cdf(power)
+    return math.ceil(2 * 0.25 * ((z_alpha + z_power) / effect) ** 2)
+
+
+def _distribution_checks(name, samples, reference_samples, pmf=None):
+    checks = [
+        Check(
+            name,
+            "chi-square homogeneity",
+            *chi_square_homogeneity(samples, reference_samples),
+        ),
+        Check(
+            name,
+            "Kolmogorov-Smirnov",
+            *ks_two_sample(samples, reference_samples),
+        ),
+    ]
+    if pmf is not None:
+        checks.append(
+            Check(
+                name,
+                "chi-square vs PMF",
+                *chi_square_goodness_of_fit(samples, pmf),
+            )
+        )
+    return checks
+
+
+def dice_checks(replications: int) -> list:
+    """
+    Current dice against the reference dice and their exact PMFs.
+    """
+    checks = []
+    for dice, reference_roll in [
+        (Die(8, 2), reference.die_roll),
+        (Die(20, 1), reference.die_roll),
+        (GWFDie(6, 2), reference.gwf_die_roll),
+        (GWFDie(12, 1), reference.gwf_die_roll),
+    ]:
+        checks.extend(
+            _distribution_checks(
+                f"{type(dice).__name__} {dice.display()}",
+                dice.roll(replications),
+                reference_roll(dice.sides, dice.number, replications),
+                dice.pmf(),
+            )
+        )
+
+    d20 = D20()
+    checks.append(
+        _stratified_check("D20", d20.roll, d20.pmf(), 20, replications)
+    )
+    for label, roll, advantage, disadvantage in [
+        ("advantage", d20.roll_with_advantage, True, False),
+        ("disadvantage", d20.roll_with_disadvantage, False, True),
+    ]:
+        pmf = np.concatenate(
+            [[0], natural_roll_probabilities(advantage, disadvantage)]
+        )
+        checks.append(
+            Check(
+                f"D20 with {label}",
+                "chi-square vs PMF",
+                *chi_square_goodness_of_fit(roll(replications), pmf),
+            )
+        )
+        # every pair of faces is a stratum
+        checks.append(
+            _stratified_check(
+                f"D20 with {label}", roll, pmf, 20**2, replications
+            )
+        )
+    return checks
+
+
+def _stratified_check(
+    name: str, roll, pmf: np.ndarray, strata: int, replications: int
+) -> Check:
+    """
+    Roll stratified faces in blocks of a multiple of `strata` rolls,
+    and check that every block has exactly the count of each face
+    given by the PMF, i.e. that it is a permutation of the strata.
+    The statistic is the number of rolls that miss their count,
+    and the p-value is 1 if there are none, otherwise 0.
+    """
+    block = strata * max(1, 1_000 // strata)
+    expected = np.rint(pmf * block).astype(int)
+    missed = 0
+    for _ in range(max(1, replications // block)):
+        counts = np.bincount(roll(block, "stratified"), minlength=len(pmf))
+        missed += int(np.abs(counts - expected).sum())
+    return Check(
+        f"{name} (stratified)",
+        "every block a permutation",
+        missed,
+        float(missed == 0),
+    )
+
+
+def _characters(level: int):
+    ac = 17 + level // 4
+    fighter = Character(
+        name="Fighter",
+        **generate_fighter_stats(level),
+        ac=ac,
+        damage_dice=(10, 1),
+    )
+    barbarian = Barbarian(
+        name="Barbarian",
+        damage_dice=(12, 1),
+        **generate_barbarian_stats(level, gwf=True),
+        ac=ac,
+    )
+    # `fights` breaks an initiative tie once per call, and the reference
+    # once per fight, so they only agree when there is no tie to break
+    while fighter.initiative == barbarian.initiative:
+        barbarian.roll_initiative()
+    return fighter, barbarian
+
+
+def damage_checks(replications: int) -> list:
+    """
+    Current attacks against the reference attacks, and the mean damage
+    against the exact expected damage.
+    """
+    checks = []
+    for level in [5, 17]:
+        fighter, barbarian = _characters(level)
+        for attacker, target, brutal_critical, advantage in [
+            (fighter, barbarian, False, False),
+            (barbarian, fighter, True, True),
+        ]:
+            name = f"{attacker.name} level {level} attack"
+            samples = attacker.attack(target, replications, advantage)
+            checks.extend(
+                _distribution_checks(
+                    name,
+                    samples,
+                    reference.attack(
+                        attacker,
+                        target,
+                        replications,
+                        advantage,
+                        brutal_critical=brutal_critical,
+                    ),
+                )
+            )
+            checks.append(
+                Check(
+                    name,
+                    "mean vs expected damage",
+                    *mean_test(
+                        samples,
+                        expected_damage(attacker, target, advantage),
+                    ),
+                )
+            )
+        checks.extend(
+            _distribution_checks(
+                f"{barbarian.name} level {level} hp",
+                barbarian.roll_hp(replications),
+                np.array(
+                    [reference.hp(barbarian) for _ in range(replications)]
+                ),
+            )
+        )
+    return checks
+
+
+# the reference rolls every round of a fight one at a time, so fights
+# are capped far below the default 500 rounds, though still far above
+# the 20 or so rounds the longest of these fights last
+FIGHT_ROLLS = 50
+FIGHT_LEVELS = [3, 12]
+
+
+def fight_check_count() -> int:
+    """
+    The number of checks made by `fight_checks`: at every level, a win
+    rate for every backend, and two distributions of rounds for every
+    backend but the first.
+    """
+    return len(FIGHT_LEVELS) * (len(BACKENDS) + 2 * (len(BACKENDS) - 1))
+
+
+def fight_checks(replications: int) -> list:
+    """
+    Win rates of every fight backend against the reference fight loop,
+    and the rounds fights last on every backend against each other.
+    """
+    checks = []
+    for level in FIGHT_LEVELS:
+        fighter, barbarian = _characters(level)
+        reference_wins = sum(
+            reference.fight(
+                fighter,
+                barbarian,
+                FIGHT_ROLLS,
+                char2_brutal_critical=True,
+            )
+            == CHAR1_WINS
+            for _ in range(replications)
+        )
+        fight_arrs = {
+            backend: fights(
+                fighter, barbarian, replications, FIGHT_ROLLS, backend
+            )
+            for backend in BACKENDS
+        }
+        for backend, fight_arr in fight_arrs.items():
+            checks.append(
+                Check(
+                    f"Fighter vs Barbarian level {level} ({backend})",
+                    "win rate vs reference",
+                    *two_proportion_test(
+                        int(
+                            np.count_nonzero(
+                                fight_arr["outcome"] == CHAR1_WINS
+                            )
+                        ),
+                        replications,
+                        reference_wins,
+                        replications,
+                    ),
+                )
+            )
+        rounds = {
+            backend: np.minimum(
+                fight_arr["char1_defeated_at"], fight_arr["char2_defeated_at"]
+            )
+            for backend, fight_arr in fight_arrs.items()
+        }
+        # every other backend against the first
+        first, *others = rounds
+        for backend in others:
+            checks.extend(
+                _distribution_checks(
+                    f"Fighter vs Barbarian level {level} rounds "
+                    f"({backend} vs {first})",
+                    rounds[backend],
+                    rounds[first],
+                )
+            )
+    return checks
+
+
+CHECKS = [dice_checks, damage_checks, fight_checks]
+
+
+def run_checks(
+    replications: int = 20_000,
+    fight_replications: int = None,
+    seed: int = 0,
+    alpha: float = 0.01,
+    effect: float = 0.05,
+    power: float = 0.8,
+) -> list:
+    """
+    Run every check, each with its own random stream derived from seed.
+
+    Parameters
+    ----------
+    replications: int
+        The number of samples for dice and damage checks
+    fight_replications: int
+        The number of fights for fight checks, which are far slower
+        with the reference implementation
+        Defaults to enough to detect a difference of `effect` in win rate
+        with probability `power`, at the Bonferroni-corrected alpha
+    seed: int
+        The seed to derive every check's random stream from
+    alpha: float
+        The probability of failing a correct engine, over all checks
+    effect: float
+        The smallest difference in win rate to detect
+    power: float
+        The probability of detecting a difference of `effect`
+
+    Returns
+    -------
+    checks: list
+        List of Check
+    """
+    checks = []
+    for index, check in enumerate(CHECKS):
+        seed_random_state(seed, index)
+        if check is not fight_checks:
+            checks.extend(check(replications))
+            continue
+        if fight_replications is None:
+            # fight checks come last, so every other check is known
+            check_count = len(checks) + fight_check_count()
+            fight_replications = required_replications(
+                effect, alpha / check_count, power
+            )
+        checks.extend(check(fight_replications))
+    return checks
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--replications",
+        type=int,
+        default=20_000,
+        help="number of samples for dice and damage checks",
+    )
+    parser.add_argument(
+        "--fight-replications",
+        type=int,
+        default=None,
+        help="number of fights for fight checks, by default enough "
+        "for --effect and --power (about 4,000, which take most of "
+        "a run's 2 minutes)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.01,
+        help="probability of failing a correct engine, over all checks",
+    )
+    parser.add_argument(
+        "--effect",
+        type=float,
+        default=0.05,
+        help="smallest difference in win rate to detect",
+    )
+    parser.add_argument(
+        "--power",
+        type=float,
+        default=0.8,
+        help="probability of detecting a difference of --effect",
+    )
+    args = parser.parse_args(argv)
+
+    checks = run_checks(
+        args.replications,
+        args.fight_replications,
+        args.seed,
+        args.alpha,
+        args.effect,
+        args.power,
+    )
+    threshold = args.alpha / len(checks)
+    failures = 0
+    for check in checks:
+        passed = check.p_value >= threshold
+        failures += not passed
+        print(
+            f"{'ok  ' if passed else 'FAIL'} {check.name}: {check.test}, "
+            f"statistic {check.statistic:.3f}, p-value {check.p_value:.4f}"
+        )
+    print(
+        f"{len(checks) - failures}/{len(checks)} checks passed "
+        f"(p-value threshold {threshold:.2g})"
+    )
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())